@@ -1,21 +1,28 @@
 import os
+import asyncio
 import shutil
 import tempfile
 import time
 from typing import Any, List, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Depends, APIRouter
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from pydantic import BaseModel, Field
 from starlette.concurrency import run_in_threadpool
+from sse_starlette.sse import EventSourceResponse
 import json
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse # Import RedirectResponse
 
 # Correctly import the refactored modules
-from backend.app.agents.teacher_agent.ingestion import process_file
+from backend.app.agents.teacher_agent.ingestion import process_file, create_ingestion_job, link_existing_content
+from backend.app.services import ingestion_queue
+from backend.app.services.file_hash import copy_and_hash
+from backend.app.services.text_splitter import CHUNKING_STRATEGIES
 from backend.app.agents.teacher_agent.graph import app as teacher_agent_app
-from backend.app.utils import db_logger
+from backend.app.agents.teacher_agent.progress_events import ProgressTranslator
+from backend.app.utils import db_logger, async_db_logger
 from backend.app.utils.db_logger import engine, metadata
+from backend.app.utils.db_engine import get_pool_metrics
 from sqlalchemy import Table, select, update
 
 #
@@ -48,12 +55,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Agent Concurrency ---
+
+# The teacher agent runs on the event loop (ainvoke), so nothing but this
+# semaphore bounds how many agent runs (and their LLM calls) are in flight.
+MAX_CONCURRENT_AGENT_RUNS = int(os.getenv("MAX_CONCURRENT_AGENT_RUNS", "32"))
+agent_run_semaphore = asyncio.Semaphore(MAX_CONCURRENT_AGENT_RUNS)
+
+async def run_teacher_agent(inputs: dict) -> dict:
+    """Runs the teacher agent graph natively async, waiting for a free slot first."""
+    async with agent_run_semaphore:
+        return await teacher_agent_app.ainvoke(inputs)
+
 # --- API Models ---
 
-class IngestResponse(BaseModel):
-    unique_content_id: int
+class IngestJobResponse(BaseModel):
+    job_id: int
     file_name: str
-    message: str
+    status: str
+    status_url: str
+    unique_content_id: Optional[int] = None  # Set when the upload duplicated existing content
+
+class IngestStage(BaseModel):
+    stage: str
+    status: str
+    duration_ms: Optional[int] = None
+    error_message: Optional[str] = None
+
+class IngestStatusResponse(BaseModel):
+    job_id: int
+    status: str  # queued / running / completed / failed
+    job_status: Optional[str] = None
+    file_name: str
+    attempts: int
+    unique_content_id: Optional[int] = None
+    error_message: Optional[str] = None
+    progress: float
+    stages: List[IngestStage]
 
 class ChatRequest(BaseModel):
     unique_content_id: int
@@ -87,7 +125,7 @@ async def chat_with_agent(request: ChatRequest):
     Main endpoint for interacting with the Teacher Agent.
     The agent's graph will route the request to the appropriate skill.
     """
-    job_id = db_logger.create_job(
+    job_id = await async_db_logger.create_job(
         user_id=request.user_id,
         input_prompt=request.prompt,
         workflow_type='agent_chat'
@@ -105,11 +143,11 @@ async def chat_with_agent(request: ChatRequest):
     }
 
     try:
-        final_state = await run_in_threadpool(teacher_agent_app.invoke, inputs)
+        final_state = await run_teacher_agent(inputs)
 
         if final_state.get('error'):
             error_message = f"Generation failed: {final_state.get('error')}"
-            db_logger.update_job_status(job_id, 'failed', error_message=error_message)
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=error_message)
             raise HTTPException(status_code=500, detail=error_message)
         else:
             api_response_payload = final_state.get("final_result")
@@ -127,9 +165,58 @@ async def chat_with_agent(request: ChatRequest):
                 result=json_serializable_content 
             )
     except Exception as e:
-        db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+        await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
+@agent_router.post("/chat/stream")
+async def chat_with_agent_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat, as Server-Sent Events.
+    Sends `job` first, then `node_start`/`node_end` progress, `question_block`
+    and `token` content as the graph runs, and finally `result` (the same
+    payload as /chat) or `error`.
+    """
+    job_id = await async_db_logger.create_job(
+        user_id=request.user_id,
+        input_prompt=request.prompt,
+        workflow_type='agent_chat'
+    )
+    if not job_id:
+        raise HTTPException(status_code=500, detail="Failed to create a chat job.")
+
+    inputs = {
+        "job_id": job_id,
+        "user_id": request.user_id,
+        "user_query": request.prompt,
+        "unique_content_id": request.unique_content_id,
+    }
+
+    async def event_stream():
+        yield {"event": "job", "data": json.dumps({"job_id": job_id})}
+        translator = ProgressTranslator()
+        try:
+            async with agent_run_semaphore:
+                async for event in teacher_agent_app.astream_events(inputs, version="v2"):
+                    for message in translator.translate(event):
+                        yield message
+        except Exception as e:
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+            yield {"event": "error", "data": json.dumps({"job_id": job_id, "detail": f"An unexpected error occurred: {str(e)}"}, ensure_ascii=False)}
+            return
+
+        final_state = translator.final_state or {}
+        api_response_payload = final_state.get("final_result")
+        if final_state.get('error') or not isinstance(api_response_payload, dict):
+            error_message = f"Generation failed: {final_state.get('error') or 'final result payload structure missing or invalid.'}"
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=error_message)
+            yield {"event": "error", "data": json.dumps({"job_id": job_id, "detail": error_message}, ensure_ascii=False)}
+            return
+
+        result = {key: value for key, value in api_response_payload.items() if key != 'job_id'}
+        yield {"event": "result", "data": json.dumps({"job_id": job_id, "result": result}, ensure_ascii=False)}
+
+    return EventSourceResponse(event_stream())
+
 # --- Data Management Endpoints ---
 
 @data_management_router.get("/materials", response_model=List[Material])
@@ -169,31 +256,76 @@ async def update_material_name(material_id: int, request: UpdateMaterialRequest)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database update failed: {e}")
 
-@data_management_router.post("/ingest", response_model=IngestResponse)
-async def ingest_document(course_id: int = Form(1), uploader_id: int = Form(1), file: UploadFile = File(...)):
+@data_management_router.post("/ingest", response_model=IngestJobResponse, status_code=202)
+async def ingest_document(response: Response, course_id: int = Form(1), uploader_id: int = Form(1), chunking_strategy: Optional[str] = Form(None), file: UploadFile = File(...)):
     """
     Endpoint to ingest a document.
+    The upload is hashed while it is written to disk. Content that was already
+    ingested is linked to the course right away (200, status "completed");
+    anything new is queued for the ingestion workers (202) and the job id is
+    returned at once; poll GET /ingest/{job_id} for progress and the unique_content_id.
+    `chunking_strategy` ('fixed' or 'recursive') overrides the CHUNKING_STRATEGY environment variable.
     """
-    with tempfile.TemporaryDirectory() as temp_dir:
-        file_path = os.path.join(temp_dir, file.filename)
+    if chunking_strategy and chunking_strategy.lower() not in CHUNKING_STRATEGIES:
+        raise HTTPException(status_code=422, detail=f"Unsupported chunking_strategy '{chunking_strategy}'. Expected one of {list(CHUNKING_STRATEGIES)}.")
+
+    job_id = await run_in_threadpool(create_ingestion_job, uploader_id, file.filename)
+    if not job_id:
+        raise HTTPException(status_code=500, detail="Failed to create an ingestion job.")
+
+    file_path = ingestion_queue.stage_upload_path(file.filename)
+    try:
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        unique_content_id = await run_in_threadpool(
-            process_file,
-            file_path=file_path,
-            uploader_id=uploader_id,
-            course_id=course_id,
-            force_reprocess=False
-        )
-    if unique_content_id is None:
-        raise HTTPException(status_code=500, detail="Failed to process the document.")
-    return IngestResponse(
-        unique_content_id=unique_content_id,
+            content_hash, _ = await run_in_threadpool(copy_and_hash, file.file, buffer)
+        existing_id = await run_in_threadpool(link_existing_content, job_id, content_hash, file.filename, uploader_id, course_id)
+        if existing_id is None:
+            await run_in_threadpool(
+                ingestion_queue.enqueue,
+                job_id=job_id,
+                file_path=file_path,
+                uploader_id=uploader_id,
+                course_id=course_id,
+                force_reprocess=False,
+                chunking_strategy=chunking_strategy,
+                content_hash=content_hash
+            )
+        else:
+            shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+            await run_in_threadpool(
+                ingestion_queue.record_duplicate,
+                job_id=job_id,
+                file_path=file_path,
+                uploader_id=uploader_id,
+                course_id=course_id,
+                content_hash=content_hash,
+                unique_content_id=existing_id
+            )
+    except Exception as e:
+        shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+        await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+        raise HTTPException(status_code=500, detail=f"Failed to queue the document: {e}")
+
+    if existing_id is not None:
+        response.status_code = 200
+    return IngestJobResponse(
+        job_id=job_id,
         file_name=file.filename,
-        message=f"Successfully ingested file '{file.filename}'."
+        status="queued" if existing_id is None else "completed",
+        status_url=f"/api/v1/ingest/{job_id}",
+        unique_content_id=existing_id
     )
 
+@data_management_router.get("/ingest/{job_id}", response_model=IngestStatusResponse)
+async def get_ingest_status(job_id: int):
+    """
+    Endpoint to poll an ingestion job: queue status, overall progress and the
+    status and duration of each ingestion stage logged so far.
+    """
+    status = await run_in_threadpool(ingestion_queue.get_ingestion_status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found.")
+    return status
+
 # --- Development & Testing Endpoints ---
 
 @testing_router.post("/generate_exam", response_model=ChatResponse)
@@ -202,7 +334,7 @@ async def generate_exam_skill_test(request: ChatRequest):
     **Skill Test Endpoint:** Directly triggers the exam generation flow.
     This bypasses the main agent router for isolated testing of the exam generation skill.
     """
-    job_id = db_logger.create_job(
+    job_id = await async_db_logger.create_job(
         user_id=request.user_id,
         input_prompt=request.prompt,
         workflow_type='skill_test_generate_exam'
@@ -220,10 +352,10 @@ async def generate_exam_skill_test(request: ChatRequest):
     }
 
     try:
-        final_state = await run_in_threadpool(teacher_agent_app.invoke, inputs)
+        final_state = await run_teacher_agent(inputs)
         if final_state.get('error'):
             error_message = f"Generation failed: {final_state.get('error')}"
-            db_logger.update_job_status(job_id, 'failed', error_message=error_message)
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=error_message)
             raise HTTPException(status_code=500, detail=error_message)
         else:
             json_serializable_content = json.loads(json.dumps(final_state.get("final_result", []), ensure_ascii=False))
@@ -232,7 +364,7 @@ async def generate_exam_skill_test(request: ChatRequest):
                 result=json_serializable_content
             )
     except Exception as e:
-        db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+        await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 @testing_router.post("/ingest_and_generate", response_model=ChatResponse)
@@ -250,21 +382,21 @@ async def test_ingest_and_generate(prompt: str = Form(...), course_id: int = For
         raise HTTPException(status_code=500, detail="[Test] Failed to process the document.")
 
     # Generation Part
-    job_id = db_logger.create_job(user_id=uploader_id, input_prompt=prompt, workflow_type='e2e_test_ingest_and_generate')
+    job_id = await async_db_logger.create_job(user_id=uploader_id, input_prompt=prompt, workflow_type='e2e_test_ingest_and_generate')
     if not job_id:
         raise HTTPException(status_code=500, detail="[Test] Failed to create a job.")
     inputs = {"job_id": job_id, "user_id": uploader_id, "user_query": prompt, "unique_content_id": unique_content_id, "task_name": "exam_generation", "task_parameters": {}}
     try:
-        final_state = await run_in_threadpool(teacher_agent_app.invoke, inputs)
+        final_state = await run_teacher_agent(inputs)
         if final_state.get('error'):
             error_message = f"[Test] Generation failed: {final_state.get('error')}"
-            db_logger.update_job_status(job_id, 'failed', error_message=error_message)
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=error_message)
             raise HTTPException(status_code=500, detail=error_message)
         else:
-            db_logger.update_job_status(job_id, 'completed')
+            await async_db_logger.update_job_status(job_id, 'completed')
             return ChatResponse(job_id=job_id, result=final_state.get("final_generated_content", []))
     except Exception as e:
-        db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+        await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
         raise HTTPException(status_code=500, detail=f"[Test] An unexpected error occurred: {str(e)}")
 
 # --- Test Critic Workflow ---
@@ -317,7 +449,7 @@ async def test_critic_workflow(request: TestCriticWorkflowRequest):
         from backend.app.agents.teacher_agent.graph import app as teacher_app
         
         # Create job
-        job_id = db_logger.create_job(
+        job_id = await async_db_logger.create_job(
             user_id=request.user_id,
             input_prompt=request.prompt,
             workflow_type=request.workflow_mode,
@@ -391,7 +523,7 @@ async def test_critic_workflow(request: TestCriticWorkflowRequest):
         import traceback
         traceback.print_exc()
         if 'job_id' in locals():
-            db_logger.update_job_status(job_id, 'failed', error_message=str(e))
+            await async_db_logger.update_job_status(job_id, 'failed', error_message=str(e))
         raise HTTPException(status_code=500, detail=f"Workflow failed: {str(e)}")
 
 
@@ -608,6 +740,20 @@ def health_check():
     """
     return {"status": "ok"}
 
+@app.on_event("shutdown")
+def flush_task_logs_on_shutdown():
+    """
+    Writes any task logs still queued by the write-behind logger before the process exits.
+    """
+    db_logger.shutdown_task_logs()
+
+@app.get("/health/db_pool", tags=["System"])
+def db_pool_metrics():
+    """
+    Returns connection pool counters (checkouts, wait time, overflow) for each shared database engine.
+    """
+    return get_pool_metrics()
+
 # Register the routers with the main FastAPI app
 
 app.include_router(data_management_router)
@@ -1,16 +1,16 @@
 from sqlalchemy import Column, Integer, Text, JSON, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
 from sqlalchemy import and_, or_
 from datetime import datetime
 import sys
 import os
 
+from backend.app.utils.db_engine import get_engine
+
 Base = declarative_base()
 
-oj_db_uri = os.getenv("OJ_DATABASE_URL")
-engine = create_engine(oj_db_uri)
+engine = get_engine("OJ_DATABASE_URL")
 Session = sessionmaker(bind=engine)
 
 # define Problem model
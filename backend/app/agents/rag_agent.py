@@ -1,24 +1,208 @@
 
 import os
+import json
+import threading
+import time
+from collections import namedtuple
 from typing import List, Dict, Any, Tuple, Optional
-from sqlalchemy import create_engine, text, MetaData, Table, select
+from sqlalchemy import text, MetaData, Table, select, Integer, Text, JSON
 from dotenv import load_dotenv
 from pgvector.sqlalchemy import Vector
 
 from backend.app.services.embedding_service import embedding_service
+from backend.app.services.query_terms import extract_lexical_terms, to_ilike_patterns
+from backend.app.services.vector_index_cache import vector_index_cache, DocumentIndex, RAG_VECTOR_CACHE_ENABLED
+from backend.app.utils.db_engine import get_engine
 
 # --- Database Setup ---
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set.")
-
-engine = create_engine(DATABASE_URL)
+engine = get_engine()
 metadata = MetaData()
 
-# Reflect existing tables
-document_chunks = Table('document_chunks', metadata, autoload_with=engine)
-document_content = Table('document_content', metadata, autoload_with=engine)
+# Only the table names are used (the queries below are raw SQL), so the tables are
+# not reflected and importing the agent does not open a database connection.
+document_chunks = Table('document_chunks', metadata)
+document_content = Table('document_content', metadata)
+
+# --- Retrieval Strategy Configuration ---
+# 'auto' picks per document from the planner's row estimate; 'exact' and 'hnsw' force one path.
+RAG_SEARCH_STRATEGY = os.getenv("RAG_SEARCH_STRATEGY", "auto").lower()
+# Documents estimated at or below this many chunks are ranked exactly via the btree index.
+RAG_EXACT_SCAN_MAX_CHUNKS = int(os.getenv("RAG_EXACT_SCAN_MAX_CHUNKS", "20000"))
+# hnsw.ef_search for the HNSW path; raised to top_k when top_k is larger.
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "100"))
+# How long a document's planner estimate is reused before asking again.
+RAG_ESTIMATE_TTL_SECONDS = int(os.getenv("RAG_ESTIMATE_TTL_SECONDS", "300"))
+
+# Documents estimated above this many chunks are never loaded into the in-process vector cache.
+RAG_VECTOR_CACHE_MAX_CHUNKS = int(os.getenv("RAG_VECTOR_CACHE_MAX_CHUNKS", "50000"))
+
+# --- Hybrid Retrieval Configuration ---
+# 'hybrid' fuses the vector ranking with a lexical ranking of exact query terms;
+# 'vector' is cosine search only. Can be overridden per search() call.
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+# Each leg contributes its best top_k * multiplier candidates to the fusion.
+RAG_HYBRID_CANDIDATE_MULTIPLIER = int(os.getenv("RAG_HYBRID_CANDIDATE_MULTIPLIER", "4"))
+# The k constant of reciprocal rank fusion: score = sum(1 / (k + rank)).
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+
+# Exact path: the MATERIALIZED CTE stops the planner from pushing the ORDER BY
+# into the global HNSW index, so the filter uses idx_document_chunks_unique_content_id
+# and every chunk of the document is ranked.
+_EXACT_TOP_CHUNKS_SQL = f"""
+    WITH doc_chunks AS MATERIALIZED (
+        SELECT id, chunk_text, metadata, embedding
+        FROM {document_chunks.name}
+        WHERE unique_content_id = :unique_content_id
+    )
+    SELECT id, chunk_text, metadata, embedding <=> :query_embedding AS rank_key
+    FROM doc_chunks
+    ORDER BY rank_key
+    LIMIT :candidate_k
+"""
+
+# HNSW path: walks the global graph; with iterative scans enabled pgvector keeps
+# scanning until enough rows of this document pass the filter.
+_HNSW_TOP_CHUNKS_SQL = f"""
+    SELECT id, chunk_text, metadata, embedding <=> :query_embedding AS rank_key
+    FROM {document_chunks.name}
+    WHERE unique_content_id = :unique_content_id
+    ORDER BY embedding <=> :query_embedding
+    LIMIT :candidate_k
+"""
+
+# Hybrid: the vector leg's candidates and the chunks matching the most query
+# terms (ILIKE, served by the trigram index) are merged with reciprocal rank
+# fusion. rank_key is the negated fused score so lower still sorts first.
+_HYBRID_TOP_CHUNKS_SQL = f"""
+    WITH vector_hits AS ({{vector_sql}}),
+    vector_ranked AS (
+        SELECT id, row_number() OVER (ORDER BY rank_key) AS rnk FROM vector_hits
+    ),
+    lexical_hits AS (
+        SELECT id, chunk_order,
+               (SELECT count(*) FROM unnest(CAST(:lexical_patterns AS text[])) AS p(pattern)
+                WHERE chunk_text ILIKE p.pattern) AS term_hits
+        FROM {document_chunks.name}
+        WHERE unique_content_id = :unique_content_id
+          AND chunk_text ILIKE ANY(CAST(:lexical_patterns AS text[]))
+    ),
+    lexical_ranked AS (
+        SELECT id, row_number() OVER (ORDER BY term_hits DESC, chunk_order) AS rnk
+        FROM lexical_hits
+        ORDER BY rnk
+        LIMIT :candidate_k
+    ),
+    fused AS (
+        SELECT id, sum(1.0 / (:rrf_k + rnk)) AS score
+        FROM (SELECT id, rnk FROM vector_ranked UNION ALL SELECT id, rnk FROM lexical_ranked) AS ranks
+        GROUP BY id
+        ORDER BY score DESC
+        LIMIT :top_k
+    )
+    SELECT c.id, c.chunk_text, c.metadata, -f.score AS rank_key
+    FROM fused f
+    JOIN {document_chunks.name} c ON c.id = f.id
+"""
+
+# One round trip: the top-k chunks plus the distinct pages they cite, as
+# 'chunk' rows (by rank) followed by 'page' rows (by page number).
+# Only the page columns the generators use are selected.
+_SEARCH_SQL = f"""
+    WITH top_chunks AS ({{top_chunks_sql}}),
+    cited_pages AS (
+        SELECT DISTINCT (json_array_elements_text(metadata -> 'page_numbers'))::int AS page_number
+        FROM top_chunks
+    )
+    SELECT 'chunk' AS kind, id, chunk_text, metadata, rank_key AS sort_key, NULL::int AS page_number, NULL::json AS structured_content
+    FROM top_chunks
+    UNION ALL
+    SELECT 'page', NULL, NULL, NULL, dc.page_number, dc.page_number, dc.structured_content
+    FROM {document_content.name} dc
+    JOIN cited_pages cp ON cp.page_number = dc.page_number
+    WHERE dc.unique_content_id = :unique_content_id
+    ORDER BY kind, sort_key
+"""
+_VECTOR_SQL = {"exact": _EXACT_TOP_CHUNKS_SQL, "hnsw": _HNSW_TOP_CHUNKS_SQL}
+# Keyed by (strategy, hybrid)
+_SEARCH_STATEMENTS = {
+    (strategy, hybrid): text(_SEARCH_SQL.format(
+        top_chunks_sql=_HYBRID_TOP_CHUNKS_SQL.format(vector_sql=vector_sql) if hybrid else vector_sql
+    ))
+    for strategy, vector_sql in _VECTOR_SQL.items()
+    for hybrid in (False, True)
+}
+
+# Batch search: one statement for many query vectors. Each query gets its own
+# top-k through a LATERAL join; the cited pages are merged and fetched once.
+_SEARCH_MANY_SQL = f"""
+    WITH queries AS (
+        SELECT (q.ordinality - 1)::int AS query_index, CAST(q.vec AS vector) AS query_embedding
+        FROM unnest(CAST(:query_embeddings AS text[])) WITH ORDINALITY AS q(vec, ordinality)
+    ),
+    {{doc_chunks_cte}}
+    hits AS (
+        SELECT q.query_index, h.id, h.chunk_text, h.metadata, h.rank_key
+        FROM queries q
+        CROSS JOIN LATERAL (
+            SELECT id, chunk_text, metadata, embedding <=> q.query_embedding AS rank_key
+            FROM {{chunk_source}}
+            ORDER BY embedding <=> q.query_embedding
+            LIMIT :top_k
+        ) h
+    ),
+    cited_pages AS (
+        SELECT DISTINCT (json_array_elements_text(metadata -> 'page_numbers'))::int AS page_number
+        FROM hits
+    )
+    SELECT 'chunk' AS kind, query_index, id, chunk_text, metadata, rank_key AS sort_key, NULL::int AS page_number, NULL::json AS structured_content
+    FROM hits
+    UNION ALL
+    SELECT 'page', NULL, NULL, NULL, NULL, dc.page_number, dc.page_number, dc.structured_content
+    FROM {document_content.name} dc
+    JOIN cited_pages cp ON cp.page_number = dc.page_number
+    WHERE dc.unique_content_id = :unique_content_id
+    ORDER BY kind, query_index, sort_key
+"""
+_SEARCH_MANY_STATEMENTS = {
+    # Exact: the document is read once through the btree index and ranked per query.
+    "exact": text(_SEARCH_MANY_SQL.format(
+        doc_chunks_cte=f"""doc_chunks AS MATERIALIZED (
+        SELECT id, chunk_text, metadata, embedding
+        FROM {document_chunks.name}
+        WHERE unique_content_id = :unique_content_id
+    ),""",
+        chunk_source="doc_chunks",
+    )),
+    # HNSW: one parameterized index scan per query.
+    "hnsw": text(_SEARCH_MANY_SQL.format(
+        doc_chunks_cte="",
+        chunk_source=f"{document_chunks.name} WHERE unique_content_id = :unique_content_id",
+    )),
+}
+
+# In-process tier (RAG_VECTOR_CACHE_ENABLED): a hot document is loaded once...
+# Only completed content is loaded. Ingestion runs in the worker processes, so
+# an API process never hears about chunks being rewritten; content still being
+# (re)ingested is searched in SQL instead of being frozen in the cache.
+_LOAD_DOCUMENT_SQL = text(f"""
+    SELECT id, chunk_text, metadata, embedding
+    FROM {document_chunks.name}
+    WHERE unique_content_id = :unique_content_id
+      AND EXISTS (SELECT 1 FROM unique_contents WHERE id = :unique_content_id AND processing_status = 'completed')
+    ORDER BY chunk_order
+""").columns(id=Integer, chunk_text=Text, metadata=JSON, embedding=Vector)
+
+# ...after which each search only fetches the cited pages.
+_CITED_PAGES_SQL = text(f"""
+    SELECT page_number, structured_content
+    FROM {document_content.name}
+    WHERE unique_content_id = :unique_content_id AND page_number = ANY(:page_numbers)
+    ORDER BY page_number
+""")
+
+# The row shape shared by the SQL and in-process search paths.
+_SearchRow = namedtuple("_SearchRow", ["kind", "id", "chunk_text", "metadata", "page_number", "structured_content", "query_index"], defaults=(None,))
 
 
 class RAGAgent:
@@ -26,7 +210,131 @@ class RAGAgent:
     Agent for performing Retrieval-Augmented Generation tasks.
     # This class handles all RAG-related logic.
     """
-    def search(self, user_prompt: str, unique_content_id: int, top_k: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    def __init__(self):
+        self._estimates: Dict[int, Tuple[int, float]] = {}
+        self._estimates_lock = threading.Lock()
+        self._supports_iterative_scan: Optional[bool] = None
+
+    # --- Strategy Selection ---
+
+    def _estimated_chunk_count(self, conn, unique_content_id: int) -> int:
+        """
+        The planner's row estimate for one document's chunks (from pg_stats, no scan).
+        Cached for RAG_ESTIMATE_TTL_SECONDS.
+        """
+        now = time.monotonic()
+        with self._estimates_lock:
+            cached = self._estimates.get(unique_content_id)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        plan = conn.execute(
+            text(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM {document_chunks.name} WHERE unique_content_id = :unique_content_id"),
+            {"unique_content_id": unique_content_id}
+        ).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+        with self._estimates_lock:
+            self._estimates[unique_content_id] = (estimate, now + RAG_ESTIMATE_TTL_SECONDS)
+        return estimate
+
+    def _choose_strategy(self, conn, unique_content_id: int) -> str:
+        """Returns 'exact' or 'hnsw' for this document."""
+        if RAG_SEARCH_STRATEGY in ("exact", "hnsw"):
+            return RAG_SEARCH_STRATEGY
+        try:
+            estimate = self._estimated_chunk_count(conn, unique_content_id)
+        except Exception as e:
+            print(f"RAGAgent: Warning - could not get planner estimate, using exact scan: {e}")
+            return "exact"
+        return "exact" if estimate <= RAG_EXACT_SCAN_MAX_CHUNKS else "hnsw"
+
+    def _prepare_hnsw_scan(self, conn, top_k: int):
+        """Sets transaction-local HNSW options: ef_search >= top_k, iterative scans where supported (pgvector >= 0.8)."""
+        conn.execute(text(f"SET LOCAL hnsw.ef_search = {max(RAG_HNSW_EF_SEARCH, top_k)}"))
+        if self._supports_iterative_scan is None:
+            version = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).scalar() or "0"
+            major_minor = tuple(int(part) for part in version.split(".")[:2] if part.isdigit())
+            self._supports_iterative_scan = major_minor >= (0, 8)
+        if self._supports_iterative_scan:
+            conn.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+
+    def _search_rows(self, conn, query_embedding: List[float], unique_content_id: int, top_k: int, lexical_terms: List[str]) -> List[Any]:
+        """Runs the combined chunk + page query with the strategy chosen for this document."""
+        strategy = self._choose_strategy(conn, unique_content_id)
+        hybrid = bool(lexical_terms)
+        candidate_k = top_k * RAG_HYBRID_CANDIDATE_MULTIPLIER if hybrid else top_k
+        if strategy == "hnsw":
+            self._prepare_hnsw_scan(conn, candidate_k)
+        print(f"RAGAgent: Using '{strategy}' retrieval for document ID {unique_content_id}"
+              + (f", fused with lexical terms {lexical_terms}." if hybrid else "."))
+        params = {"query_embedding": str(query_embedding), "unique_content_id": unique_content_id, "top_k": top_k, "candidate_k": candidate_k}
+        if hybrid:
+            params.update({"lexical_patterns": to_ilike_patterns(lexical_terms), "rrf_k": RAG_RRF_K})
+        return conn.execute(_SEARCH_STATEMENTS[(strategy, hybrid)], params).fetchall()
+
+    # --- In-Process Tier ---
+
+    def _load_document_index(self, unique_content_id: int) -> Optional[DocumentIndex]:
+        with engine.connect() as conn:
+            if self._estimated_chunk_count(conn, unique_content_id) > RAG_VECTOR_CACHE_MAX_CHUNKS:
+                return None
+            rows = conn.execute(_LOAD_DOCUMENT_SQL, {"unique_content_id": unique_content_id}).fetchall()
+        if not rows:
+            return None
+        print(f"RAGAgent: Loaded {len(rows)} chunk embeddings of document ID {unique_content_id} into the in-process index.")
+        return DocumentIndex(
+            ids=[row.id for row in rows],
+            texts=[row.chunk_text for row in rows],
+            metadatas=[row.metadata or {} for row in rows],
+            embeddings=[row.embedding for row in rows],
+        )
+
+    def _hot_index(self, unique_content_id: int) -> Optional[DocumentIndex]:
+        """The document's in-process index, loading it on first use; None when the tier is off or unavailable."""
+        if not RAG_VECTOR_CACHE_ENABLED:
+            return None
+        try:
+            return vector_index_cache.get_or_load(unique_content_id, lambda: self._load_document_index(unique_content_id))
+        except Exception as e:
+            print(f"RAGAgent: Warning - in-process index unavailable, using SQL search: {e}")
+            return None
+
+    def _cached_search_rows(self, index: DocumentIndex, query_embeddings: List[List[float]], unique_content_id: int, top_k: int, lexical_terms: List[str]) -> List[_SearchRow]:
+        """Ranks the document in memory for each query and fetches only the cited pages from Postgres."""
+        rows, page_numbers = [], set()
+        for query_index, query_embedding in enumerate(query_embeddings):
+            ranked = index.search(query_embedding, top_k, lexical_terms, RAG_HYBRID_CANDIDATE_MULTIPLIER, RAG_RRF_K)
+            for row_index, _ in ranked:
+                chunk = index.chunk(row_index)
+                page_numbers.update(chunk["metadata"].get("page_numbers", []))
+                rows.append(_SearchRow("chunk", chunk["id"], chunk["chunk_text"], chunk["metadata"], None, None, query_index))
+        if page_numbers:
+            with engine.connect() as conn:
+                pages = conn.execute(_CITED_PAGES_SQL, {"unique_content_id": unique_content_id, "page_numbers": sorted(page_numbers)}).fetchall()
+            rows.extend(_SearchRow("page", None, None, None, page.page_number, page.structured_content) for page in pages)
+        return rows
+
+    @staticmethod
+    def _chunk_result(row) -> Dict[str, Any]:
+        return {
+            "chunk_id": row.id,
+            "text": row.chunk_text,
+            "source_pages": (row.metadata or {}).get("page_numbers", [])
+        }
+
+    @staticmethod
+    def _page_result(row, unique_content_id: int) -> Dict[str, Any]:
+        return {
+            "type": "structured_page_content",
+            "source_document_id": unique_content_id,
+            "page_number": row.page_number,
+            "content": row.structured_content
+        }
+
+    def search(self, user_prompt: str, unique_content_id: int, top_k: Optional[int] = None, mode: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
         """
         Performs a multi-modal RAG search and returns a dictionary separating
         text chunks from full page content.
@@ -35,6 +343,8 @@ class RAGAgent:
             user_prompt: The user's query.
             unique_content_id: The ID of the specific document to search within.
             top_k: The number of top similar chunks to retrieve. If None, it will be read from RAG_TOP_K environment variable, defaulting to 3.
+            mode: 'hybrid' (vector + lexical, fused with RRF) or 'vector'. Defaults to RAG_RETRIEVAL_MODE.
+                Hybrid falls back to vector-only when the prompt has no exact-match terms.
 
         Returns:
             A dictionary with two keys:
@@ -43,78 +353,94 @@ class RAGAgent:
         """
         if top_k is None:
             top_k = int(os.getenv("RAG_TOP_K", "3"))
+        mode = (mode or RAG_RETRIEVAL_MODE).lower()
+        lexical_terms = extract_lexical_terms(user_prompt) if mode == "hybrid" else []
         
         print(f"--- RAGAgent: Starting Search for prompt: '{user_prompt}' within document ID: {unique_content_id} ---")
 
-        # Step 1: Vector Search (Text RAG)
-        print(f"RAGAgent: Step 1 - Performing vector search for top {top_k} chunks...")
+        # Step 1: Embed the prompt
         query_embedding = embedding_service.create_embeddings([user_prompt])[0][0]
 
-        stmt = text(f"""
-            SELECT id, chunk_text, metadata
-            FROM {document_chunks.name}
-            WHERE unique_content_id = :unique_content_id
-            ORDER BY embedding <=> :query_embedding
-            LIMIT :top_k
-        """)
+        # Step 2: Top-k chunks and their pages, from the in-process index when the
+        # document is hot, otherwise in a single SQL statement.
+        print(f"RAGAgent: Step 2 - Retrieving top {top_k} chunks and their pages...")
+        index = self._hot_index(unique_content_id)
+        if index is not None:
+            rows = self._cached_search_rows(index, [query_embedding], unique_content_id, top_k, lexical_terms)
+        else:
+            # One short transaction so SET LOCAL options stay scoped to this query.
+            with engine.begin() as conn:
+                rows = self._search_rows(conn, query_embedding, unique_content_id, top_k, lexical_terms)
 
-        with engine.connect() as conn:
-            similar_chunks_results = conn.execute(
-                stmt,
-                {"query_embedding": str(query_embedding), "unique_content_id": unique_content_id, "top_k": top_k}
-            ).fetchall()
+        found_text_chunks = [self._chunk_result(row) for row in rows if row.kind == "chunk"]
+        found_page_content = [self._page_result(row, unique_content_id) for row in rows if row.kind == "page"]
 
-        if not similar_chunks_results:
+        if not found_text_chunks:
             print("RAGAgent: No similar chunks found for the given document ID.")
             return {"text_chunks": [], "page_content": []}
-        
-        print(f"RAGAgent: Found {len(similar_chunks_results)} similar chunks.")
-
-        # Process found text chunks for debugging and to find page numbers
-        found_text_chunks = []
-        page_numbers_to_retrieve = set()
-        for chunk in similar_chunks_results:
-            chunk_id, chunk_text, meta = chunk
-            page_numbers = meta.get("page_numbers", [])
-            page_numbers_to_retrieve.update(page_numbers)
-            found_text_chunks.append({
-                "chunk_id": chunk_id,
-                "text": chunk_text,
-                "source_pages": page_numbers
-            })
-
-        # Step 2 & 3: Retrieve Full Multimodal Content
-        print("RAGAgent: Step 2 & 3 - Retrieving full multimodal content for relevant pages...")
-        found_page_content = []
-        if page_numbers_to_retrieve:
-            print(f"RAGAgent: Querying structured content for document ID {unique_content_id}, pages: {list(page_numbers_to_retrieve)}")
-            
-            page_numbers_str = ", ".join(map(str, page_numbers_to_retrieve))
-            content_stmt = text(f"""
-                SELECT page_number, structured_content
-                FROM {document_content.name}
-                WHERE unique_content_id = :unique_content_id AND page_number IN ({page_numbers_str})
-                ORDER BY page_number
-            """)
-            
-            with engine.connect() as conn:
-                retrieved_pages = conn.execute(content_stmt, {"unique_content_id": unique_content_id}).fetchall()
-
-            for page in retrieved_pages:
-                page_num, structured_data = page
-                found_page_content.append({
-                    "type": "structured_page_content",
-                    "source_document_id": unique_content_id,
-                    "page_number": page_num,
-                    "content": structured_data
-                })
-        
+
+        print(f"RAGAgent: Found {len(found_text_chunks)} similar chunks across {len(found_page_content)} pages.")
         print("RAGAgent: --- Search Finished ---")
         return {
             "text_chunks": found_text_chunks,
             "page_content": found_page_content
         }
 
+    def search_many(self, queries: List[str], unique_content_id: int, top_k: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Vector search for several queries against one document in a single pass:
+        one embedding request for all queries and one SQL statement for all
+        retrievals (or the in-process index when the document is hot).
+
+        Args:
+            queries: The queries, e.g. one per planned topic.
+            unique_content_id: The ID of the specific document to search within.
+            top_k: Chunks per query. Defaults to RAG_TOP_K.
+
+        Returns:
+            A dictionary with three keys:
+            - "per_query": One {"query", "text_chunks"} entry per query, in input order.
+            - "text_chunks": All retrieved chunks, deduplicated, in order of first appearance.
+            - "page_content": The merged, deduplicated pages cited by any query, by page number.
+        """
+        if top_k is None:
+            top_k = int(os.getenv("RAG_TOP_K", "3"))
+        if not queries:
+            return {"per_query": [], "text_chunks": [], "page_content": []}
+
+        print(f"--- RAGAgent: Starting batch search for {len(queries)} queries within document ID: {unique_content_id} ---")
+        query_embeddings = embedding_service.create_embeddings(list(queries))[0]
+
+        index = self._hot_index(unique_content_id)
+        if index is not None:
+            rows = self._cached_search_rows(index, query_embeddings, unique_content_id, top_k, [])
+        else:
+            with engine.begin() as conn:
+                strategy = self._choose_strategy(conn, unique_content_id)
+                if strategy == "hnsw":
+                    self._prepare_hnsw_scan(conn, top_k)
+                rows = conn.execute(_SEARCH_MANY_STATEMENTS[strategy], {
+                    "query_embeddings": [str(embedding) for embedding in query_embeddings],
+                    "unique_content_id": unique_content_id,
+                    "top_k": top_k,
+                }).fetchall()
+
+        per_query = [{"query": query, "text_chunks": []} for query in queries]
+        merged_chunks: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            if row.kind == "chunk":
+                chunk = self._chunk_result(row)
+                per_query[row.query_index]["text_chunks"].append(chunk)
+                merged_chunks.setdefault(row.id, chunk)
+        page_content = [self._page_result(row, unique_content_id) for row in rows if row.kind == "page"]
+
+        print(f"RAGAgent: Batch search found {len(merged_chunks)} distinct chunks across {len(page_content)} pages.")
+        return {
+            "per_query": per_query,
+            "text_chunks": list(merged_chunks.values()),
+            "page_content": page_content
+        }
+
 # Singleton instance for easy access
 rag_agent = RAGAgent()
 
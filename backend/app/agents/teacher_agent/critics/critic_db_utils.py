@@ -16,7 +16,8 @@ from backend.app.utils.db_logger import (
     generated_contents, 
     agent_tasks,
     agent_task_sources,
-    TAIPEI_TZ
+    TAIPEI_TZ,
+    flush_task_logs
 )
 
 # Reflect document_chunks table
@@ -182,6 +183,7 @@ def get_rag_chunks_by_job_id(job_id: int, limit: int = 10) -> List[Dict[str, Any
         logger.warning("document_chunks table not available")
         return []
     
+    flush_task_logs()
     try:
         with engine.connect() as conn:
             # Import and_ for proper SQL and condition
@@ -270,6 +272,7 @@ def save_evaluation_to_db(
         logger.warning("task_evaluations table not available")
         return None
     
+    flush_task_logs() # the evaluation task's parent may still be queued
     try:
         with engine.connect() as conn:
             # Step 1: Create AGENT_TASK for evaluation
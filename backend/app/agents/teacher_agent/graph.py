@@ -1,3 +1,4 @@
+import asyncio
 import time
 import json
 import logging
@@ -6,6 +7,7 @@ from pydantic import BaseModel, Field
 from datetime import datetime
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 
 logger = logging.getLogger(__name__)
 
@@ -15,8 +17,10 @@ from backend.app.utils.db_logger import log_task
 # Import helpers from the exam_generator skill
 from backend.app.agents.teacher_agent.skills.exam_generator.exam_nodes import get_llm, MODEL_PRICING
 from backend.app.agents.teacher_agent.skills.exam_generator.graph import app as exam_generator_app
-from backend.app.agents.teacher_agent.skills.general_chat.nodes import general_chat_node
+from backend.app.agents.teacher_agent.skills.general_chat.nodes import general_chat_node, ageneral_chat_node
 from backend.app.agents.teacher_agent.skills.summarization.graph import app as summarization_app # New import
+from backend.app.agents.teacher_agent.router_classifier import fast_route
+from backend.app.services.semantic_cache import semantic_cache, CACHE_MISS_LOG
 # TEMPORARILY DISABLED FOR TESTING - Critic integration
 # from backend.app.agents.teacher_agent.critics.graph import critic_app # Import Critic Agent
 # from backend.app.agents.teacher_agent.critics.state import CriticState # Import Critic State
@@ -28,14 +32,12 @@ class Route(BaseModel):
 
 # --- Router Node ---
 
-@log_task(agent_name="teacher_agent_router", task_description="Route user query to an appropriate skill.", input_extractor=lambda state: {"user_query": state.get("user_query")})
-def router_node(state: TeacherAgentState) -> dict:
-    """
-    Determines which skill to use based on the user's query using an LLM.
-    The logging is handled by the @log_task decorator.
-    """
+ROUTER_CACHE_NAMESPACE = "router"
+
+def _build_router_request(state: TeacherAgentState):
+    """Builds the tool-bound router model and its messages for the user query."""
     user_query = state.get("user_query", "")
-    
+
     system_prompt = (
         "You are an expert router agent. Your job is to analyze the user's query and "
         "decide which of the available skills is most appropriate to handle the request. "
@@ -51,49 +53,130 @@ def router_node(state: TeacherAgentState) -> dict:
     
     human_prompt = "\n".join(skill_descriptions) + f"\n\n**User Query:**\n\"{user_query}\""
     
-    try:
-        llm = get_llm()
-        router_llm = llm.bind_tools(tools=[Route], tool_choice="Route")
-        messages = [SystemMessage(content=system_prompt), HumanMessage(content=human_prompt)]
-        
-        response = router_llm.invoke(messages)
-        
-        if not response.tool_calls:
-            raise ValueError("The router model did not call the required 'Route' tool.")
-        
-        chosen_route = Route(**response.tool_calls[0]['args'])
-        next_node = chosen_route.next_skill
-        
-        logger.info(f"LLM Router decided: {next_node}")
+    llm = get_llm()
+    router_llm = llm.bind_tools(tools=[Route], tool_choice="Route")
+    messages = [SystemMessage(content=system_prompt), HumanMessage(content=human_prompt)]
+    return llm, router_llm, messages
+
+def _fast_route_result(decision, attempts: list) -> dict:
+    """State update for a decision made without the LLM (zero tokens)."""
+    logger.info(f"Fast router ({decision.tier}) decided: {decision.skill} (confidence {decision.confidence:.2f})")
+    return {
+        "next_node": decision.skill,
+        "action_taken": f"Routed to {decision.skill} skill by the {decision.tier} classifier.",
+        "routing": {"tier": decision.tier, "confidence": round(decision.confidence, 4), "attempts": attempts},
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "estimated_cost_usd": 0.0
+    }
 
-        token_usage = response.response_metadata.get("token_usage", {})
-        prompt_tokens = token_usage.get("prompt_tokens", 0)
-        completion_tokens = token_usage.get("completion_tokens", 0)
-        model_name = llm.model_name
-        pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
-        estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+def _cached_route_result(hit, attempts: list) -> dict:
+    """State update for an LLM decision replayed from the semantic cache (zero tokens)."""
+    logger.info(f"Router decision served from semantic cache: {hit.value} (similarity {hit.similarity:.3f})")
+    return {
+        "next_node": hit.value,
+        "action_taken": f"Routed to {hit.value} skill (cached decision).",
+        "routing": {"tier": "semantic_cache", "attempts": attempts},
+        "semantic_cache": hit.as_log(),
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "estimated_cost_usd": 0.0
+    }
 
-        return {
-            "next_node": next_node,
-            "action_taken": f"Routed to {next_node} skill.",
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "estimated_cost_usd": estimated_cost
-        }
+def _local_route(user_query: str):
+    """
+    Tries everything that avoids the LLM call: the fast-path tiers, then
+    earlier LLM decisions for semantically equivalent queries.
+    Returns (state update or None, tiers consulted).
+    """
+    decision, attempts = fast_route(user_query)
+    if decision:
+        return _fast_route_result(decision, attempts), attempts
+    hit = semantic_cache.get(ROUTER_CACHE_NAMESPACE, user_query)
+    if hit:
+        return _cached_route_result(hit, attempts), attempts
+    return None, attempts
+
+def _remember_route(user_query: str, result: dict):
+    semantic_cache.put(ROUTER_CACHE_NAMESPACE, user_query, result["next_node"],
+                       prompt_tokens=result["prompt_tokens"], completion_tokens=result["completion_tokens"])
+
+def _route_result(llm, response, attempts: list = None) -> dict:
+    """Reads the Route tool call and attaches token usage and cost."""
+    if not response.tool_calls:
+        raise ValueError("The router model did not call the required 'Route' tool.")
+    
+    chosen_route = Route(**response.tool_calls[0]['args'])
+    next_node = chosen_route.next_skill
+    
+    logger.info(f"LLM Router decided: {next_node}")
+
+    token_usage = response.response_metadata.get("token_usage", {})
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    completion_tokens = token_usage.get("completion_tokens", 0)
+    model_name = llm.model_name
+    pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
+    estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+
+    return {
+        "next_node": next_node,
+        "action_taken": f"Routed to {next_node} skill.",
+        "routing": {"tier": "llm", "attempts": attempts or []},
+        "semantic_cache": CACHE_MISS_LOG,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": estimated_cost
+    }
+
+def _keyword_route(user_query: str, e: Exception) -> dict:
+    # Fallback to keyword routing if LLM router fails
+    logger.warning(f"LLM router failed: {e}. Falling back to keyword routing.")
+    exam_keywords = ["exam", "test", "quiz", "考卷", "測驗", "題目"]
+    summarize_keywords = ["summarize", "summary", "overview", "總結", "重點", "概述"] # New keywords for fallback
+    
+    if any(keyword in user_query.lower() for keyword in exam_keywords):
+        next_node = "exam_generation_skill"
+    elif any(keyword in user_query.lower() for keyword in summarize_keywords): # New fallback condition
+        next_node = "summarization_skill"
+    else:
+        next_node = "general_chat_skill"
+    return {"next_node": next_node, "action_taken": f"LLM router failed, falling back to keyword routing. Routed to {next_node} skill.", "error": f"LLM router failed: {e}"}
+
+@log_task(agent_name="teacher_agent_router", task_description="Route user query to an appropriate skill.", input_extractor=lambda state: {"user_query": state.get("user_query")})
+def router_node(state: TeacherAgentState) -> dict:
+    """
+    Determines which skill to use based on the user's query. The keyword and
+    centroid tiers answer confident queries, cached LLM decisions answer
+    repeated ones; only the rest reach the LLM.
+    The logging (including the tier that decided) is handled by the @log_task decorator.
+    """
+    local_result, attempts = _local_route(state.get("user_query", ""))
+    if local_result:
+        return local_result
+    try:
+        llm, router_llm, messages = _build_router_request(state)
+        response = router_llm.invoke(messages)
+        result = _route_result(llm, response, attempts)
+        _remember_route(state.get("user_query", ""), result)
+        return result
+    except Exception as e:
+        return _keyword_route(state.get("user_query", ""), e)
 
+@log_task(agent_name="teacher_agent_router", task_description="Route user query to an appropriate skill.", input_extractor=lambda state: {"user_query": state.get("user_query")})
+async def arouter_node(state: TeacherAgentState) -> dict:
+    """Async variant of router_node (awaits the routing call)."""
+    # The centroid tier and the semantic cache make blocking embedding requests.
+    local_result, attempts = await asyncio.to_thread(_local_route, state.get("user_query", ""))
+    if local_result:
+        return local_result
+    try:
+        llm, router_llm, messages = _build_router_request(state)
+        response = await router_llm.ainvoke(messages)
+        result = _route_result(llm, response, attempts)
+        await asyncio.to_thread(_remember_route, state.get("user_query", ""), result)
+        return result
     except Exception as e:
-        # Fallback to keyword routing if LLM router fails
-        logger.warning(f"LLM router failed: {e}. Falling back to keyword routing.")
-        exam_keywords = ["exam", "test", "quiz", "考卷", "測驗", "題目"]
-        summarize_keywords = ["summarize", "summary", "overview", "總結", "重點", "概述"] # New keywords for fallback
-        
-        if any(keyword in user_query.lower() for keyword in exam_keywords):
-            next_node = "exam_generation_skill"
-        elif any(keyword in user_query.lower() for keyword in summarize_keywords): # New fallback condition
-            next_node = "summarization_skill"
-        else:
-            next_node = "general_chat_skill"
-        return {"next_node": next_node, "action_taken": f"LLM router failed, falling back to keyword routing. Routed to {next_node} skill.", "error": f"LLM router failed: {e}"}
+        return _keyword_route(state.get("user_query", ""), e)
 
 
 # --- Conditional Edge Function ---
@@ -106,6 +189,24 @@ def should_continue(state: TeacherAgentState) -> str:
 
 # --- Skill Nodes ---
 
+def _skill_input(state: TeacherAgentState) -> dict:
+    # The decorator injects the current task's ID into the state.
+    # We use it as the parent_task_id for the sub-graph we are about to call.
+    return {
+        "job_id": state["job_id"],
+        "query": state["user_query"],
+        "unique_content_id": state["unique_content_id"],
+        "parent_task_id": state.get("current_task_id"),
+    }
+
+def _skill_result(final_skill_state: dict, skill_label: str) -> dict:
+    if final_skill_state.get("error"):
+        raise Exception(f"{skill_label} skill failed: {final_skill_state['error']}")
+
+    final_result = final_skill_state
+    generated_content = final_skill_state.get("final_generated_content")
+    return {"final_result": final_result, "final_generated_content": generated_content}
+
 @log_task(agent_name="exam_generation_skill", task_description="Execute the exam generation sub-graph.", input_extractor=lambda state: {"user_query": state.get("user_query"), "unique_content_id": state.get("unique_content_id")})
 def exam_skill_node(state: TeacherAgentState) -> dict:
     """
@@ -113,23 +214,20 @@ def exam_skill_node(state: TeacherAgentState) -> dict:
     The logging is handled by the @log_task decorator.
     """
     try:
-        # The decorator injects the current task's ID into the state.
-        # We use it as the parent_task_id for the sub-graph we are about to call.
-        skill_input = {
-            "job_id": state["job_id"],
-            "query": state["user_query"],
-            "unique_content_id": state["unique_content_id"],
-            "parent_task_id": state.get("current_task_id"), 
-        }
-        final_skill_state = exam_generator_app.invoke(skill_input)
-
-        if final_skill_state.get("error"):
-            raise Exception(f"Exam generator skill failed: {final_skill_state['error']}")
-        
-        final_result = final_skill_state
-        generated_content = final_skill_state.get("final_generated_content")
-        return {"final_result": final_result, "final_generated_content": generated_content}
+        final_skill_state = exam_generator_app.invoke(_skill_input(state))
+        return _skill_result(final_skill_state, "Exam generator")
+    except Exception as e:
+        return {"error": str(e)}
 
+@log_task(agent_name="exam_generation_skill", task_description="Execute the exam generation sub-graph.", input_extractor=lambda state: {"user_query": state.get("user_query"), "unique_content_id": state.get("unique_content_id")})
+async def aexam_skill_node(state: TeacherAgentState, config: RunnableConfig = None) -> dict:
+    """
+    Async variant of exam_skill_node (runs the sub-graph with ainvoke).
+    The config is passed on so the sub-graph's events reach astream_events callers.
+    """
+    try:
+        final_skill_state = await exam_generator_app.ainvoke(_skill_input(state), config)
+        return _skill_result(final_skill_state, "Exam generator")
     except Exception as e:
         return {"error": str(e)}
 
@@ -140,21 +238,17 @@ def summarization_skill_node(state: TeacherAgentState) -> dict: # New skill node
     The logging is handled by the @log_task decorator.
     """
     try:
-        skill_input = {
-            "job_id": state["job_id"],
-            "query": state["user_query"],
-            "unique_content_id": state["unique_content_id"],
-            "parent_task_id": state.get("current_task_id"),
-        }
-        final_skill_state = summarization_app.invoke(skill_input)
-
-        if final_skill_state.get("error"):
-            raise Exception(f"Summarization skill failed: {final_skill_state['error']}")
-        
-        final_result = final_skill_state
-        generated_content = final_skill_state.get("final_generated_content")
-        return {"final_result": final_result, "final_generated_content": generated_content}
+        final_skill_state = summarization_app.invoke(_skill_input(state))
+        return _skill_result(final_skill_state, "Summarization")
+    except Exception as e:
+        return {"error": str(e)}
 
+@log_task(agent_name="summarization_skill", task_description="Execute the summarization sub-graph.", input_extractor=lambda state: {"user_query": state.get("user_query"), "unique_content_id": state.get("unique_content_id")})
+async def asummarization_skill_node(state: TeacherAgentState, config: RunnableConfig = None) -> dict:
+    """Async variant of summarization_skill_node (runs the sub-graph with ainvoke, passing the config on)."""
+    try:
+        final_skill_state = await summarization_app.ainvoke(_skill_input(state), config)
+        return _skill_result(final_skill_state, "Summarization")
     except Exception as e:
         return {"error": str(e)}
 
@@ -240,7 +334,7 @@ async def quality_critic_node(state: TeacherAgentState) -> dict:
         logger.info(f"Content type: {display_type}")
         
         # Step 2: Get RAG context
-        rag_chunks = get_rag_chunks_by_job_id(job_id, limit=10)
+        rag_chunks = await asyncio.to_thread(get_rag_chunks_by_job_id, job_id, limit=10)
         rag_content = None
         if rag_chunks:
             combined = [f"[頁 {c.get('metadata', {}).get('page_number', '?')})] {c['chunk_text']}" 
@@ -320,7 +414,8 @@ async def quality_critic_node(state: TeacherAgentState) -> dict:
         # Use the parent_task_id from state (which is the generator's task_id)
         parent_task_id = state.get("parent_task_id")
         
-        save_result = save_evaluation_to_db(
+        save_result = await asyncio.to_thread(
+            save_evaluation_to_db,
             job_id=job_id,
             parent_task_id=parent_task_id,
             evaluation_result=evaluation,
@@ -502,10 +597,12 @@ def aggregate_output_node(state: TeacherAgentState) -> dict:
 builder = StateGraph(TeacherAgentState)
 
 # Add the nodes
-builder.add_node("router", router_node)
-builder.add_node("exam_generation_skill", exam_skill_node)
-builder.add_node("general_chat_skill", general_chat_node)
-builder.add_node("summarization_skill", summarization_skill_node)
+# LLM-bound nodes pair a sync and an async implementation: invoke() runs the
+# sync one, ainvoke() awaits the async one without blocking the event loop.
+builder.add_node("router", RunnableLambda(router_node, afunc=arouter_node, name="router"))
+builder.add_node("exam_generation_skill", RunnableLambda(exam_skill_node, afunc=aexam_skill_node, name="exam_generation_skill"))
+builder.add_node("general_chat_skill", RunnableLambda(general_chat_node, afunc=ageneral_chat_node, name="general_chat_skill"))
+builder.add_node("summarization_skill", RunnableLambda(summarization_skill_node, afunc=asummarization_skill_node, name="summarization_skill"))
 builder.add_node("quality_critic", quality_critic_node)  # Add critic node
 builder.add_node("aggregate_output", aggregate_output_node)
 
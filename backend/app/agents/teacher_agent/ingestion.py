@@ -1,22 +1,26 @@
 """
 Orchestrator for handling the ingestion of documents into the system.
 """
-import hashlib
 import time
 import os
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Tuple
 
-from sqlalchemy import create_engine, MetaData, Table, select, insert, update, delete
+from sqlalchemy import MetaData, Table, select, insert, update, delete, text
 from pgvector.sqlalchemy import Vector
 
 from backend.app.utils import db_logger
+from backend.app.utils.db_engine import get_engine
+from backend.app.services.document_loader import Page
+from backend.app.services.text_splitter import element_to_text, iter_document_chunks, CHUNKING_STRATEGIES, DEFAULT_CHUNKING_STRATEGY
+from backend.app.services.pipeline import Pipeline, Channel
+from backend.app.services.bulk_copy import copy_rows
+from backend.app.services.file_hash import sha256_file
+from backend.app.services.image_store import offload_images
+from backend.app.services.vector_index_cache import vector_index_cache
 
 # --- Database Setup ---
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set.")
-
-engine = create_engine(DATABASE_URL)
+engine = get_engine()
 metadata = MetaData()
 
 # Reflect tables used in this orchestrator
@@ -27,157 +31,449 @@ document_chunks = Table('document_chunks', metadata, autoload_with=engine)
 
 
 def _generate_human_text_from_structured_content(content_list: list) -> str:
-    # This helper function remains the same
-    parts = []
+    # Element rendering is shared with the structure-aware splitter so both see the same text
     if not isinstance(content_list, list):
         return ""
-    for item in content_list:
-        item_type = item.get("type")
-        if item_type == "text":
-            parts.append(item.get("content", ""))
-        elif item_type == "image":
-            ocr_text = item.get("ocr_text")
-            if ocr_text:
-                parts.append(f"[圖片: {ocr_text}]")
-            else:
-                parts.append("[圖片]")
-    return " ".join(parts).strip()
+    parts = [element_to_text(item) for item in content_list]
+    return " ".join(part for part in parts if part is not None).strip()
 
-# --- Main Orchestrator Logic ---
-def process_file(file_path: str, uploader_id: int, course_id: int, course_unit_id: int = None, force_reprocess: bool = False) -> int | None:
+# --- Pipelined Ingestion ---
+# Bounded queues between the stages; together they cap how much of a document is in memory.
+INGEST_PAGE_QUEUE_SIZE = int(os.getenv("INGEST_PAGE_QUEUE_SIZE", "8"))
+INGEST_CHUNK_QUEUE_SIZE = int(os.getenv("INGEST_CHUNK_QUEUE_SIZE", "256"))
+INGEST_WRITE_QUEUE_SIZE = int(os.getenv("INGEST_WRITE_QUEUE_SIZE", "8"))
+# Chunks per embedding call, and pages per document_content INSERT.
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "128"))
+INGEST_PAGE_WRITE_BATCH = int(os.getenv("INGEST_PAGE_WRITE_BATCH", "16"))
+# Write page and chunk batches with binary COPY (see bulk_copy) instead of executemany INSERTs.
+INGEST_BULK_COPY = os.getenv("INGEST_BULK_COPY", "true").lower() == "true"
+
+
+def _chunking_parameters(chunking_strategy: str = None) -> Tuple[str, int, int]:
+    strategy = (chunking_strategy or DEFAULT_CHUNKING_STRATEGY).lower()
+    if strategy not in CHUNKING_STRATEGIES:
+        # Checked before anything is written, so an unknown strategy is never recorded as chunking_params
+        raise ValueError(f"Unsupported chunking strategy: {strategy}. Expected one of {CHUNKING_STRATEGIES}.")
+    if strategy == "recursive":
+        # Structure-aware chunks are measured in tokens
+        return strategy, int(os.getenv("CHUNK_SIZE_TOKENS", "400")), int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+    return strategy, int(os.getenv("CHUNK_SIZE", "1000")), int(os.getenv("CHUNK_OVERLAP", "150"))
+
+
+# --- Resumable Checkpoints ---
+# unique_contents.processing_status of content whose ingestion has not finished.
+# Each state is committed once its stage's writes are, so a retried job
+# resumes after the last checkpoint instead of starting over:
+#   registered   - the unique_contents row exists and is linked to the course
+#   pages_saved  - every page is in document_content (committed with the last page batch)
+#   chunks_saved - every chunk is in document_chunks, with its embedding (committed in its
+#                  own transaction after the last chunk batch; a job stopped in between
+#                  resumes from pages_saved and skips the chunks already written)
+# and finally 'completed'. Rows from older runs ('pending', 'in_progress') restart from the loader.
+# unique_contents.chunking_params records how the saved chunks were split (see _reconcile_chunking).
+PROCESSING_CHECKPOINTS = ["registered", "pages_saved", "chunks_saved"]
+
+
+def _write_rows(conn, table: Table, rows: list):
+    if INGEST_BULK_COPY:
+        copy_rows(conn, table, rows)
+    else:
+        conn.execute(insert(table), rows)
+
+
+def _set_processing_status(conn, unique_content_id: int, status: str):
+    conn.execute(update(unique_contents).where(unique_contents.c.id == unique_content_id).values(processing_status=status))
+
+
+def _clear_partial_content(unique_content_id: int):
+    """Removes the pages and chunks an interrupted attempt wrote before its first checkpoint."""
+    with engine.begin() as conn:
+        conn.execute(delete(document_chunks).where(document_chunks.c.unique_content_id == unique_content_id))
+        conn.execute(delete(document_content).where(document_content.c.unique_content_id == unique_content_id))
+
+
+def _reconcile_chunking(unique_content_id: int, resume_from: str, chunking_params: Dict[str, Any]) -> str:
     """
-    Processes a single file for ingestion, using the new db_logger for all logging.
+    Records the chunking parameters of this attempt on the content and returns
+    the checkpoint to resume from. Chunks saved by an earlier attempt with other
+    parameters (or with unrecorded ones) are deleted, so the chunks are rebuilt
+    from the saved pages instead of mixing two chunkings.
     """
-    file_name = os.path.basename(file_path)
-    
-    job_id = db_logger.create_job(
+    with engine.begin() as conn:
+        saved_params = conn.execute(select(unique_contents.c.chunking_params).where(unique_contents.c.id == unique_content_id)).scalar_one_or_none()
+        if resume_from in ("pages_saved", "chunks_saved") and saved_params != chunking_params:
+            conn.execute(delete(document_chunks).where(document_chunks.c.unique_content_id == unique_content_id))
+            if resume_from == "chunks_saved":
+                resume_from = "pages_saved"
+                _set_processing_status(conn, unique_content_id, resume_from)
+        conn.execute(update(unique_contents).where(unique_contents.c.id == unique_content_id).values(chunking_params=chunking_params))
+    return resume_from
+
+
+def _saved_chunk_orders(unique_content_id: int) -> set:
+    with engine.connect() as conn:
+        return set(conn.execute(select(document_chunks.c.chunk_order).where(document_chunks.c.unique_content_id == unique_content_id)).scalars())
+
+
+def _iter_saved_pages(unique_content_id: int) -> Iterator[Page]:
+    """Reads back the pages of an earlier attempt, INGEST_PAGE_WRITE_BATCH at a time, so nothing is loaded or OCR'd again."""
+    last_page_number = -1
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(document_content.c.page_number, document_content.c.structured_content, document_content.c.combined_human_text)
+                .where((document_content.c.unique_content_id == unique_content_id) & (document_content.c.page_number > last_page_number))
+                .order_by(document_content.c.page_number)
+                .limit(INGEST_PAGE_WRITE_BATCH)
+            ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            page = Page(page_number=row.page_number, structured_elements=row.structured_content or [])
+            page.text_for_chunking = row.combined_human_text
+            yield page
+        last_page_number = rows[-1].page_number
+
+
+@contextmanager
+def _content_lock(content_hash: str):
+    """
+    Serializes ingestion runs of the same content across workers. The
+    session-level advisory lock is held on its own idle connection, so no
+    transaction stays open while the document is processed.
+    """
+    key = int(content_hash[:15], 16)
+    with engine.connect() as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": key})
+        lock_conn.commit()
+        try:
+            yield
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+            lock_conn.commit()
+
+
+def _run_ingestion_pipeline(file_path: str, unique_content_id: int, strategy: str, chunk_size: int, chunk_overlap: int, resume_from: str = None) -> Dict[str, Any]:
+    """
+    Loads, chunks, embeds and stores a document as a pipeline:
+
+        loader --pages--> chunker --pages/chunks--> embedder --writes--> DB writer
+
+    The loader, chunker and embedder run in their own threads; the writer runs
+    in the calling thread. Pages are stored as soon as they pass the chunker,
+    and chunks are embedded in batches of INGEST_EMBED_BATCH_SIZE while later
+    pages are still being parsed and OCR'd. Every write batch is its own short
+    transaction; the last page batch also commits 'pages_saved', and
+    'chunks_saved' is committed once every chunk batch has been written.
+
+    With resume_from='pages_saved' the pages are read back from
+    document_content instead of the file, and chunks an earlier attempt
+    already stored (same chunk_order) are neither embedded nor written again.
+    Returns per-stage counts and finish times.
+    """
+    from backend.app.services.document_loader import get_loader
+    from backend.app.services.embedding_service import embedding_service
+
+    reuse_pages = resume_from == "pages_saved"
+    saved_chunk_orders = _saved_chunk_orders(unique_content_id) if reuse_pages else set()
+    loader = None if reuse_pages else get_loader(file_path)
+    started = time.perf_counter()
+
+    def elapsed_ms() -> int:
+        return int((time.perf_counter() - started) * 1000)
+
+    stats = {"pages": 0, "pages_saved": 0, "chunks": 0, "chunks_skipped": 0, "image_stats": {}, "reused_pages": reuse_pages,
+             "embedding_usage": {"prompt_tokens": 0, "num_batches": 0, "cache_hits": 0}}
+
+    def load(pages: Channel):
+        if reuse_pages:
+            for page in _iter_saved_pages(unique_content_id):
+                pages.put(page)
+                stats["pages"] += 1
+        else:
+            for page in loader.iter_pages(file_path):
+                page.text_for_chunking = _generate_human_text_from_structured_content(getattr(page, 'structured_elements', []))
+                pages.put(page)
+                stats["pages"] += 1
+            stats["image_stats"] = loader.image_stats
+        stats["load_ms"] = elapsed_ms()
+
+    def chunk(pages: Channel, items: Channel):
+        def pages_to_chunk():
+            for page in pages:
+                if not reuse_pages:
+                    items.put(("page", page))
+                yield page
+            if not reuse_pages:
+                items.put(("pages_done", None))
+        for chunk_order, (chunk_text, chunk_metadata) in enumerate(iter_document_chunks(pages_to_chunk(), chunk_size, chunk_overlap, strategy)):
+            stats["chunks"] += 1
+            if chunk_order in saved_chunk_orders:
+                stats["chunks_skipped"] += 1
+                continue
+            items.put(("chunk", (chunk_order, chunk_text, chunk_metadata)))
+        stats["chunk_ms"] = elapsed_ms()
+
+    def embed(items: Channel, writes: Channel):
+        batch = []
+
+        def flush():
+            embeddings, usage = embedding_service.create_embeddings_batched([chunk_text for _, chunk_text, _ in batch])
+            for key in stats["embedding_usage"]:
+                stats["embedding_usage"][key] += usage.get(key) or 0
+            writes.put(("chunks", [
+                {"unique_content_id": unique_content_id, "chunk_text": chunk_text, "chunk_order": chunk_order, "metadata": chunk_metadata, "embedding": embedding}
+                for (chunk_order, chunk_text, chunk_metadata), embedding in zip(batch, embeddings)
+            ]))
+            batch.clear()
+
+        for kind, payload in items:
+            if kind != "chunk":
+                writes.put((kind, payload))
+                continue
+            batch.append(payload)
+            if len(batch) >= INGEST_EMBED_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        stats["embed_ms"] = elapsed_ms()
+
+    def save_pages(pages_to_save: list, checkpoint: bool = False):
+        with engine.begin() as conn:
+            page_rows = []
+            for page in pages_to_save:
+                # Images go to the content-addressed blob store; the page row keeps only references
+                structured_json = offload_images(conn, page.structured_elements)
+                page_rows.append({"unique_content_id": unique_content_id, "page_number": page.page_number, "structured_content": structured_json, "combined_human_text": page.text_for_chunking})
+            if page_rows:
+                _write_rows(conn, document_content, page_rows)
+            if checkpoint:
+                _set_processing_status(conn, unique_content_id, "pages_saved")
+        stats["pages_saved"] += len(pages_to_save)
+
+    with Pipeline() as pipeline:
+        pages = pipeline.channel(INGEST_PAGE_QUEUE_SIZE)
+        items = pipeline.channel(INGEST_CHUNK_QUEUE_SIZE)
+        writes = pipeline.channel(INGEST_WRITE_QUEUE_SIZE)
+        pipeline.stage("load", load, pages, output=pages)
+        pipeline.stage("chunk", chunk, pages, items, output=items)
+        pipeline.stage("embed", embed, items, writes, output=writes)
+
+        pending_pages = []
+        for kind, payload in writes:
+            if kind == "chunks":
+                with engine.begin() as conn:
+                    _write_rows(conn, document_chunks, payload)
+            elif kind == "pages_done":
+                save_pages(pending_pages, checkpoint=True)
+                pending_pages = []
+            elif getattr(payload, 'structured_elements', []):
+                pending_pages.append(payload)
+                if len(pending_pages) >= INGEST_PAGE_WRITE_BATCH:
+                    save_pages(pending_pages)
+                    pending_pages = []
+        stats["write_ms"] = elapsed_ms()
+
+    with engine.begin() as conn:
+        _set_processing_status(conn, unique_content_id, "chunks_saved")
+    return stats
+
+# The agent_tasks logged by process_file, in order (the ingestion status endpoint reports progress against these).
+INGESTION_STAGES = ["hash_file", "link_material", "document_loader", "database_writer", "text_splitter", "embedding_generator", "finalize_status"]
+
+def create_ingestion_job(uploader_id: int, file_name: str) -> int | None:
+    """Creates the orchestration_jobs row that an ingestion run logs its tasks under."""
+    return db_logger.create_job(
         user_id=uploader_id,
         input_prompt=f"[INGEST] Uploaded file: {file_name}",
         workflow_type='ingestion'
     )
+
+def _find_content(conn, content_hash: str):
+    return conn.execute(select(unique_contents.c.id, unique_contents.c.processing_status).where(unique_contents.c.content_hash == content_hash)).fetchone()
+
+def _link_material(conn, unique_content_id: int, course_id: int, uploader_id: int, course_unit_id: int, file_name: str):
+    if not conn.execute(select(materials.c.id).where((materials.c.unique_content_id == unique_content_id) & (materials.c.course_id == course_id))).scalar_one_or_none():
+        conn.execute(insert(materials).values(
+            unique_content_id=unique_content_id, course_id=course_id,
+            uploader_id=uploader_id, course_unit_id=course_unit_id, file_name=file_name
+        ))
+
+def link_existing_content(job_id: int, content_hash: str, file_name: str, uploader_id: int, course_id: int, course_unit_id: int = None) -> int | None:
+    """
+    Duplicate-upload short-circuit: if content with this hash was already
+    ingested, links it to the course and completes the job without parsing,
+    chunking or embedding anything. Returns the unique_content_id, or None
+    when the content is new, or its ingestion has not finished, and it must
+    go through process_file.
+    """
+    start_time = time.perf_counter()
+    with engine.begin() as conn:
+        existing = _find_content(conn, content_hash)
+        if existing is None or existing.processing_status != 'completed':
+            return None
+        existing_id = existing.id
+        lookup_ms = int((time.perf_counter() - start_time) * 1000)
+        _link_material(conn, existing_id, course_id, uploader_id, course_unit_id, file_name)
+    link_ms = int((time.perf_counter() - start_time) * 1000) - lookup_ms
+
+    task_id_hash = db_logger.create_task(job_id, "hash_file", "Calculate file hash and check for existence.", task_input={"content_hash": content_hash})
+    db_logger.update_task(task_id_hash, 'completed', f"Content already exists with ID {existing_id}.", duration_ms=lookup_ms)
+    task_id_link = db_logger.create_task(job_id, "link_material", "Link content to course.", task_input={"unique_content_id": existing_id, "course_id": course_id, "uploader_id": uploader_id}, parent_task_id=task_id_hash)
+    db_logger.update_task(task_id_link, 'completed', f"Linked content {existing_id} to course {course_id}.", duration_ms=link_ms)
+    db_logger.update_job_status(job_id, 'completed')
+    return existing_id
+
+# --- Main Orchestrator Logic ---
+def process_file(file_path: str, uploader_id: int, course_id: int, course_unit_id: int = None, force_reprocess: bool = False, chunking_strategy: str = None, job_id: int = None, content_hash: str = None) -> int | None:
+    """
+    Processes a single file for ingestion, using the new db_logger for all logging.
+
+    chunking_strategy selects the text splitter ('fixed' or 'recursive'); it
+    defaults to the CHUNKING_STRATEGY environment variable.
+    job_id is an existing ingestion job to log under (the background queue
+    creates it at upload time); a new one is created when it is omitted.
+    content_hash is the file's SHA-256 when the caller already computed it
+    while receiving the upload; otherwise the file is hashed here.
+
+    Each stage commits its own short transactions and records a checkpoint in
+    unique_contents.processing_status (see PROCESSING_CHECKPOINTS). When the
+    same content is processed again after a failure, it resumes after the
+    last checkpoint.
+    """
+    file_name = os.path.basename(file_path)
+    
+    if job_id is None:
+        job_id = create_ingestion_job(uploader_id, file_name)
     if not job_id:
         print(f"ERROR: Failed to create an ingestion job for file '{file_name}'. Aborting.")
         return None
 
+    open_task_ids = [] # Created but not completed yet; marked failed if ingestion stops
+
+    def start_task(agent_name: str, task_description: str, task_input: dict = None, parent_task_id: int = None) -> int | None:
+        task_id = db_logger.create_task(job_id, agent_name, task_description, task_input=task_input, parent_task_id=parent_task_id)
+        if task_id is not None:
+            open_task_ids.append(task_id)
+        return task_id
+
+    def complete_task(task_id: int, output: Any = None, **kwargs):
+        db_logger.update_task(task_id, 'completed', output, **kwargs)
+        if task_id in open_task_ids:
+            open_task_ids.remove(task_id)
+
     try:
-        with engine.connect() as conn:
-            with conn.begin() as transaction:
-                last_task_id = None # Initialize for sequential parent_task_id logging
-
-                # --- Task 1: Hashing and Get-Or-Create Unique Content ---
-                task_id_hash = db_logger.create_task(job_id, "hash_file", "Calculate file hash and check for existence.", task_input={"file_path": file_path}, parent_task_id=last_task_id)
-                last_task_id = task_id_hash
-                start_time = time.perf_counter()
-                
-                with open(file_path, "rb") as f:
-                    file_bytes = f.read()
-                    file_hash = hashlib.sha256(file_bytes).hexdigest()
-                
-                existing_id = conn.execute(select(unique_contents.c.id).where(unique_contents.c.content_hash == file_hash)).scalar_one_or_none()
-                
-                unique_content_id = None
-                if existing_id and not force_reprocess:
+        last_task_id = None # Initialize for sequential parent_task_id logging
+
+        # --- Task 1: Hashing and Get-Or-Create Unique Content ---
+        task_id_hash = start_task("hash_file", "Calculate file hash and check for existence.", task_input={"file_path": file_path}, parent_task_id=last_task_id)
+        last_task_id = task_id_hash
+        start_time = time.perf_counter()
+        
+        if content_hash:
+            file_hash, file_size = content_hash, os.path.getsize(file_path)
+        else:
+            file_hash, file_size = sha256_file(file_path)
+
+        with _content_lock(file_hash):
+            resume_from = None
+            with engine.begin() as conn:
+                existing = _find_content(conn, file_hash)
+                existing_id = existing.id if existing else None
+                is_duplicate = existing is not None and existing.processing_status == 'completed' and not force_reprocess
+
+                if is_duplicate:
+                    unique_content_id = existing_id
+                    message = f"Content already exists with ID {unique_content_id}."
+                elif existing and not force_reprocess:
+                    # An earlier attempt stopped part-way; pick up after its last checkpoint.
                     unique_content_id = existing_id
-                    duration_ms = int((time.perf_counter() - start_time) * 1000)
-                    db_logger.update_task(task_id_hash, 'completed', f"Content already exists with ID {unique_content_id}.", duration_ms=duration_ms)
+                    resume_from = existing.processing_status
+                    message = f"Resuming content {unique_content_id} from '{resume_from}'."
                 else:
-                    if existing_id: # force_reprocess is True
+                    if existing: # force_reprocess is True
                         conn.execute(delete(unique_contents).where(unique_contents.c.id == existing_id))
                     
                     insert_stmt = insert(unique_contents).values(
-                        content_hash=file_hash, file_size_bytes=len(file_bytes),
-                        original_file_type=file_name.split('.')[-1], processing_status='in_progress'
+                        content_hash=file_hash, file_size_bytes=file_size,
+                        original_file_type=file_name.split('.')[-1], processing_status='registered'
                     ).returning(unique_contents.c.id)
                     unique_content_id = conn.execute(insert_stmt).scalar_one()
-                    duration_ms = int((time.perf_counter() - start_time) * 1000)
-                    db_logger.update_task(task_id_hash, 'completed', f"Created new unique_content with ID {unique_content_id}.", duration_ms=duration_ms)
-
-                # --- Task 2: Link Material to Course ---
-                task_id_link = db_logger.create_task(job_id, "link_material", "Link content to course.", task_input={"unique_content_id": unique_content_id, "course_id": course_id, "uploader_id": uploader_id}, parent_task_id=last_task_id)
-                last_task_id = task_id_link
-                start_time = time.perf_counter()
-                
-                if not conn.execute(select(materials.c.id).where((materials.c.unique_content_id == unique_content_id) & (materials.c.course_id == course_id))).scalar_one_or_none():
-                    conn.execute(insert(materials).values(
-                        unique_content_id=unique_content_id, course_id=course_id,
-                        uploader_id=uploader_id, course_unit_id=course_unit_id, file_name=file_name
-                    ))
-                
-                duration_ms = int((time.perf_counter() - start_time) * 1000)
-                db_logger.update_task(task_id_link, 'completed', f"Linked content {unique_content_id} to course {course_id}.", duration_ms=duration_ms)
-
-                if existing_id and not force_reprocess:
-                    db_logger.update_job_status(job_id, 'completed')
-                    return unique_content_id
-
-                # --- Task 3: Document Loading & Parsing ---
-                from backend.app.services.document_loader import get_loader
-                task_id_load = db_logger.create_task(job_id, "document_loader", "Load and extract text from file.", task_input={"file_path": file_path}, parent_task_id=last_task_id)
-                last_task_id = task_id_load
-                start_time = time.perf_counter()
-                document = get_loader(file_path).load(file_path)
-                duration_ms = int((time.perf_counter() - start_time) * 1000)
-                db_logger.update_task(task_id_load, 'completed', f"Loaded {len(document.pages)} pages.", duration_ms=duration_ms)
-
-                # --- Task 4: Save Document Content ---
-                task_id_save_content = db_logger.create_task(job_id, "database_writer", "Save page-by-page content.", task_input={"unique_content_id": unique_content_id}, parent_task_id=last_task_id)
-                last_task_id = task_id_save_content
-                start_time = time.perf_counter()
-                preview_data = []
-                for page in document.pages:
-                    structured_json = getattr(page, 'structured_elements', [])
-                    human_readable_text = _generate_human_text_from_structured_content(structured_json)
-                    page.text_for_chunking = human_readable_text
-                    if structured_json:
-                        preview_data.append({"unique_content_id": unique_content_id, "page_number": page.page_number, "structured_content": structured_json, "combined_human_text": human_readable_text})
-                if preview_data:
-                    conn.execute(insert(document_content), preview_data)
-                duration_ms = int((time.perf_counter() - start_time) * 1000)
-                db_logger.update_task(task_id_save_content, 'completed', f"Saved {len(preview_data)} pages of content.", duration_ms=duration_ms)
-
-                # --- Task 5: Document Chunking ---
-                from backend.app.services.text_splitter import chunk_document
-                chunk_size = int(os.getenv("CHUNK_SIZE", "1000"))
-                chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "150"))
-                task_id_chunk = db_logger.create_task(job_id, "text_splitter", "Split document into chunks.", task_input={"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}, parent_task_id=last_task_id)
-                last_task_id = task_id_chunk
-                start_time = time.perf_counter()
-                chunks_with_metadata = chunk_document(pages=document.pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap, file_name=file_name, uploader_id=uploader_id)
-                duration_ms = int((time.perf_counter() - start_time) * 1000)
-                db_logger.update_task(task_id_chunk, 'completed', f"Created {len(chunks_with_metadata)} chunks.", duration_ms=duration_ms)
-
-                # --- Task 6: Generate Embeddings and Store Chunks ---
-                task_id_embed = db_logger.create_task(job_id, "embedding_generator", "Generate embeddings and save chunks.", task_input={"num_chunks_to_embed": len(chunks_with_metadata) if chunks_with_metadata else 0}, parent_task_id=last_task_id)
-                last_task_id = task_id_embed
-                start_time = time.perf_counter()
-                if chunks_with_metadata:
-                    from backend.app.services.embedding_service import embedding_service
-                    texts_to_embed = [text for text, meta in chunks_with_metadata]
-                    embeddings, usage = embedding_service.create_embeddings(texts_to_embed)
-                    chunk_data = [{"unique_content_id": unique_content_id, "chunk_text": text, "chunk_order": i, "metadata": meta, "embedding": embedding} for i, ((text, meta), embedding) in enumerate(zip(chunks_with_metadata, embeddings))]
-                    conn.execute(insert(document_chunks), chunk_data)
-                    duration_ms = int((time.perf_counter() - start_time) * 1000)
-                    db_logger.update_task(task_id_embed, 'completed', f"Saved {len(chunk_data)} chunks.", duration_ms=duration_ms, prompt_tokens=usage.get("prompt_tokens"))
+                    message = f"Created new unique_content with ID {unique_content_id}."
+            duration_ms = int((time.perf_counter() - start_time) * 1000)
+            complete_task(task_id_hash, message, duration_ms=duration_ms)
+
+            # --- Task 2: Link Material to Course ---
+            task_id_link = start_task("link_material", "Link content to course.", task_input={"unique_content_id": unique_content_id, "course_id": course_id, "uploader_id": uploader_id}, parent_task_id=last_task_id)
+            last_task_id = task_id_link
+            start_time = time.perf_counter()
+            
+            with engine.begin() as conn:
+                _link_material(conn, unique_content_id, course_id, uploader_id, course_unit_id, file_name)
+            
+            duration_ms = int((time.perf_counter() - start_time) * 1000)
+            complete_task(task_id_link, f"Linked content {unique_content_id} to course {course_id}.", duration_ms=duration_ms)
+
+            if is_duplicate:
+                db_logger.update_job_status(job_id, 'completed')
+                return unique_content_id
+
+            # --- Tasks 3-6: Load, Save Pages, Chunk, Embed (pipelined) ---
+            # The four stages overlap per page; each task is logged when its stage finishes.
+            strategy, chunk_size, chunk_overlap = _chunking_parameters(chunking_strategy)
+            task_id_load = start_task("document_loader", "Load and extract text from file.", task_input={"file_path": file_path}, parent_task_id=last_task_id)
+            task_id_save_content = start_task("database_writer", "Save page-by-page content.", task_input={"unique_content_id": unique_content_id}, parent_task_id=task_id_load)
+            task_id_chunk = start_task("text_splitter", "Split document into chunks.", task_input={"strategy": strategy, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap}, parent_task_id=task_id_save_content)
+            task_id_embed = start_task("embedding_generator", "Generate embeddings and save chunks.", task_input={"strategy": strategy}, parent_task_id=task_id_chunk)
+            last_task_id = task_id_embed
+            resume_from = _reconcile_chunking(unique_content_id, resume_from, {"strategy": strategy, "chunk_size": chunk_size, "chunk_overlap": chunk_overlap})
+
+            if resume_from == "chunks_saved":
+                for task_id in (task_id_load, task_id_save_content, task_id_chunk, task_id_embed):
+                    complete_task(task_id, "Already saved by an earlier attempt.", duration_ms=0)
+            else:
+                if resume_from != "pages_saved":
+                    # Rows written before the first checkpoint cannot be trusted to be complete.
+                    _clear_partial_content(unique_content_id)
+                stats = _run_ingestion_pipeline(file_path, unique_content_id, strategy, chunk_size, chunk_overlap, resume_from)
+
+                if stats["reused_pages"]:
+                    complete_task(task_id_load, f"Reused {stats['pages']} pages saved by an earlier attempt.", duration_ms=stats["load_ms"])
+                    complete_task(task_id_save_content, "Pages already saved by an earlier attempt.", duration_ms=0)
+                else:
+                    complete_task(task_id_load, {"text_output": f"Loaded {stats['pages']} pages.", "image_stats": stats["image_stats"]}, duration_ms=stats["load_ms"])
+                    complete_task(task_id_save_content, f"Saved {stats['pages_saved']} pages of content.", duration_ms=stats["write_ms"])
+                complete_task(task_id_chunk, f"Created {stats['chunks']} chunks ({stats['chunks_skipped']} already saved).", duration_ms=stats["chunk_ms"])
+                usage = stats["embedding_usage"]
+                new_chunks = stats["chunks"] - stats["chunks_skipped"]
+                if new_chunks:
+                    complete_task(task_id_embed, f"Saved {new_chunks} chunks in {usage['num_batches']} embedding batches ({usage['cache_hits']} embeddings served from cache).", duration_ms=stats["embed_ms"], prompt_tokens=usage["prompt_tokens"])
                 else:
-                    duration_ms = int((time.perf_counter() - start_time) * 1000)
-                    db_logger.update_task(task_id_embed, 'completed', "No chunks to embed.", duration_ms=duration_ms)
+                    complete_task(task_id_embed, "No chunks to embed.", duration_ms=stats["embed_ms"])
 
-                # --- Task 7: Finalize Status ---
-                task_id_finalize = db_logger.create_task(job_id, "finalize_status", "Update unique_content status to completed.", task_input={"unique_content_id": unique_content_id}, parent_task_id=last_task_id)
-                last_task_id = task_id_finalize
-                start_time = time.perf_counter()
-                conn.execute(update(unique_contents).where(unique_contents.c.id == unique_content_id).values(processing_status='completed'))
-                duration_ms = int((time.perf_counter() - start_time) * 1000)
-                db_logger.update_task(task_id_finalize, 'completed', duration_ms=duration_ms)
+            # --- Task 7: Finalize Status ---
+            task_id_finalize = start_task("finalize_status", "Update unique_content status to completed.", task_input={"unique_content_id": unique_content_id}, parent_task_id=last_task_id)
+            last_task_id = task_id_finalize
+            start_time = time.perf_counter()
+            with engine.begin() as conn:
+                _set_processing_status(conn, unique_content_id, 'completed')
+            duration_ms = int((time.perf_counter() - start_time) * 1000)
+            complete_task(task_id_finalize, duration_ms=duration_ms)
 
+        if existing_id:
+            # The old (or partially ingested) content has changed; drop this process's in-memory copy.
+            # Other processes never cached it while it was being ingested (only completed content is loaded).
+            vector_index_cache.invalidate(existing_id)
         db_logger.update_job_status(job_id, 'completed')
         print(f"\nSuccessfully processed and INGESTED file '{file_name}'.")
         return unique_content_id
 
     except Exception as e:
         print(f"ERROR: An error occurred during file ingestion for job {job_id}. Error: {e}")
+        for task_id in open_task_ids:
+            db_logger.update_task(task_id, 'failed', error_message=str(e))
         db_logger.update_job_status(job_id, 'failed', error_message=str(e))
-        # The transaction will be rolled back automatically by the 'with' statement context manager
+        # Checkpoints committed so far are kept; processing the file again resumes from the last one
         return None
 
 if __name__ == '__main__':
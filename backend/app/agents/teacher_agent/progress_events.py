@@ -0,0 +1,126 @@
+"""
+Translation of LangGraph `astream_events(version="v2")` output into the
+Server-Sent Events sent by /api/v1/chat/stream.
+
+Only runs that are direct children of a graph run are reported as nodes, so
+a RunnableLambda nested inside its node and helper chains inside a node stay
+silent. Sub-graphs (exam generation, summarization) are reached because their
+parent skill nodes pass their config on.
+
+Events sent to the client (each `data` is a JSON object):
+- node_start:     {"node"}
+- node_end:       {"node", ...a short, node-specific summary}
+- question_block: {"task", "content"}, one per finished exam generation task
+- token:          {"node", "delta"}, content deltas from the generation LLMs
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+# Custom event dispatched by the exam generator as each planned task finishes.
+# Kept here, not in exam_nodes, so this module imports without the RAG agent (and its database).
+QUESTION_BLOCK_EVENT = "question_block"
+
+# Nodes whose LLM output is shown to the user as it is generated. The router
+# and critic models also stream, but their output is internal.
+GENERATION_NODES = {"general_chat_skill", "summarize", "generate_questions"}
+
+
+def _count(value: Any) -> int:
+    return len(value) if isinstance(value, (list, tuple)) else 0
+
+
+def _critic_summary(output: Dict[str, Any]) -> Dict[str, Any]:
+    metrics = output.get("critic_metrics") or {}
+    return {
+        "passed": output.get("critic_passed"),
+        "scores": metrics.get("scores"),
+        "failed_criteria": metrics.get("failed_criteria", []),
+    }
+
+
+# What node_end reports for each node (every node_end also carries "error" if set).
+_NODE_SUMMARIES = {
+    "router": lambda output: {"next_node": output.get("next_node"), "routing": output.get("routing")},
+    "retrieve_chunks": lambda output: {
+        "text_chunks": _count(output.get("retrieved_text_chunks")),
+        "pages": _count(output.get("retrieved_page_content")),
+    },
+    "plan_generation_tasks": lambda output: {
+        "main_title": output.get("main_title"),
+        "tasks": _count(output.get("generation_plan")),
+    },
+    "generate_questions": lambda output: {
+        "blocks": _count(output.get("final_generated_content")),
+        "errors": _count(output.get("generation_errors")),
+    },
+    "quality_critic": _critic_summary,
+}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> Dict[str, str]:
+    return {"event": event, "data": json.dumps(data, ensure_ascii=False, default=str)}
+
+
+def _text_delta(chunk: Any) -> str:
+    """The visible text of a streamed AIMessageChunk (tool-call argument deltas are skipped)."""
+    content = getattr(chunk, "content", None)
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text")
+    return ""
+
+
+class ProgressTranslator:
+    """
+    Stateful translator for one graph run: feed it every event in order and
+    send what `translate` returns. After the stream ends, `final_state` holds
+    the root graph's output.
+    """
+
+    def __init__(self):
+        self._graph_runs = set()
+        self.final_state: Optional[Dict[str, Any]] = None
+
+    def _is_node(self, event: Dict[str, Any]) -> bool:
+        parent_ids = event.get("parent_ids") or []
+        return bool(parent_ids) and parent_ids[-1] in self._graph_runs
+
+    def translate(self, event: Dict[str, Any]) -> List[Dict[str, str]]:
+        kind = event.get("event")
+        data = event.get("data") or {}
+        node = (event.get("metadata") or {}).get("langgraph_node")
+
+        if kind == "on_chain_start":
+            if not event.get("parent_ids") or event.get("name") == "LangGraph":
+                self._graph_runs.add(event.get("run_id"))
+                return []
+            if self._is_node(event):
+                return [_sse("node_start", {"node": event.get("name")})]
+            return []
+
+        if kind == "on_chain_end":
+            output = data.get("output")
+            if not event.get("parent_ids"):
+                self.final_state = output if isinstance(output, dict) else None
+                return []
+            if event.get("run_id") in self._graph_runs or not self._is_node(event):
+                return []
+            name = event.get("name")
+            payload = {"node": name}
+            if isinstance(output, dict):
+                summarize = _NODE_SUMMARIES.get(name)
+                if summarize:
+                    payload.update(summarize(output))
+                if output.get("error"):
+                    payload["error"] = output["error"]
+            return [_sse("node_end", payload)]
+
+        if kind == "on_chat_model_stream" and node in GENERATION_NODES:
+            delta = _text_delta(data.get("chunk"))
+            return [_sse("token", {"node": node, "delta": delta})] if delta else []
+
+        if kind == "on_custom_event" and event.get("name") == QUESTION_BLOCK_EVENT:
+            return [_sse("question_block", data if isinstance(data, dict) else {"content": data})]
+
+        return []
@@ -0,0 +1,259 @@
+"""
+Tiered fast-path router for the Teacher Agent.
+
+Most /chat queries are unambiguous ("幫我出5題選擇題", "你好"), so the LLM
+routing call is only needed for the few that are not. Queries are classified
+by cheaper tiers first and only escalate when no tier is confident enough:
+
+1. keyword: regex rules over the normalized query (no I/O).
+2. centroid: nearest-centroid over embeddings of labeled example queries.
+   The example embeddings go through the embedding cache, so they are only
+   computed once per model.
+3. llm: the existing `Route` tool call in graph.py.
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from backend.app.services.embedding_cache import normalize_text
+
+load_dotenv()
+
+ROUTER_FAST_PATH_ENABLED = os.getenv("ROUTER_FAST_PATH_ENABLED", "true").lower() == "true"
+# Decisions below this confidence escalate to the next tier.
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.8"))
+# Softmax temperature over centroid cosine similarities; smaller is sharper.
+# With three centroids, reaching ROUTER_CONFIDENCE_THRESHOLD (0.8) takes a
+# lead over the runner-up of about 1.4x the temperature in cosine similarity
+# (one close rival) to 2.1x (two). At 0.05 that is a 0.07-0.10 margin. A
+# temperature of 0.02 accepted 0.03-0.04, which off-topic queries reach
+# routinely. Re-check with `python -m backend.benchmarks.bench_router
+# --temperatures ...` when the examples or the embedding model change.
+ROUTER_CENTROID_TEMPERATURE = float(os.getenv("ROUTER_CENTROID_TEMPERATURE", "0.05"))
+# A query less similar than this to every centroid is off-topic for all skills and escalates whatever its margin.
+ROUTER_CENTROID_MIN_SIMILARITY = float(os.getenv("ROUTER_CENTROID_MIN_SIMILARITY", "0.3"))
+
+SKILLS = ("exam_generation_skill", "summarization_skill", "general_chat_skill")
+
+# Weight of a keyword rule hit. A specific rule (an imperative with a count or
+# question type, an anchored greeting) decides on its own. A generic one (a
+# bare topic word such as 測驗 or 重點) stays below ROUTER_CONFIDENCE_THRESHOLD,
+# so it only routes when combined with another hit for the same skill.
+KEYWORD_MATCH_CONFIDENCE = 0.95
+KEYWORD_GENERIC_CONFIDENCE = 0.5
+
+_COUNT = r"[\d一二兩三四五六七八九十幾]"
+_QUESTION_TYPES = r"(選擇|是非|簡答|申論|填空)題"
+
+# (pattern, weight) per skill. ASCII words are matched on word boundaries so "quiz" does not fire inside other words.
+KEYWORD_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "exam_generation_skill": [
+        (r"\b(generate|create|make|write|prepare)\b.{0,30}\b(questions?|quiz|quizzes|exam|test)\b", KEYWORD_MATCH_CONFIDENCE),
+        (r"\bquiz me\b", KEYWORD_MATCH_CONFIDENCE),
+        (rf"(出|生成|產生|設計|擬)\s*{_COUNT}*\s*(題|道)", KEYWORD_MATCH_CONFIDENCE),
+        (rf"{_COUNT}+\s*(題|道)?\s*{_QUESTION_TYPES}", KEYWORD_MATCH_CONFIDENCE),
+        (r"(出|生成|產生|設計|擬|準備|做)\s*(一|1|幾)?\s*(份|個|套|張)\s*.{0,6}(考卷|測驗|考題|小考|模擬考)", KEYWORD_MATCH_CONFIDENCE),
+        (r"\b(exam|quiz|quizzes)\b", KEYWORD_GENERIC_CONFIDENCE),
+        (r"考卷|測驗|考題|小考|模擬考", KEYWORD_GENERIC_CONFIDENCE),
+        (_QUESTION_TYPES, KEYWORD_GENERIC_CONFIDENCE),
+    ],
+    "summarization_skill": [
+        (r"\b(summarize|summarise|summary|tl;?dr)\b", KEYWORD_MATCH_CONFIDENCE),
+        (r"總結|摘要|概述|大綱|統整|整理.{0,6}(內容|教材|講義)", KEYWORD_MATCH_CONFIDENCE),
+        (r"(這份|這章|這個|這篇|本章|第.{1,3}章).{0,8}重點", KEYWORD_MATCH_CONFIDENCE),
+        (r"\b(overview|outline)\b", KEYWORD_GENERIC_CONFIDENCE),
+        (r"\bkey points?\b", KEYWORD_GENERIC_CONFIDENCE),
+        (r"重點", KEYWORD_GENERIC_CONFIDENCE),
+    ],
+    "general_chat_skill": [
+        (r"^(hi|hello|hey|thanks|thank you)\b", KEYWORD_MATCH_CONFIDENCE),
+        (r"\bwho are you\b|\bwhat can you do\b", KEYWORD_MATCH_CONFIDENCE),
+        (r"^(你好|您好|嗨|哈囉|早安|午安|晚安|謝謝|感謝)", KEYWORD_MATCH_CONFIDENCE),
+        (r"你是誰|妳是誰|你會做什麼|你能做什麼|你可以做什麼", KEYWORD_MATCH_CONFIDENCE),
+    ],
+}
+_COMPILED_RULES = {
+    skill: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+    for skill, rules in KEYWORD_RULES.items()
+}
+
+# Labeled examples that define the centroid of each skill.
+LABELED_EXAMPLES: Dict[str, List[str]] = {
+    "exam_generation_skill": [
+        "幫我出5題選擇題",
+        "根據這份教材出3題是非題和2題簡答題",
+        "請設計一份期中考卷",
+        "給我一些練習題",
+        "幫我做一個小測驗考學生",
+        "Generate a quiz from this material",
+        "Create 10 multiple choice questions about chapter 2",
+        "Make a test for my students",
+    ],
+    "summarization_skill": [
+        "幫我總結這份教材",
+        "給我這份文件的重點",
+        "請整理這份講義的內容",
+        "這份投影片在講什麼",
+        "用條列式列出這章的大綱",
+        "Summarize this document",
+        "Give me an overview of the slides",
+        "What are the key points of this chapter?",
+    ],
+    "general_chat_skill": [
+        "你好",
+        "你是誰?",
+        "你可以幫我做什麼",
+        "謝謝你的幫忙",
+        "今天天氣如何",
+        "Hello",
+        "What can you do?",
+        "Who made you?",
+    ],
+}
+
+
+@dataclass
+class RouteDecision:
+    """A routing decision and how it was reached, as logged to agent_tasks."""
+    skill: Optional[str]
+    confidence: float
+    tier: str
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def is_confident(self) -> bool:
+        return self.skill is not None and self.confidence >= ROUTER_CONFIDENCE_THRESHOLD
+
+    def as_log(self) -> dict:
+        return {
+            "tier": self.tier,
+            "skill": self.skill,
+            "confidence": round(self.confidence, 4),
+            "scores": {k: round(v, 4) for k, v in self.scores.items()},
+        }
+
+
+def classify_by_keywords(query: str) -> RouteDecision:
+    """
+    Sums the weights of the rules each skill matches. The leading skill's
+    confidence is its score (capped at KEYWORD_MATCH_CONFIDENCE) times its
+    share of all scores, so hits for several skills split the confidence.
+    """
+    text = normalize_text(query)
+    scores = {skill: sum(weight for rule, weight in rules if rule.search(text)) for skill, rules in _COMPILED_RULES.items()}
+    total = sum(scores.values())
+    if total == 0:
+        return RouteDecision(skill=None, confidence=0.0, tier="keyword", scores={})
+
+    skill = max(scores, key=scores.get)
+    confidence = min(KEYWORD_MATCH_CONFIDENCE, scores[skill]) * scores[skill] / total
+    return RouteDecision(skill=skill, confidence=confidence, tier="keyword", scores={k: v for k, v in scores.items() if v})
+
+
+def centroid_confidence(similarities: np.ndarray, temperature: float, min_similarity: float) -> np.ndarray:
+    """Softmax over centroid similarities; all zeros when no centroid reaches min_similarity."""
+    if similarities.max() < min_similarity:
+        return np.zeros_like(similarities)
+    logits = (similarities - similarities.max()) / temperature
+    return np.exp(logits) / np.exp(logits).sum()
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class CentroidClassifier:
+    """
+    Nearest-centroid classifier over embeddings of LABELED_EXAMPLES.
+
+    Centroids are built lazily on first use. `embed` takes a list of texts and
+    returns their embeddings; it defaults to the shared EmbeddingService.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]] = None, embed: Callable[[List[str]], List[List[float]]] = None,
+                 temperature: float = ROUTER_CENTROID_TEMPERATURE, min_similarity: float = ROUTER_CENTROID_MIN_SIMILARITY):
+        self._examples = examples or LABELED_EXAMPLES
+        self._embed = embed
+        self._temperature = temperature
+        self._min_similarity = min_similarity
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        if self._embed is None:
+            # Imported lazily: the service needs OPENAI_API_KEY at construction time.
+            from backend.app.services.embedding_service import embedding_service
+            self._embed = lambda batch: embedding_service.create_embeddings(batch)[0]
+        return self._embed(texts)
+
+    def fit(self):
+        """Embeds the labeled examples (served from the embedding cache after the first run) and builds centroids."""
+        labels = list(self._examples)
+        texts = [text for label in labels for text in self._examples[label]]
+        vectors = _unit_rows(np.asarray(self._embed_texts(texts), dtype=np.float32))
+
+        centroids, offset = [], 0
+        for label in labels:
+            count = len(self._examples[label])
+            centroids.append(vectors[offset:offset + count].mean(axis=0))
+            offset += count
+        self._labels = labels
+        self._centroids = _unit_rows(np.stack(centroids))
+
+    def classify(self, query: str) -> RouteDecision:
+        """Returns the closest skill with a softmax-over-similarities confidence (0 for off-topic queries)."""
+        if self._centroids is None:
+            with self._lock:
+                if self._centroids is None:
+                    self.fit()
+
+        query_vector = _unit_rows(np.asarray(self._embed_texts([normalize_text(query)])[0], dtype=np.float32))
+        similarities = self._centroids @ query_vector
+        probabilities = centroid_confidence(similarities, self._temperature, self._min_similarity)
+
+        best = int(np.argmax(similarities))
+        return RouteDecision(
+            skill=self._labels[best],
+            confidence=float(probabilities[best]),
+            tier="centroid",
+            scores={label: float(sim) for label, sim in zip(self._labels, similarities)},
+        )
+
+
+# Singleton instance for easy access
+centroid_classifier = CentroidClassifier()
+
+
+def fast_route(query: str, classifier: CentroidClassifier = None) -> Tuple[Optional[RouteDecision], List[dict]]:
+    """
+    Runs the keyword and centroid tiers in order.
+
+    Returns:
+        A tuple of the first confident decision (None when the query should
+        escalate to the LLM router) and the log of every tier consulted.
+    """
+    if not ROUTER_FAST_PATH_ENABLED or not query.strip():
+        return None, []
+
+    attempts = []
+    decision = classify_by_keywords(query)
+    attempts.append(decision.as_log())
+    if decision.is_confident:
+        return decision, attempts
+
+    try:
+        decision = (classifier or centroid_classifier).classify(query)
+        attempts.append(decision.as_log())
+        if decision.is_confident:
+            return decision, attempts
+    except Exception as e:
+        attempts.append({"tier": "centroid", "error": str(e)})
+
+    return None, attempts
@@ -1,17 +1,23 @@
 import os
 import json
 import time
+import asyncio
 from datetime import datetime # Add this import
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Tuple, Optional
 from pydantic import BaseModel, Field
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.runnables import RunnableConfig
 
 from .state import ExamGenerationState
 from backend.app.agents.rag_agent import rag_agent
+from backend.app.services.image_store import resolve_image_uris
 from backend.app.utils import db_logger # Add this import
 from backend.app.utils.db_logger import log_task, log_task_sources
+from backend.app.agents.teacher_agent.progress_events import QUESTION_BLOCK_EVENT
 
 # --- Pydantic Models for Tool-based Planning ---
 class Task(BaseModel):
@@ -94,6 +100,38 @@ def call_openai_api(llm: ChatOpenAI, prompt: str, images: List[str] = None) -> A
     response = llm.invoke(messages)
     return response
 
+def _resolve_prompt_images(retrieved_page_content: List[Dict[str, Any]], max_images: int) -> Dict[int, str]:
+    """
+    Picks the first `max_images` usable images (in page order) and returns
+    {id(element): data URI}. Stored image references are loaded from the blob
+    store in one query; only the selected ones are ever fetched.
+    """
+    selected = []
+    for item in retrieved_page_content:
+        if item.get("type") != "structured_page_content":
+            continue
+        for element in item.get("content", []):
+            if len(selected) >= max_images:
+                break
+            if element.get("type") == "image" and (element.get("image_ref") or element.get("base64")):
+                selected.append(element)
+
+    refs = [element["image_ref"] for element in selected if element.get("image_ref")]
+    resolved_refs = resolve_image_uris(refs) if refs else {}
+
+    image_uris = {}
+    for element in selected:
+        if element.get("image_ref"):
+            uri = resolved_refs.get(element["image_ref"])
+        else:
+            # Rows ingested before image offloading still carry inline base64
+            base64_data = element["base64"]
+            mime_type = element.get("mime_type", "image/jpeg")
+            uri = f"data:{mime_type};base64,{base64_data}" if not base64_data.startswith("data:") else base64_data
+        if uri:
+            image_uris[id(element)] = uri
+    return image_uris
+
 def _prepare_multimodal_content(retrieved_page_content: List[Dict[str, Any]]) -> Tuple[str, List[str]]:
     """Prepares content from structured page content for the LLM."""
     max_images = int(os.getenv("MAX_IMAGES_PER_PROMPT", "5"))
@@ -102,6 +140,8 @@ def _prepare_multimodal_content(retrieved_page_content: List[Dict[str, Any]]) ->
     if not retrieved_page_content:
         return "", []
 
+    image_uris = _resolve_prompt_images(retrieved_page_content, max_images)
+
     for item in retrieved_page_content:
         if item.get("type") == "structured_page_content":
             page_num = item.get("page_number", "Unknown")
@@ -110,17 +150,14 @@ def _prepare_multimodal_content(retrieved_page_content: List[Dict[str, Any]]) ->
             for element in page_content:
                 if element.get("type") == "text":
                     combined_text_parts.append(element.get("content", ""))
-                elif element.get("type") == "image" and len(image_data_urls) < max_images:
-                    base64_data = element.get("base64")
-                    if base64_data:
-                        mime_type = element.get("mime_type", "image/jpeg")
-                        valid_image_url = f"data:{mime_type};base64,{base64_data}" if not base64_data.startswith("data:") else base64_data
-                        image_data_urls.append(valid_image_url)
-                        image_index = len(image_data_urls)
-                        combined_text_parts.append(f"\n[Image {image_index} is here. Source: Page {page_num}]\n")
-                        image_source_map.append(f"Image {image_index}: Sourced from Page {page_num}")
+                elif element.get("type") == "image" and id(element) in image_uris:
+                    image_data_urls.append(image_uris[id(element)])
+                    image_index = len(image_data_urls)
+                    combined_text_parts.append(f"\n[Image {image_index} is here. Source: Page {page_num}]\n")
+                    image_source_map.append(f"Image {image_index}: Sourced from Page {page_num}")
             combined_text_parts.append(f"--- [END] Source: Page {page_num} ---\n")
 
+
     final_text = "\n".join(combined_text_parts)
     if image_source_map:
         final_text += "\n\n--- Image Source Key ---\n" + "\n".join(image_source_map)
@@ -147,9 +184,8 @@ def retrieve_chunks_node(state: ExamGenerationState) -> dict:
     except Exception as e:
         return {"error": f"Failed to retrieve context: {str(e)}"}
 
-@log_task(agent_name="plan_generation_tasks", task_description="Analyze user query to create a generation plan.", input_extractor=lambda state: {"query": state.get("query")})
-def plan_generation_tasks_node(state: ExamGenerationState) -> dict:
-    """Analyzes the user query to create a structured generation plan using an LLM."""
+def _plan_without_llm(state: ExamGenerationState) -> Optional[dict]:
+    """Returns the plan update when no planning call is needed (refinement or already planned), else None."""
     # --- Refinement Logic ---
     critic_feedback = state.get("critic_feedback", [])
     if critic_feedback:
@@ -206,159 +242,189 @@ def plan_generation_tasks_node(state: ExamGenerationState) -> dict:
     if state.get("final_generated_content") and not critic_feedback:
         return {}
 
-    try:
-        llm = get_llm()
-        prompt = f"Analyze the user's query to create a structured generation plan and a descriptive main title. The title should summarize the entire task in Traditional Chinese.\n\n**User Query:** \"{state['query']}\"\n\nYou must respond by calling the `Plan` tool."
-        planner_llm = llm.bind_tools(tools=[Plan], tool_choice="Plan")
-        messages = [SystemMessage(content="You are a helpful assistant that creates a structured generation plan and a descriptive title."), HumanMessage(content=prompt)]
-        
-        response = planner_llm.invoke(messages)
-        
-        if not response.tool_calls:
-            raise ValueError("The model did not call the required 'Plan' tool.")
-            
-        plan = Plan(**response.tool_calls[0]['args'])
+    return None
 
-        main_title = plan.main_title
-        generation_plan = [task.model_dump() for task in plan.tasks]
+def _build_plan_request(state: ExamGenerationState) -> Tuple[ChatOpenAI, Any, List[Any]]:
+    """Builds the planner model (bound to the Plan tool) and its messages."""
+    llm = get_llm()
+    prompt = f"Analyze the user's query to create a structured generation plan and a descriptive main title. The title should summarize the entire task in Traditional Chinese.\n\n**User Query:** \"{state['query']}\"\n\nYou must respond by calling the `Plan` tool."
+    planner_llm = llm.bind_tools(tools=[Plan], tool_choice="Plan")
+    messages = [SystemMessage(content="You are a helpful assistant that creates a structured generation plan and a descriptive title."), HumanMessage(content=prompt)]
+    return llm, planner_llm, messages
+
+def _plan_result(state: ExamGenerationState, llm: ChatOpenAI, response: Any) -> dict:
+    """Turns the planner's tool call into the node's state update."""
+    if not response.tool_calls:
+        raise ValueError("The model did not call the required 'Plan' tool.")
         
-        # --- Extract tokens and cost for the decorator ---
-        token_usage = response.response_metadata.get("token_usage", {})
-        prompt_tokens = token_usage.get("prompt_tokens", 0)
-        completion_tokens = token_usage.get("completion_tokens", 0)
-        model_name = llm.model_name
-        pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
-        estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+    plan = Plan(**response.tool_calls[0]['args'])
 
-        return {
-            "generation_plan": generation_plan,
-            "main_title": main_title,
-            "parent_task_id": state["current_task_id"], # Pass self as parent for next nodes
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "estimated_cost_usd": estimated_cost
-        }
+    main_title = plan.main_title
+    generation_plan = [task.model_dump() for task in plan.tasks]
+    
+    # --- Extract tokens and cost for the decorator ---
+    token_usage = response.response_metadata.get("token_usage", {})
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    completion_tokens = token_usage.get("completion_tokens", 0)
+    model_name = llm.model_name
+    pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
+    estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+
+    return {
+        "generation_plan": generation_plan,
+        "main_title": main_title,
+        "parent_task_id": state["current_task_id"], # Pass self as parent for next nodes
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": estimated_cost
+    }
+
+def _plan_error(e: Exception) -> dict:
+    error_message = f"Failed to create a generation plan: {e}"
+    return {"error": error_message, "generation_errors": [{"task": "plan_generation_tasks", "error_message": str(e)}]}
+
+@log_task(agent_name="plan_generation_tasks", task_description="Analyze user query to create a generation plan.", input_extractor=lambda state: {"query": state.get("query")})
+def plan_generation_tasks_node(state: ExamGenerationState) -> dict:
+    """Analyzes the user query to create a structured generation plan using an LLM."""
+    update = _plan_without_llm(state)
+    if update is not None:
+        return update
+    try:
+        llm, planner_llm, messages = _build_plan_request(state)
+        response = planner_llm.invoke(messages)
+        return _plan_result(state, llm, response)
+    except Exception as e:
+        return _plan_error(e)
+
+@log_task(agent_name="plan_generation_tasks", task_description="Analyze user query to create a generation plan.", input_extractor=lambda state: {"query": state.get("query")})
+async def aplan_generation_tasks_node(state: ExamGenerationState) -> dict:
+    """Async variant of plan_generation_tasks_node (awaits the planner call)."""
+    update = _plan_without_llm(state)
+    if update is not None:
+        return update
+    try:
+        llm, planner_llm, messages = _build_plan_request(state)
+        response = await planner_llm.ainvoke(messages)
+        return _plan_result(state, llm, response)
     except Exception as e:
-        error_message = f"Failed to create a generation plan: {e}"
-        return {"error": error_message, "generation_errors": [{"task": "plan_generation_tasks", "error_message": str(e)}]}
-
-def prepare_next_task_node(state: ExamGenerationState) -> ExamGenerationState:
-    """Pops the next task from the plan and sets it as the current task."""
-    state["error"] = None # Clear temporary error for next task
-    if state.get("generation_plan") and len(state["generation_plan"]) > 0:
-        state["current_task"] = state["generation_plan"].pop(0)
-    else:
-        state["current_task"] = None
-    return state
-
-def should_continue_router(state: ExamGenerationState) -> str:
-    """Router that checks the current task and decides where to go next."""
-    # If there's a temporary error from the previous task, it's already logged in generation_errors.
-    # We want to continue processing other tasks if possible, or go to aggregation.
-    current_task = state.get("current_task")
-    if current_task:
-        task_type = current_task.get("type")
-        if task_type == "refine_exam":
-            return "refine_exam"
-        return f"generate_{task_type}" if task_type in ["multiple_choice", "short_answer", "true_false"] else "end" # Return "end" for aggregation
-    return "end" # Go to aggregation if no more tasks
+        return _plan_error(e)
 
 # --- Refactored Generation Logic ---
 
+def _build_question_request(state: ExamGenerationState, task_type_name: str) -> Tuple[ChatOpenAI, Any, Any, List[Any]]:
+    """Builds the tool-bound model, its output schema and the multimodal messages for one generation task."""
+    current_task = state.get("current_task", {})
+    llm = get_llm()
+    task_details = f"Task: Generate {current_task.get('count', 1)} {task_type_name.replace('_', ' ')} question(s)"
+    if current_task.get('topic'):
+        task_details += f" about '{current_task.get('topic')}'"
+
+    combined_retrieved_text, image_data_urls = _prepare_multimodal_content(state["retrieved_page_content"])
+    
+    system_message_content = "You are a professional university professor (您是一位專業的大學教師) designing an exam. Your task is to generate high-quality questions based on the provided text content and images. You MUST use the provided tool to output the questions."
+    
+    human_message_content = [
+        {"type": "text", "text": f"**--- CRITICAL PRINCIPLES ---**\n"},
+        {"type": "text", "text": f"1.  **Must Provide Correct Answer:** Every question must have a clearly indicated correct answer.\n"},
+        {"type": "text", "text": f"2.  **Must Cite Source with Evidence:** You MUST include the **Page Number** AND a **brief quote or explanation** from the text that supports why the answer is correct.\n"},
+        {"type": "text", "text": f"3.  **Clean and Contextualize the Evidence:** The quoted text must be cleaned. Remove any formatting artifacts (like '○', bullet points, etc.). Ensure it forms a complete, coherent sentence or phrase that provides sufficient context for the answer, even if the question implies part of the context.\n"},
+        {"type": "text", "text": f"4.  **Language:** All output must be in Traditional Chinese (繁體中文).\n"},
+        {"type": "text", "text": f"5.  **Subject Relevance:** All questions must be strictly relevant to the main subject of the document.\n"},
+        {"type": "text", "text": f"\n**--- INPUTS ---**\n"},
+        {"type": "text", "text": f"- **Overall User Query:** {state['query']}\n"},
+        {"type": "text", "text": f"- **Current Task:** {task_details}\n"},
+        {"type": "text", "text": f"- **Retrieved Content:**\n{combined_retrieved_text}\n"},
+        {"type": "text", "text": f"- **Images:** [Images are provided if available]\n"}
+    ]
+
+    if task_type_name == "multiple_choice":
+        human_message_content.append({"type": "text", "text": f"\n**--- MULTIPLE CHOICE SPECIFIC INSTRUCTIONS ---**\n"})
+        human_message_content.append({"type": "text", "text": f"For multiple-choice questions, you MUST provide exactly four options (A, B, C, D) for each question. This is CRITICAL. The 'options' field in the tool MUST be a dictionary with keys 'A', 'B', 'C', 'D' and their corresponding text values. DO NOT OMIT THE 'OPTIONS' FIELD. Each question requires the 'options' dictionary with four choices.\n"})
+        human_message_content.append({"type": "text", "text": f"\n**--- EXAMPLE MULTIPLE CHOICE QUESTION JSON ---**\n"})
+        human_message_content.append({"type": "text", "text": f"```json\n{{\n  \"questions\": [\n    {{\n      \"question_number\": 1,\n      \"question_text\": \"以下哪項是地球上最豐富的氣體？\",\n      \"options\": {{\n        \"A\": \"氧氣\",\n        \"B\": \"氮氣\",\n        \"C\": \"二氧化碳\",\n        \"D\": \"氫氣\"\n      }},\n      \"correct_answer\": \"B\",\n      \"source\": {{\n        \"page_number\": \"10\",\n        \"evidence\": \"地球大氣層約有78%是氮氣。\"\n      }}\n    }}\n  ]\n}}\n```\n"})
+
+    if image_data_urls:
+        for image_uri in image_data_urls:
+            human_message_content.append({
+                "type": "image_url",
+                "image_url": {"url": image_uri, "detail": "low"}
+            })
+
+    messages = [
+        SystemMessage(content=system_message_content),
+        HumanMessage(content=human_message_content)
+    ]
+
+    tool_model_map = {
+        "multiple_choice": MultipleChoiceQuestionsList,
+        "true_false": TrueFalseQuestionsList,
+        "short_answer": ShortAnswerQuestionsList,
+    }
+    tool_model = tool_model_map.get(task_type_name)
+    if not tool_model:
+        raise ValueError(f"Unsupported task type: {task_type_name}")
+
+    tool_llm = llm.bind_tools(tools=[tool_model], tool_choice={"type": "function", "function": {"name": tool_model.__name__}})
+    return llm, tool_llm, tool_model, messages
+
+def _question_result(state: ExamGenerationState, task_type_name: str, llm: ChatOpenAI, tool_model: Any, response: Any) -> dict:
+    """Turns the model's tool call into the node's state update."""
+    if not response.tool_calls:
+        raise ValueError("The model did not call the required tool to generate questions.")
+        
+    generated_questions_list = tool_model(**response.tool_calls[0]['args'])
+    
+    final_generated_content = {
+        "type": task_type_name,
+        "questions": [q.model_dump() for q in generated_questions_list.questions]
+    }
+    
+    token_usage = response.response_metadata.get("token_usage", {})
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    completion_tokens = token_usage.get("completion_tokens", 0)
+    model_name = llm.model_name
+    pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
+    estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+
+    # The decorator will handle logging the output.
+    # We append to a new list to avoid modifying state directly in a deep way.
+    new_final_generated_content = state.get("final_generated_content", []) + [final_generated_content]
+
+    return {
+        "final_generated_content": new_final_generated_content,
+        "main_title": state.get("main_title"), # Preserve the title
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": estimated_cost
+    }
+
+def _question_error(state: ExamGenerationState, task_type_name: str, e: Exception) -> dict:
+    error_message = f"Error in {task_type_name} generation: {str(e)}"
+    new_generation_errors = state.get("generation_errors", []) + [{"task_type": task_type_name, "error_message": str(e), "task_input": state.get("current_task", {})}]
+    return {"error": error_message, "generation_errors": new_generation_errors}
+
 def _generic_generate_question(state: ExamGenerationState, task_type_name: str) -> dict:
     """
     A generic internal function that handles question generation.
     It is called by the public-facing, decorated node functions.
     It returns a dictionary with results and metrics for the decorator to log.
     """
-    current_task = state.get("current_task", {})
-    
     try:
-        llm = get_llm()
-        task_details = f"Task: Generate {current_task.get('count', 1)} {task_type_name.replace('_', ' ')} question(s)"
-        if current_task.get('topic'):
-            task_details += f" about '{current_task.get('topic')}'"
-
-        combined_retrieved_text, image_data_urls = _prepare_multimodal_content(state["retrieved_page_content"])
-        
-        system_message_content = "You are a professional university professor (您是一位專業的大學教師) designing an exam. Your task is to generate high-quality questions based on the provided text content and images. You MUST use the provided tool to output the questions."
-        
-        human_message_content = [
-            {"type": "text", "text": f"**--- CRITICAL PRINCIPLES ---**\n"},
-            {"type": "text", "text": f"1.  **Must Provide Correct Answer:** Every question must have a clearly indicated correct answer.\n"},
-            {"type": "text", "text": f"2.  **Must Cite Source with Evidence:** You MUST include the **Page Number** AND a **brief quote or explanation** from the text that supports why the answer is correct.\n"},
-            {"type": "text", "text": f"3.  **Clean and Contextualize the Evidence:** The quoted text must be cleaned. Remove any formatting artifacts (like '○', bullet points, etc.). Ensure it forms a complete, coherent sentence or phrase that provides sufficient context for the answer, even if the question implies part of the context.\n"},
-            {"type": "text", "text": f"4.  **Language:** All output must be in Traditional Chinese (繁體中文).\n"},
-            {"type": "text", "text": f"5.  **Subject Relevance:** All questions must be strictly relevant to the main subject of the document.\n"},
-            {"type": "text", "text": f"\n**--- INPUTS ---**\n"},
-            {"type": "text", "text": f"- **Overall User Query:** {state['query']}\n"},
-            {"type": "text", "text": f"- **Current Task:** {task_details}\n"},
-            {"type": "text", "text": f"- **Retrieved Content:**\n{combined_retrieved_text}\n"},
-            {"type": "text", "text": f"- **Images:** [Images are provided if available]\n"}
-        ]
-
-        if task_type_name == "multiple_choice":
-            human_message_content.append({"type": "text", "text": f"\n**--- MULTIPLE CHOICE SPECIFIC INSTRUCTIONS ---**\n"})
-            human_message_content.append({"type": "text", "text": f"For multiple-choice questions, you MUST provide exactly four options (A, B, C, D) for each question. This is CRITICAL. The 'options' field in the tool MUST be a dictionary with keys 'A', 'B', 'C', 'D' and their corresponding text values. DO NOT OMIT THE 'OPTIONS' FIELD. Each question requires the 'options' dictionary with four choices.\n"})
-            human_message_content.append({"type": "text", "text": f"\n**--- EXAMPLE MULTIPLE CHOICE QUESTION JSON ---**\n"})
-            human_message_content.append({"type": "text", "text": f"```json\n{{\n  \"questions\": [\n    {{\n      \"question_number\": 1,\n      \"question_text\": \"以下哪項是地球上最豐富的氣體？\",\n      \"options\": {{\n        \"A\": \"氧氣\",\n        \"B\": \"氮氣\",\n        \"C\": \"二氧化碳\",\n        \"D\": \"氫氣\"\n      }},\n      \"correct_answer\": \"B\",\n      \"source\": {{\n        \"page_number\": \"10\",\n        \"evidence\": \"地球大氣層約有78%是氮氣。\"\n      }}\n    }}\n  ]\n}}\n```\n"})
-
-        if image_data_urls:
-            for image_uri in image_data_urls:
-                human_message_content.append({
-                    "type": "image_url",
-                    "image_url": {"url": image_uri, "detail": "low"}
-                })
-
-        messages = [
-            SystemMessage(content=system_message_content),
-            HumanMessage(content=human_message_content)
-        ]
-
-        tool_model_map = {
-            "multiple_choice": MultipleChoiceQuestionsList,
-            "true_false": TrueFalseQuestionsList,
-            "short_answer": ShortAnswerQuestionsList,
-        }
-        tool_model = tool_model_map.get(task_type_name)
-        if not tool_model:
-            raise ValueError(f"Unsupported task type: {task_type_name}")
-
-        tool_llm = llm.bind_tools(tools=[tool_model], tool_choice={"type": "function", "function": {"name": tool_model.__name__}})
+        llm, tool_llm, tool_model, messages = _build_question_request(state, task_type_name)
         response = tool_llm.invoke(messages)
-        
-        if not response.tool_calls:
-            raise ValueError("The model did not call the required tool to generate questions.")
-            
-        generated_questions_list = tool_model(**response.tool_calls[0]['args'])
-        
-        final_generated_content = {
-            "type": task_type_name,
-            "questions": [q.model_dump() for q in generated_questions_list.questions]
-        }
-        
-        token_usage = response.response_metadata.get("token_usage", {})
-        prompt_tokens = token_usage.get("prompt_tokens", 0)
-        completion_tokens = token_usage.get("completion_tokens", 0)
-        model_name = llm.model_name
-        pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
-        estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
-
-        # The decorator will handle logging the output.
-        # We append to a new list to avoid modifying state directly in a deep way.
-        new_final_generated_content = state.get("final_generated_content", []) + [final_generated_content]
+        return _question_result(state, task_type_name, llm, tool_model, response)
+    except Exception as e:
+        return _question_error(state, task_type_name, e)
 
-        return {
-            "final_generated_content": new_final_generated_content,
-            "main_title": state.get("main_title"), # Preserve the title
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "estimated_cost_usd": estimated_cost
-        }
+async def _agenerate_question(state: ExamGenerationState, task_type_name: str) -> dict:
+    """Async variant of _generic_generate_question (awaits the generation call)."""
+    try:
+        llm, tool_llm, tool_model, messages = await asyncio.to_thread(_build_question_request, state, task_type_name)
+        response = await tool_llm.ainvoke(messages)
+        return _question_result(state, task_type_name, llm, tool_model, response)
     except Exception as e:
-        error_message = f"Error in {task_type_name} generation: {str(e)}"
-        new_generation_errors = state.get("generation_errors", []) + [{"task_type": task_type_name, "error_message": str(e), "task_input": current_task}]
-        return {"error": error_message, "generation_errors": new_generation_errors}
+        return _question_error(state, task_type_name, e)
+
 
 @log_task(agent_name="generate_multiple_choice", task_description="Generate multiple choice questions.", input_extractor=lambda state: {"current_task": state.get("current_task")})
 def generate_multiple_choice_node(state: ExamGenerationState) -> dict:
@@ -372,6 +438,113 @@ def generate_short_answer_node(state: ExamGenerationState) -> dict:
 def generate_true_false_node(state: ExamGenerationState) -> dict:
     return _generic_generate_question(state, "true_false")
 
+@log_task(agent_name="generate_multiple_choice", task_description="Generate multiple choice questions.", input_extractor=lambda state: {"current_task": state.get("current_task")})
+async def agenerate_multiple_choice_node(state: ExamGenerationState) -> dict:
+    return await _agenerate_question(state, "multiple_choice")
+
+@log_task(agent_name="generate_short_answer", task_description="Generate short answer questions.", input_extractor=lambda state: {"current_task": state.get("current_task")})
+async def agenerate_short_answer_node(state: ExamGenerationState) -> dict:
+    return await _agenerate_question(state, "short_answer")
+
+@log_task(agent_name="generate_true_false", task_description="Generate true/false questions.", input_extractor=lambda state: {"current_task": state.get("current_task")})
+async def agenerate_true_false_node(state: ExamGenerationState) -> dict:
+    return await _agenerate_question(state, "true_false")
+
+# --- Concurrent Execution of the Generation Plan ---
+
+# Maximum number of planned tasks that call the LLM at the same time.
+EXAM_GENERATION_CONCURRENCY = int(os.getenv("EXAM_GENERATION_CONCURRENCY", "4"))
+
+_GENERATOR_NODES = {
+    "multiple_choice": generate_multiple_choice_node,
+    "short_answer": generate_short_answer_node,
+    "true_false": generate_true_false_node,
+}
+_ASYNC_GENERATOR_NODES = {
+    "multiple_choice": agenerate_multiple_choice_node,
+    "short_answer": agenerate_short_answer_node,
+    "true_false": agenerate_true_false_node,
+}
+
+def _runnable_tasks(state: ExamGenerationState) -> List[Dict[str, Any]]:
+    return [task for task in state.get("generation_plan") or [] if task.get("type") in _GENERATOR_NODES]
+
+def _unsupported_task_errors(state: ExamGenerationState) -> List[Dict[str, Any]]:
+    # No node in this graph consumes other plan entries (e.g. 'refine_exam'); report them instead of dropping them silently.
+    return [
+        {"task_type": task.get("type"), "error_message": f"No generator for task type '{task.get('type')}'; task skipped.", "task_input": task}
+        for task in state.get("generation_plan") or [] if task.get("type") not in _GENERATOR_NODES
+    ]
+
+def _task_state(state: ExamGenerationState, task: Dict[str, Any]) -> dict:
+    """A private copy of the state for one task, so concurrent tasks never see each other's results."""
+    task_state = dict(state)
+    task_state.update({"current_task": task, "final_generated_content": [], "generation_errors": [], "error": None})
+    return task_state
+
+def _merge_task_results(state: ExamGenerationState, tasks: List[Dict[str, Any]], results: List[Any]) -> dict:
+    """Merges per-task results in plan order; failed tasks are recorded in generation_errors."""
+    final_generated_content = list(state.get("final_generated_content") or [])
+    generation_errors = list(state.get("generation_errors") or []) + _unsupported_task_errors(state)
+    for task, result in zip(tasks, results):
+        if isinstance(result, BaseException):
+            generation_errors.append({"task_type": task.get("type"), "error_message": str(result), "task_input": task})
+            continue
+        final_generated_content.extend(result.get("final_generated_content") or [])
+        if result.get("generation_errors"):
+            generation_errors.extend(result["generation_errors"])
+        elif result.get("error"):
+            # e.g. the decorator could not create the task record
+            generation_errors.append({"task_type": task.get("type"), "error_message": result["error"], "task_input": task})
+    return {
+        "final_generated_content": final_generated_content,
+        "generation_errors": generation_errors,
+        "generation_plan": [],
+        "current_task": None,
+        "error": None,
+    }
+
+def generate_all_tasks_node(state: ExamGenerationState) -> dict:
+    """
+    Runs every task of the generation plan concurrently on a thread pool
+    (at most EXAM_GENERATION_CONCURRENCY at a time) and merges the results in plan order.
+    Each task is still logged as its own generate_* task under the planner.
+    """
+    tasks = _runnable_tasks(state)
+    results = []
+    if tasks:
+        with ThreadPoolExecutor(max_workers=min(EXAM_GENERATION_CONCURRENCY, len(tasks))) as executor:
+            futures = [executor.submit(_GENERATOR_NODES[task["type"]], _task_state(state, task)) for task in tasks]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    results.append(e)
+    return _merge_task_results(state, tasks, results)
+
+async def agenerate_all_tasks_node(state: ExamGenerationState, config: RunnableConfig = None) -> dict:
+    """
+    Async variant of generate_all_tasks_node (asyncio.gather behind a semaphore).
+    Each finished block is also dispatched as a QUESTION_BLOCK_EVENT so
+    streaming clients can show it before the whole plan completes.
+    """
+    tasks = _runnable_tasks(state)
+    semaphore = asyncio.Semaphore(EXAM_GENERATION_CONCURRENCY)
+
+    async def run(task: Dict[str, Any]) -> dict:
+        async with semaphore:
+            result = await _ASYNC_GENERATOR_NODES[task["type"]](_task_state(state, task))
+        if config is not None and not result.get("error"):
+            await adispatch_custom_event(
+                QUESTION_BLOCK_EVENT,
+                {"task": task, "content": result.get("final_generated_content") or []},
+                config=config,
+            )
+        return result
+
+    results = await asyncio.gather(*(run(task) for task in tasks), return_exceptions=True)
+    return _merge_task_results(state, tasks, list(results))
+
 @log_task(agent_name="refine_exam", task_description="Refining exam questions based on feedback.", input_extractor=lambda state: {"feedback_count": len(state.get("critic_feedback", []))})
 def refine_exam_node(state: ExamGenerationState) -> dict:
     """
@@ -463,12 +636,6 @@ def refine_exam_node(state: ExamGenerationState) -> dict:
     except Exception as e:
         return {"error": f"Refinement failed: {str(e)}"}
 
-def handle_error_node(state: ExamGenerationState) -> ExamGenerationState:
-    """Handles any errors that occurred during the process."""
-    # This error is now logged at the node where it occurred.
-    # This node is primarily for graph control flow.
-    return state
-
 @log_task(agent_name="aggregate_exam_output", task_description="Aggregating all generated exam content into a final structured output.", input_extractor=lambda state: {"query": state.get("query"), "aggregated_item_count": len(state.get("final_generated_content", []))})
 def aggregate_final_output_node(state: ExamGenerationState) -> dict:
     """
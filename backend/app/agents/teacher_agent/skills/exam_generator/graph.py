@@ -1,3 +1,4 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from dotenv import load_dotenv
 from .state import ExamGenerationState
@@ -6,63 +7,37 @@ from backend.app.utils import db_logger # Import db_logger
 load_dotenv()
 
 
-# Import all the necessary nodes and the new router logic
+# Import all the necessary nodes
 from .exam_nodes import (
     retrieve_chunks_node,
     plan_generation_tasks_node,
-    prepare_next_task_node, # New node for state modification
-    should_continue_router, # New side-effect-free router
-    generate_multiple_choice_node,
-    generate_short_answer_node,
-    generate_true_false_node,
+    aplan_generation_tasks_node,
+    generate_all_tasks_node,
+    agenerate_all_tasks_node,
     aggregate_final_output_node, # Import the new aggregation node
-    handle_error_node,
 )
 
 # Create a new graph
 workflow = StateGraph(ExamGenerationState)
 
-# Add the nodes to the graph
+# Add the nodes to the graph.
+# LLM-calling nodes pair a sync and an async implementation: invoke() runs the
+# sync one, ainvoke() awaits the async one so the event loop is never blocked.
 workflow.add_node("retrieve_chunks", retrieve_chunks_node)
-workflow.add_node("plan_generation_tasks", plan_generation_tasks_node)
-workflow.add_node("prepare_next_task", prepare_next_task_node) # Add the new node
-workflow.add_node("generate_multiple_choice", generate_multiple_choice_node)
-workflow.add_node("generate_short_answer", generate_short_answer_node)
-workflow.add_node("generate_true_false", generate_true_false_node)
+workflow.add_node("plan_generation_tasks", RunnableLambda(plan_generation_tasks_node, afunc=aplan_generation_tasks_node, name="plan_generation_tasks"))
+# Fans the whole plan out at once; results come back merged in plan order.
+workflow.add_node("generate_questions", RunnableLambda(generate_all_tasks_node, afunc=agenerate_all_tasks_node, name="generate_questions"))
 workflow.add_node("aggregate_final_output", aggregate_final_output_node) # Add the new aggregation node
-workflow.add_node("handle_error", handle_error_node)
 
-# --- Define the new graph structure ---
+# --- Define the graph structure ---
 workflow.set_entry_point("retrieve_chunks")
 workflow.add_edge("retrieve_chunks", "plan_generation_tasks")
-
-# After planning, move to the new preparation node, which is the entry point of the loop
-workflow.add_edge("plan_generation_tasks", "prepare_next_task")
-
-# The conditional edge now starts from the preparation node
-workflow.add_conditional_edges(
-    "prepare_next_task",
-    should_continue_router,
-    {
-        "generate_multiple_choice": "generate_multiple_choice",
-        "generate_short_answer": "generate_short_answer",
-        "generate_true_false": "generate_true_false",
-        "handle_error": "handle_error",
-        "end": "aggregate_final_output" # Point to the aggregation node
-    }
-)
-
-# After each generation task, loop back to the preparation node to get the next task
-workflow.add_edge('generate_multiple_choice', 'prepare_next_task')
-workflow.add_edge('generate_short_answer', 'prepare_next_task')
-workflow.add_edge('generate_true_false', 'prepare_next_task')
+workflow.add_edge("plan_generation_tasks", "generate_questions")
+workflow.add_edge("generate_questions", "aggregate_final_output")
 
 # The aggregation node leads to the end
 workflow.add_edge('aggregate_final_output', END)
 
-# The error node leads to the end
-workflow.add_edge('handle_error', END)
-
 # Compile the graph into a runnable app
 app = workflow.compile()
 
@@ -1,20 +1,21 @@
+import asyncio
+
 from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 
 from backend.app.agents.teacher_agent.state import TeacherAgentState
 from backend.app.utils.db_logger import log_task
 # Import helpers from the exam_generator skill, as they are generic enough
 from backend.app.agents.teacher_agent.skills.exam_generator.exam_nodes import get_llm, MODEL_PRICING
+from backend.app.services.semantic_cache import semantic_cache, CACHE_MISS_LOG
 
-@log_task(agent_name="general_chat_skill", task_description="Handle general conversation and provide intelligent fallback.", input_extractor=lambda state: {"user_query": state.get("user_query")})
-def general_chat_node(state: TeacherAgentState) -> dict:
-    """
-    An intelligent fallback node that uses an LLM to provide a helpful response
-    when no other skill can handle the request. It informs the user about the
-    agent's limitations and suggests available skills.
-    """
-    user_query = state.get("user_query", "")
+# Replies depend only on the query, so repeated greetings are served from the semantic cache.
+CACHE_NAMESPACE = "general_chat"
+
+TITLE_SEPARATOR = "|||TITLE_END|||"
 
-    TITLE_SEPARATOR = "|||TITLE_END|||"
+def _build_chat_messages(state: TeacherAgentState) -> list:
+    user_query = state.get("user_query", "")
 
     # 根據對話內容動態生成title
     system_prompt = (
@@ -33,50 +34,97 @@ def general_chat_node(state: TeacherAgentState) -> dict:
         "Avoid directly stating what you *cannot* do unless the user explicitly asks for an unavailable feature. "
         "For example: '您好！我是一位 AI 教學助理。目前我可以根據您提供的資料生成考卷，或是為您總結教材內容。請問您需要哪方面的協助呢？'"
     )
+    return [SystemMessage(content=system_prompt), HumanMessage(content=human_prompt)]
+
+def _chat_result(llm, response) -> dict:
+    """Splits the title from the reply and attaches token usage and cost."""
+    raw_response = response.content
+
+    if TITLE_SEPARATOR in raw_response:
+        title_part, content_part = raw_response.split(TITLE_SEPARATOR, 1)
+        ai_response_title = title_part.strip()
+        ai_response_content = content_part.strip()
+    else:
+        # Fallback if LLM misses the separator
+        ai_response_title = "Cook AI 助教回覆"
+        ai_response_content = raw_response
+
+    token_usage = response.response_metadata.get("token_usage", {})
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    completion_tokens = token_usage.get("completion_tokens", 0)
+    model_name = llm.model_name
+    pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
+    estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+
+    final_result = {
+        "type": "message",
+        "title": ai_response_title,
+        "content": ai_response_content
+    }
+
+    return {
+        "final_result": final_result,
+        "semantic_cache": CACHE_MISS_LOG,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": estimated_cost
+    }
 
+def _cached_chat_result(hit) -> dict:
+    """A cache hit costs no tokens; the saved usage is logged under 'semantic_cache'."""
+    return {
+        "final_result": dict(hit.value),
+        "semantic_cache": hit.as_log(),
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "estimated_cost_usd": 0.0
+    }
+
+def _cache_chat_result(state: TeacherAgentState, result: dict):
+    semantic_cache.put(CACHE_NAMESPACE, state.get("user_query", ""), result["final_result"],
+                       prompt_tokens=result["prompt_tokens"], completion_tokens=result["completion_tokens"])
+
+def _chat_error(e: Exception) -> dict:
+    print(f"Error in general_chat_node: {e}")
+    # Fallback to a simple hardcoded response in case of LLM failure
+    final_result = {
+        "type": "message",
+        "title": "Cook AI 助教回覆",
+        "content": "抱歉，我目前遇到一些問題，暫時無法回覆您。請稍後再試。"
+    }
+    return {"final_result": final_result, "error": str(e)}
+
+@log_task(agent_name="general_chat_skill", task_description="Handle general conversation and provide intelligent fallback.", input_extractor=lambda state: {"user_query": state.get("user_query")})
+def general_chat_node(state: TeacherAgentState) -> dict:
+    """
+    An intelligent fallback node that uses an LLM to provide a helpful response
+    when no other skill can handle the request. It informs the user about the
+    agent's limitations and suggests available skills.
+    """
+    hit = semantic_cache.get(CACHE_NAMESPACE, state.get("user_query", ""))
+    if hit:
+        return _cached_chat_result(hit)
     try:
         llm = get_llm()
-        messages = [SystemMessage(content=system_prompt), HumanMessage(content=human_prompt)]
-        
-        response = llm.invoke(messages)
-        raw_response = response.content
-
-        if TITLE_SEPARATOR in raw_response:
-            title_part, content_part = raw_response.split(TITLE_SEPARATOR, 1)
-            ai_response_title = title_part.strip()
-            ai_response_content = content_part.strip()
-        else:
-            # Fallback if LLM misses the separator
-            ai_response_title = "Cook AI 助教回覆"
-            ai_response_content = raw_response
-
-        token_usage = response.response_metadata.get("token_usage", {})
-        prompt_tokens = token_usage.get("prompt_tokens", 0)
-        completion_tokens = token_usage.get("completion_tokens", 0)
-        model_name = llm.model_name
-        pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
-        estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
-
-        final_result = {
-            "type": "message",
-            "title": ai_response_title,
-            "content": ai_response_content
-        }
-
-        return {
-            "final_result": final_result,
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "estimated_cost_usd": estimated_cost
-        }
-
+        response = llm.invoke(_build_chat_messages(state))
+        result = _chat_result(llm, response)
+        _cache_chat_result(state, result)
+        return result
     except Exception as e:
-        print(f"Error in general_chat_node: {e}")
-        # Fallback to a simple hardcoded response in case of LLM failure
-        final_result = {
-            "type": "message",
-            "title": "Cook AI 助教回覆",
-            "content": "抱歉，我目前遇到一些問題，暫時無法回覆您。請稍後再試。"
-        }
-        return {"final_result": final_result, "error": str(e)}
+        return _chat_error(e)
 
+@log_task(agent_name="general_chat_skill", task_description="Handle general conversation and provide intelligent fallback.", input_extractor=lambda state: {"user_query": state.get("user_query")})
+async def ageneral_chat_node(state: TeacherAgentState, config: RunnableConfig = None) -> dict:
+    """Async variant of general_chat_node (awaits the chat completion; the config carries streaming callbacks)."""
+    # Cache lookups and writes may make a blocking embedding request.
+    hit = await asyncio.to_thread(semantic_cache.get, CACHE_NAMESPACE, state.get("user_query", ""))
+    if hit:
+        return _cached_chat_result(hit)
+    try:
+        llm = get_llm()
+        response = await llm.ainvoke(_build_chat_messages(state), config)
+        result = _chat_result(llm, response)
+        await asyncio.to_thread(_cache_chat_result, state, result)
+        return result
+    except Exception as e:
+        return _chat_error(e)
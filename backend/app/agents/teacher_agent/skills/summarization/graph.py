@@ -1,13 +1,15 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
 from .state import SummarizationState
-from .nodes import retrieve_chunks_node, summarize_node
+from .nodes import retrieve_chunks_node, summarize_node, asummarize_node
 
 # Define the graph
 builder = StateGraph(SummarizationState)
 
 # Add the nodes
 builder.add_node("retrieve_chunks", retrieve_chunks_node)
-builder.add_node("summarize", summarize_node)
+# invoke() runs the sync node, ainvoke() awaits the async one
+builder.add_node("summarize", RunnableLambda(summarize_node, afunc=asummarize_node, name="summarize"))
 
 # Set the entry point
 builder.set_entry_point("retrieve_chunks")
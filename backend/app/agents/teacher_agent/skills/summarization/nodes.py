@@ -1,10 +1,12 @@
 import os
 import json
+import asyncio
 from typing import List, Dict, Any, Tuple, Optional
 from pydantic import BaseModel, Field
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 
 from backend.app.agents.rag_agent import rag_agent
 from backend.app.utils import db_logger
@@ -41,6 +43,96 @@ def retrieve_chunks_node(state: SummarizationState) -> dict:
     except Exception as e:
         return {"error": f"Failed to retrieve context: {str(e)}"}
 
+def _build_summary_request(state: SummarizationState) -> Tuple[ChatOpenAI, Any, List[Any]]:
+    """Builds the tool-bound summarizer model and the multimodal prompt from the retrieved pages."""
+    # 1. Get retrieved content from state
+    retrieved_page_content = state.get("retrieved_page_content")
+
+    if not retrieved_page_content:
+        raise ValueError("No content found in state for summarization.")
+
+    combined_text, image_data_urls = _prepare_multimodal_content(retrieved_page_content)
+
+    if not combined_text and not image_data_urls:
+        raise ValueError("No text or images extracted from the document for summarization.")
+
+    # 2. Construct LLM Prompt for Tool Calling
+    llm = get_llm()
+    
+    system_prompt = (
+        "You are an expert educational assistant. Your task is to summarize the provided course material "
+        "into a a structured summary report. Focus on key concepts, main ideas, and important details. "
+        "The summary should be suitable for students or teachers to quickly grasp the essence of the material. "
+        "You MUST use the `SummaryReport` tool to output the summary. "
+        "Respond in Traditional Chinese (繁體中文)."
+    )
+    
+    human_message_content = [
+        {"type": "text", "text": f"**--- COURSE MATERIAL FOR SUMMARIZATION ---**\n"},
+        {"type": "text", "text": f"{combined_text}\n"},
+        {"type": "text", "text": f"\n**--- INSTRUCTIONS ---**\n"},
+        {"type": "text", "text": f"Please provide a comprehensive yet concise summary of the above material. "
+                                  f"Ensure the summary is well-structured with a main title and distinct sections, "
+                                  f"each containing a list of key points. "
+                                  f"The summary should be in Traditional Chinese. "
+                                  f"You MUST use the `SummaryReport` tool to format your response."}
+    ]
+
+    if image_data_urls:
+        for image_uri in image_data_urls:
+            human_message_content.append({
+                "type": "image_url",
+                "image_url": {"url": image_uri, "detail": "low"}
+            })
+
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=human_message_content)
+    ]
+
+    # 3. Call LLM with Tool Calling
+    summarizer_llm = llm.bind_tools(tools=[SummaryReport], tool_choice={"type": "function", "function": {"name": "SummaryReport"}})
+    return llm, summarizer_llm, messages
+
+def _summary_result(llm: ChatOpenAI, response: Any) -> dict:
+    """Parses the SummaryReport tool call and attaches token usage and cost."""
+    if not response.tool_calls:
+        raise ValueError("The summarizer model did not call the required 'SummaryReport' tool.")
+        
+    # Parse the structured summary
+    summary_report = SummaryReport(**response.tool_calls[0]['args'])
+    
+    # 4. Extract token usage and cost
+    token_usage = response.response_metadata.get("token_usage", {})
+    prompt_tokens = token_usage.get("prompt_tokens", 0)
+    completion_tokens = token_usage.get("completion_tokens", 0)
+    model_name = llm.model_name
+    pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
+    estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
+
+    # 5. Return the summary report for the parent graph to handle.
+    # The @log_task decorator will capture this return value as the node's output.
+    summary_report_dict = summary_report.model_dump()
+
+    final_generated_content = {
+        "type": "summary",
+        **summary_report_dict
+    }
+    
+    return {
+        "final_generated_content": final_generated_content,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "estimated_cost_usd": estimated_cost
+    }
+
+def _summary_error(e: Exception) -> dict:
+    error_message = f"Failed to generate structured summary: {str(e)}"
+    return {
+        "error": error_message,
+        "final_generated_content": None
+    }
+
 @log_task(
     agent_name="summarizer",
     task_description="Summarize provided course material.",
@@ -56,88 +148,26 @@ def summarize_node(state: SummarizationState) -> dict:
     and saves it to the database.
     """
     try:
-        # 1. Get retrieved content from state
-        retrieved_page_content = state.get("retrieved_page_content")
-
-        if not retrieved_page_content:
-            raise ValueError("No content found in state for summarization.")
-
-        combined_text, image_data_urls = _prepare_multimodal_content(retrieved_page_content)
-
-        if not combined_text and not image_data_urls:
-            raise ValueError("No text or images extracted from the document for summarization.")
-
-        # 2. Construct LLM Prompt for Tool Calling
-        llm = get_llm()
-        
-        system_prompt = (
-            "You are an expert educational assistant. Your task is to summarize the provided course material "
-            "into a a structured summary report. Focus on key concepts, main ideas, and important details. "
-            "The summary should be suitable for students or teachers to quickly grasp the essence of the material. "
-            "You MUST use the `SummaryReport` tool to output the summary. "
-            "Respond in Traditional Chinese (繁體中文)."
-        )
-        
-        human_message_content = [
-            {"type": "text", "text": f"**--- COURSE MATERIAL FOR SUMMARIZATION ---**\n"},
-            {"type": "text", "text": f"{combined_text}\n"},
-            {"type": "text", "text": f"\n**--- INSTRUCTIONS ---**\n"},
-            {"type": "text", "text": f"Please provide a comprehensive yet concise summary of the above material. "
-                                      f"Ensure the summary is well-structured with a main title and distinct sections, "
-                                      f"each containing a list of key points. "
-                                      f"The summary should be in Traditional Chinese. "
-                                      f"You MUST use the `SummaryReport` tool to format your response."}
-        ]
-
-        if image_data_urls:
-            for image_uri in image_data_urls:
-                human_message_content.append({
-                    "type": "image_url",
-                    "image_url": {"url": image_uri, "detail": "low"}
-                })
-
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=human_message_content)
-        ]
-
-        # 3. Call LLM with Tool Calling
-        summarizer_llm = llm.bind_tools(tools=[SummaryReport], tool_choice={"type": "function", "function": {"name": "SummaryReport"}})
+        llm, summarizer_llm, messages = _build_summary_request(state)
         response = summarizer_llm.invoke(messages)
-        
-        if not response.tool_calls:
-            raise ValueError("The summarizer model did not call the required 'SummaryReport' tool.")
-            
-        # Parse the structured summary
-        summary_report = SummaryReport(**response.tool_calls[0]['args'])
-        
-        # 4. Extract token usage and cost
-        token_usage = response.response_metadata.get("token_usage", {})
-        prompt_tokens = token_usage.get("prompt_tokens", 0)
-        completion_tokens = token_usage.get("completion_tokens", 0)
-        model_name = llm.model_name
-        pricing = MODEL_PRICING.get(model_name, {"input": 0, "output": 0})
-        estimated_cost = ((prompt_tokens / 1_000_000) * pricing["input"]) + ((completion_tokens / 1_000_000) * pricing["output"])
-
-        # 5. Return the summary report for the parent graph to handle.
-        # The @log_task decorator will capture this return value as the node's output.
-        summary_report_dict = summary_report.model_dump()
-
-        final_generated_content = {
-            "type": "summary",
-            **summary_report_dict
-        }
-        
-        return {
-            "final_generated_content": final_generated_content,
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "estimated_cost_usd": estimated_cost
-        }
+        return _summary_result(llm, response)
+    except Exception as e:
+        return _summary_error(e)
 
+@log_task(
+    agent_name="summarizer",
+    task_description="Summarize provided course material.",
+    input_extractor=lambda state: {
+        "query": state.get("query"),
+        "unique_content_id": state.get("unique_content_id"),
+        "retrieved_pages": len(state.get("retrieved_page_content", []))
+    }
+)
+async def asummarize_node(state: SummarizationState, config: RunnableConfig = None) -> dict:
+    """Async variant of summarize_node (awaits the summarization call; the config carries streaming callbacks)."""
+    try:
+        llm, summarizer_llm, messages = await asyncio.to_thread(_build_summary_request, state)
+        response = await summarizer_llm.ainvoke(messages, config)
+        return _summary_result(llm, response)
     except Exception as e:
-        error_message = f"Failed to generate structured summary: {str(e)}"
-        return {
-            "error": error_message,
-            "final_generated_content": None
-        }
+        return _summary_error(e)
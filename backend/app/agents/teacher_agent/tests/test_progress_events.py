@@ -0,0 +1,69 @@
+import json
+from types import SimpleNamespace
+
+from backend.app.agents.teacher_agent.progress_events import ProgressTranslator
+
+
+def _event(kind, name, run_id, parent_ids, node=None, **data):
+    return {"event": kind, "name": name, "run_id": run_id, "parent_ids": parent_ids,
+            "metadata": {"langgraph_node": node} if node else {}, "data": data}
+
+
+def _decode(messages):
+    return [(m["event"], json.loads(m["data"])) for m in messages]
+
+
+def test_reports_direct_graph_children_only():
+    print("=== Testing node events ===")
+    t = ProgressTranslator()
+    assert t.translate(_event("on_chain_start", "LangGraph", "root", [])) == []
+    assert _decode(t.translate(_event("on_chain_start", "router", "r1", ["root"], node="router"))) == [("node_start", {"node": "router"})]
+    # The RunnableLambda inside the node is not a node of its own
+    assert t.translate(_event("on_chain_start", "router", "r2", ["root", "r1"], node="router")) == []
+    end = t.translate(_event("on_chain_end", "router", "r1", ["root"], node="router",
+                             output={"next_node": "exam_generation_skill", "routing": {"tier": "keyword"}, "job_id": 1}))
+    assert _decode(end) == [("node_end", {"node": "router", "next_node": "exam_generation_skill", "routing": {"tier": "keyword"}})]
+    print("✅ node events OK")
+
+
+def test_reaches_subgraph_nodes_and_keeps_final_state():
+    print("=== Testing sub-graph and final state ===")
+    t = ProgressTranslator()
+    t.translate(_event("on_chain_start", "LangGraph", "root", []))
+    t.translate(_event("on_chain_start", "exam_generation_skill", "skill", ["root"]))
+    assert t.translate(_event("on_chain_start", "LangGraph", "sub", ["root", "skill"])) == []
+    start = t.translate(_event("on_chain_start", "retrieve_chunks", "rc", ["root", "skill", "sub"]))
+    assert _decode(start) == [("node_start", {"node": "retrieve_chunks"})]
+    end = t.translate(_event("on_chain_end", "retrieve_chunks", "rc", ["root", "skill", "sub"],
+                             output={"retrieved_text_chunks": [1, 2, 3], "retrieved_page_content": [1]}))
+    assert _decode(end) == [("node_end", {"node": "retrieve_chunks", "text_chunks": 3, "pages": 1})]
+    # The sub-graph's own end is not reported as a node
+    assert t.translate(_event("on_chain_end", "LangGraph", "sub", ["root", "skill"], output={})) == []
+
+    assert t.translate(_event("on_chain_end", "LangGraph", "root", [], output={"final_result": {"ok": True}})) == []
+    assert t.final_state == {"final_result": {"ok": True}}
+    print("✅ sub-graph OK")
+
+
+def test_streams_generation_tokens_and_question_blocks():
+    print("=== Testing tokens and question blocks ===")
+    t = ProgressTranslator()
+    token = t.translate(_event("on_chat_model_stream", "ChatOpenAI", "m1", ["root"], node="summarize",
+                               chunk=SimpleNamespace(content="重點")))
+    assert _decode(token) == [("token", {"node": "summarize", "delta": "重點"})]
+    # Router output and tool-call argument deltas are not user-visible text
+    assert t.translate(_event("on_chat_model_stream", "ChatOpenAI", "m2", ["root"], node="router",
+                              chunk=SimpleNamespace(content="x"))) == []
+    assert t.translate(_event("on_chat_model_stream", "ChatOpenAI", "m3", ["root"], node="generate_questions",
+                              chunk=SimpleNamespace(content=""))) == []
+
+    block = t.translate({"event": "on_custom_event", "name": "question_block", "run_id": "c", "parent_ids": ["root"],
+                         "metadata": {}, "data": {"task": {"type": "true_false"}, "content": [{"title": "Q"}]}})
+    assert _decode(block) == [("question_block", {"task": {"type": "true_false"}, "content": [{"title": "Q"}]})]
+    print("✅ tokens and question blocks OK")
+
+
+if __name__ == "__main__":
+    test_reports_direct_graph_children_only()
+    test_reaches_subgraph_nodes_and_keeps_final_state()
+    test_streams_generation_tokens_and_question_blocks()
@@ -0,0 +1,102 @@
+import numpy as np
+
+from backend.app.agents.teacher_agent.router_classifier import (
+    ROUTER_CENTROID_MIN_SIMILARITY,
+    ROUTER_CENTROID_TEMPERATURE,
+    ROUTER_CONFIDENCE_THRESHOLD,
+    CentroidClassifier,
+    centroid_confidence,
+    classify_by_keywords,
+    fast_route,
+)
+
+# One axis per skill: a text's "embedding" counts the skill's marker characters.
+_MARKERS = {"exam_generation_skill": "題", "summarization_skill": "總", "general_chat_skill": "好"}
+
+
+def _fake_embed(texts):
+    return [[float(text.count(marker)) + 0.01 for marker in _MARKERS.values()] for text in texts]
+
+
+_EXAMPLES = {
+    "exam_generation_skill": ["出題", "三題"],
+    "summarization_skill": ["總結", "總整理"],
+    "general_chat_skill": ["你好", "好"],
+}
+
+
+def test_keyword_tier_is_confident_for_unambiguous_queries():
+    print("=== Testing keyword tier ===")
+    assert classify_by_keywords("幫我出5題選擇題").skill == "exam_generation_skill"
+    assert classify_by_keywords("幫我總結這份教材").skill == "summarization_skill"
+    assert classify_by_keywords("你好").skill == "general_chat_skill"
+    assert classify_by_keywords("幫我出5題選擇題").is_confident
+    # "test" must not fire inside "latest"
+    assert classify_by_keywords("what is the latest news").skill is None
+    print("✅ keyword tier OK")
+
+
+def test_keyword_tier_does_not_skip_the_llm_on_generic_words():
+    print("=== Testing keyword false positives ===")
+    for query in ["這份教材中出現的問題有哪些？", "how do I test my code", "這個測驗的答案是什麼", "重點是什麼意思"]:
+        decision = classify_by_keywords(query)
+        assert not decision.is_confident, (query, decision)
+    # Two generic hits for the same skill together are enough.
+    assert classify_by_keywords("這次小考的選擇題").is_confident
+    print("✅ generic words alone escalate")
+
+
+def test_keyword_tier_splits_confidence_on_conflicting_rules():
+    print("=== Testing keyword conflicts ===")
+    decision = classify_by_keywords("你好，請總結重點後出一份測驗")
+    assert decision.confidence < ROUTER_CONFIDENCE_THRESHOLD
+    assert not decision.is_confident
+    print(f"✅ conflicting query escalates, scores={decision.scores}")
+
+
+def test_centroid_tier_picks_nearest_skill_and_fits_once():
+    print("=== Testing centroid tier ===")
+    calls = []
+
+    def embed(texts):
+        calls.append(list(texts))
+        return _fake_embed(texts)
+
+    classifier = CentroidClassifier(examples=_EXAMPLES, embed=embed)
+    assert classifier.classify("總總總").skill == "summarization_skill"
+    assert classifier.classify("題題").skill == "exam_generation_skill"
+    # One call for the examples, then one per query.
+    assert len(calls) == 3 and len(calls[0]) == 6
+    print("✅ centroid tier OK")
+
+
+def test_centroid_confidence_needs_a_clear_margin():
+    print("=== Testing centroid calibration ===")
+    def confidence(similarities):
+        return centroid_confidence(np.array(similarities), ROUTER_CENTROID_TEMPERATURE, ROUTER_CENTROID_MIN_SIMILARITY).max()
+
+    assert confidence([0.50, 0.46, 0.46]) < ROUTER_CONFIDENCE_THRESHOLD  # a 0.04 lead is noise
+    assert confidence([0.60, 0.45, 0.45]) >= ROUTER_CONFIDENCE_THRESHOLD
+    assert confidence([0.25, 0.05, 0.05]) == 0.0  # off-topic for every skill
+    print("✅ small margins and off-topic queries escalate")
+
+
+def test_fast_route_escalates_when_no_tier_is_confident():
+    print("=== Testing fast_route escalation ===")
+    classifier = CentroidClassifier(examples=_EXAMPLES, embed=_fake_embed, temperature=10.0)
+    decision, attempts = fast_route("請問這是什麼", classifier=classifier)
+    assert decision is None
+    assert [a["tier"] for a in attempts] == ["keyword", "centroid"]
+
+    decision, attempts = fast_route("幫我出5題選擇題", classifier=classifier)
+    assert decision.tier == "keyword" and len(attempts) == 1
+    print("✅ escalation OK")
+
+
+if __name__ == "__main__":
+    test_keyword_tier_is_confident_for_unambiguous_queries()
+    test_keyword_tier_does_not_skip_the_llm_on_generic_words()
+    test_keyword_tier_splits_confidence_on_conflicting_rules()
+    test_centroid_tier_picks_nearest_skill_and_fits_once()
+    test_centroid_confidence_needs_a_clear_margin()
+    test_fast_route_escalates_when_no_tier_is_confident()
@@ -0,0 +1,108 @@
+from contextlib import contextmanager
+
+from backend.app.agents import rag_agent as rag_agent_module
+from backend.app.agents.rag_agent import RAGAgent, _SearchRow, _SEARCH_STATEMENTS, _SEARCH_MANY_STATEMENTS
+
+
+class _FakeConnection:
+    """Returns canned rows for every statement and records what was executed."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        self.executed.append((statement, params))
+        rows = self.rows
+        return type("_Result", (), {"fetchall": lambda self: list(rows)})()
+
+
+class _FakeEngine:
+    def __init__(self, rows):
+        self.connection = _FakeConnection(rows)
+
+    @contextmanager
+    def begin(self):
+        yield self.connection
+
+
+def _install_fakes(monkeypatch, rows, embeddings):
+    engine = _FakeEngine(rows)
+    monkeypatch.setattr(rag_agent_module, "engine", engine)
+    monkeypatch.setattr(rag_agent_module, "RAG_SEARCH_STRATEGY", "exact")
+    monkeypatch.setattr(rag_agent_module, "RAG_VECTOR_CACHE_ENABLED", False)
+    monkeypatch.setattr(rag_agent_module.embedding_service, "create_embeddings", lambda texts: (embeddings[:len(texts)], {}))
+    return engine.connection
+
+
+def _chunk(chunk_id, pages, query_index=None):
+    return _SearchRow("chunk", chunk_id, f"chunk {chunk_id}", {"page_numbers": pages}, None, None, query_index)
+
+
+def _page(page_number):
+    return _SearchRow("page", None, None, None, page_number, [{"type": "text", "content": f"page {page_number}"}])
+
+
+def test_search_splits_chunk_and_page_rows_in_sql_order(monkeypatch):
+    print("=== Testing RAGAgent.search row handling ===")
+    # As _SEARCH_SQL returns them: chunks by rank, then the cited pages by page number.
+    rows = [_chunk(7, [2, 3]), _chunk(4, [1]), _page(1), _page(2), _page(3)]
+    conn = _install_fakes(monkeypatch, rows, [[0.1, 0.2]])
+
+    result = RAGAgent().search("help", unique_content_id=9, top_k=2, mode="vector")
+
+    statement, params = conn.executed[-1]
+    assert statement is _SEARCH_STATEMENTS[("exact", False)]
+    assert params == {"query_embedding": "[0.1, 0.2]", "unique_content_id": 9, "top_k": 2, "candidate_k": 2}
+    assert result["text_chunks"] == [
+        {"chunk_id": 7, "text": "chunk 7", "source_pages": [2, 3]},
+        {"chunk_id": 4, "text": "chunk 4", "source_pages": [1]},
+    ]
+    assert [page["page_number"] for page in result["page_content"]] == [1, 2, 3]
+    assert all(page["source_document_id"] == 9 for page in result["page_content"])
+    print("✅ chunks by rank, pages by page number")
+
+
+def test_search_without_chunks_returns_nothing(monkeypatch):
+    print("=== Testing RAGAgent.search with no hits ===")
+    _install_fakes(monkeypatch, [], [[0.1, 0.2]])
+    assert RAGAgent().search("help", unique_content_id=9, top_k=2, mode="vector") == {"text_chunks": [], "page_content": []}
+    print("✅ empty result")
+
+
+def test_search_many_groups_rows_per_query_and_dedups(monkeypatch):
+    print("=== Testing RAGAgent.search_many ===")
+    # As _SEARCH_MANY_SQL returns them: chunks by (query_index, rank), then the merged pages.
+    rows = [
+        _chunk(7, [2], query_index=0), _chunk(4, [1], query_index=0),
+        _chunk(5, [3], query_index=1), _chunk(7, [2], query_index=1),
+        _page(1), _page(2), _page(3),
+    ]
+    conn = _install_fakes(monkeypatch, rows, [[0.1], [0.2], [0.3]])
+
+    result = RAGAgent().search_many(["PCA", "SVM", "KNN"], unique_content_id=9, top_k=2)
+
+    statement, params = conn.executed[-1]
+    assert statement is _SEARCH_MANY_STATEMENTS["exact"]
+    assert params == {"query_embeddings": ["[0.1]", "[0.2]", "[0.3]"], "unique_content_id": 9, "top_k": 2}
+    assert [entry["query"] for entry in result["per_query"]] == ["PCA", "SVM", "KNN"]
+    assert [[c["chunk_id"] for c in entry["text_chunks"]] for entry in result["per_query"]] == [[7, 4], [5, 7], []]
+    assert [c["chunk_id"] for c in result["text_chunks"]] == [7, 4, 5]
+    assert [page["page_number"] for page in result["page_content"]] == [1, 2, 3]
+    print("✅ per-query rank order kept, shared chunk 7 merged once")
+
+
+def test_search_many_without_queries_skips_the_database(monkeypatch):
+    print("=== Testing RAGAgent.search_many with no queries ===")
+    conn = _install_fakes(monkeypatch, [], [])
+    assert RAGAgent().search_many([], unique_content_id=9) == {"per_query": [], "text_chunks": [], "page_content": []}
+    assert conn.executed == []
+    print("✅ nothing executed")
+
+
+if __name__ == "__main__":
+    import pytest
+    test_search_splits_chunk_and_page_rows_in_sql_order(pytest.MonkeyPatch())
+    test_search_without_chunks_returns_nothing(pytest.MonkeyPatch())
+    test_search_many_groups_rows_per_query_and_dedups(pytest.MonkeyPatch())
+    test_search_many_without_queries_skips_the_database(pytest.MonkeyPatch())
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 import os
 import re
 
@@ -24,6 +24,7 @@ class Document:
     """A dataclass to represent a loaded document, with page-by-page content."""
     source: str  # e.g., file path or URL
     pages: List[Page] = field(default_factory=list)
+    image_stats: Dict[str, Any] = field(default_factory=dict)  # OCR/base64 dedup and cache counters
     
     @property
     def content(self) -> str:
@@ -32,11 +33,24 @@ class Document:
 
 class DocumentLoader(ABC):
     """Abstract base class for document loaders."""
+    # Image/OCR counters of the last iter_pages() run, set once it is exhausted.
+    image_stats: Dict[str, Any] = {}
+
     @abstractmethod
     def load(self, source: str) -> Document:
         """Load a document from a given source and return a Document object."""
         pass
 
+    def iter_pages(self, source: str) -> Iterator[Page]:
+        """
+        Yields the document's pages in order, as soon as each is ready.
+        Loaders that can parse incrementally override this; the default loads
+        the whole document first.
+        """
+        document = self.load(source)
+        self.image_stats = document.image_stats
+        yield from document.pages
+
 def get_loader(source: str) -> DocumentLoader:
     """
     Factory function to get the appropriate document loader based on the source.
@@ -1,7 +1,6 @@
 from . import Document, Page, ExtractedImage, DocumentLoader
 from docx import Document as DocxDocument
-from .image_utils import image_to_base64_uri
-from .ocr_utils import ocr_image_to_text
+from .image_processor import ImageProcessor
 
 class DocxLoader(DocumentLoader):
     """A loader for Microsoft Word (.docx) files."""
@@ -12,6 +11,7 @@ class DocxLoader(DocumentLoader):
             doc = DocxDocument(source)
             native_text_parts = []
             doc_images = []
+            image_processor = ImageProcessor()
 
             for para in doc.paragraphs:
                 native_text_parts.append(para.text)
@@ -23,8 +23,8 @@ class DocxLoader(DocumentLoader):
                         image_part = doc.part.rels[rel].target_part
                         image_bytes = image_part.blob
                         
-                        ocr_text = ocr_image_to_text(image_bytes) or ""
-                        base64_image_uri = image_to_base64_uri(image_bytes)
+                        base64_image_uri, ocr_text = image_processor.process(image_bytes)
+                        ocr_text = ocr_text or ""
 
                         if base64_image_uri:
                             doc_images.append(ExtractedImage(image_uri=base64_image_uri, ocr_text=ocr_text))
@@ -36,7 +36,7 @@ class DocxLoader(DocumentLoader):
             single_page = Page(page_number=1, native_text=native_text, extracted_images=doc_images)
 
             print(f"Successfully read content and {len(doc_images)} images from {source}")
-            return Document(source=source, pages=[single_page])
+            return Document(source=source, pages=[single_page], image_stats=image_processor.stats())
         except Exception as e:
             print(f"Error reading DOCX file: {str(e)}")
             raise e
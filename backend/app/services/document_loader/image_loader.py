@@ -1,6 +1,5 @@
 from . import Document, Page, ExtractedImage, DocumentLoader
-from .ocr_utils import ocr_image_to_text
-from .image_utils import image_to_base64_uri
+from .image_processor import ImageProcessor
 import os
 
 class ImageLoader(DocumentLoader):
@@ -12,11 +11,10 @@ class ImageLoader(DocumentLoader):
             with open(source, "rb") as f:
                 image_bytes = f.read()
             
-            # Perform OCR on the image
-            ocr_text = ocr_image_to_text(image_bytes) or ""
-
-            # Convert image to base64 URI
-            base64_image_uri = image_to_base64_uri(image_bytes)
+            # Perform OCR (served from the persistent OCR cache when seen before) and convert to base64 URI
+            image_processor = ImageProcessor()
+            base64_image_uri, ocr_text = image_processor.process(image_bytes)
+            ocr_text = ocr_text or ""
             
             # Create an ExtractedImage object
             extracted_image = ExtractedImage(image_uri=base64_image_uri, ocr_text=ocr_text)
@@ -25,7 +23,7 @@ class ImageLoader(DocumentLoader):
             single_page = Page(page_number=1, native_text="", extracted_images=[extracted_image])
 
             print(f"Successfully processed image {source}")
-            return Document(source=source, pages=[single_page])
+            return Document(source=source, pages=[single_page], image_stats=image_processor.stats())
         except Exception as e:
             print(f"Error reading image file {source}: {str(e)}")
             raise e
@@ -0,0 +1,133 @@
+"""
+Shared image-processing layer for the document loaders.
+
+Lecture decks repeat the same logo, banner and template images on every slide.
+ImageProcessor hashes the raw image bytes so each distinct image is OCR'd and
+base64-encoded only once per document, and OCR text is additionally kept in a
+persistent on-disk cache shared across documents and worker processes.
+"""
+import hashlib
+import os
+import tempfile
+from typing import Dict, Tuple
+
+from .ocr_utils import ocr_image_to_text, OCR_LANG
+from .image_utils import image_to_base64_uri
+
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "cookai_ocr_cache"))
+
+_ocr_cache = None
+
+
+def get_ocr_cache():
+    """Returns the process-wide persistent OCR cache, or None if it is disabled or unavailable."""
+    global _ocr_cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _ocr_cache is None:
+        try:
+            import diskcache
+            _ocr_cache = diskcache.Cache(OCR_CACHE_DIR)
+        except Exception as e:
+            print(f"Warning: Persistent OCR cache unavailable, OCR results are cached per document only: {e}")
+            return None
+    return _ocr_cache
+
+
+def image_hash(image_bytes: bytes) -> str:
+    """Returns the SHA-256 hex digest of the raw image bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def ocr_with_cache(digest: str, image_bytes: bytes) -> Tuple[str, bool]:
+    """
+    Returns (ocr_text, from_persistent_cache) for an image whose content hash is
+    `digest`, running OCR only on a persistent cache miss.
+    """
+    persistent_cache = get_ocr_cache()
+    cache_key = f"{OCR_LANG}:{digest}"
+    if persistent_cache is not None:
+        try:
+            ocr_text = persistent_cache.get(cache_key)
+        except Exception as e:
+            print(f"Warning: OCR cache read failed: {e}")
+            ocr_text = None
+        if ocr_text is not None:
+            return ocr_text, True
+
+    ocr_text = ocr_image_to_text(image_bytes)
+    # Failures are returned as "[OCR Error: ...]" strings and must not be cached.
+    if persistent_cache is not None and not ocr_text.startswith("[OCR Error"):
+        try:
+            persistent_cache.set(cache_key, ocr_text)
+        except Exception as e:
+            print(f"Warning: OCR cache write failed: {e}")
+    return ocr_text, False
+
+
+class ImageProcessor:
+    """
+    Processes the images of one document, memoizing OCR text and base64 URIs
+    by image content hash.
+
+    With defer_ocr=True no OCR is run: each distinct image is kept in
+    `pending_ocr` (hash -> bytes) and its OCR text is returned as None, for a
+    caller that OCRs the images of several shards of one document together.
+    """
+
+    def __init__(self, defer_ocr: bool = False):
+        self.defer_ocr = defer_ocr
+        self.pending_ocr: Dict[str, bytes] = {}
+        self._results: Dict[str, Tuple[str, str]] = {}
+        self._stats = {"images_seen": 0, "unique_images": 0, "ocr_runs": 0, "ocr_persistent_hits": 0}
+
+    def process(self, image_bytes: bytes) -> Tuple[str, str]:
+        """
+        Returns (base64_image_uri, ocr_text) for the image, computing each at most
+        once per distinct image in this document.
+        """
+        _, base64_uri, ocr_text = self.process_with_hash(image_bytes)
+        return base64_uri, ocr_text
+
+    def process_with_hash(self, image_bytes: bytes) -> Tuple[str, str, str]:
+        """Like process(), but also returns the image's content hash first."""
+        self._stats["images_seen"] += 1
+        digest = image_hash(image_bytes)
+        cached = self._results.get(digest)
+        if cached is not None:
+            return (digest,) + cached
+
+        self._stats["unique_images"] += 1
+        if self.defer_ocr:
+            self.pending_ocr[digest] = image_bytes
+            ocr_text = None
+        else:
+            ocr_text = self._ocr(digest, image_bytes)
+        result = (image_to_base64_uri(image_bytes), ocr_text)
+        self._results[digest] = result
+        return (digest,) + result
+
+    def _ocr(self, digest: str, image_bytes: bytes) -> str:
+        ocr_text, from_cache = ocr_with_cache(digest, image_bytes)
+        self._stats["ocr_persistent_hits" if from_cache else "ocr_runs"] += 1
+        return ocr_text
+
+    def stats(self) -> Dict[str, float]:
+        """Returns per-document counters plus the dedup and OCR cache hit rates."""
+        return summarize_image_stats(self._stats)
+
+
+def summarize_image_stats(counters: Dict[str, int]) -> Dict[str, float]:
+    """Adds hit rates to raw counters (also used for the counters the parallel PDF loader collects)."""
+    images_seen = counters.get("images_seen", 0)
+    unique_images = counters.get("unique_images", 0)
+    persistent_hits = counters.get("ocr_persistent_hits", 0)
+    return {
+        "images_seen": images_seen,
+        "unique_images": unique_images,
+        "ocr_runs": counters.get("ocr_runs", 0),
+        "ocr_persistent_hits": persistent_hits,
+        "dedup_hit_rate": round(1 - unique_images / images_seen, 4) if images_seen else 0.0,
+        "ocr_cache_hit_rate": round(persistent_hits / unique_images, 4) if unique_images else 0.0,
+    }
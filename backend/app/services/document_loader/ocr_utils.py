@@ -2,6 +2,8 @@ import pytesseract
 from PIL import Image
 import io
 
+OCR_LANG = 'chi_tra+eng' # Assuming Traditional Chinese and English
+
 def ocr_image_to_text(image_bytes: bytes) -> str:
     """Performs OCR on image bytes and returns the extracted text.
     
@@ -12,7 +14,7 @@ def ocr_image_to_text(image_bytes: bytes) -> str:
     """
     try:
         image = Image.open(io.BytesIO(image_bytes))
-        text = pytesseract.image_to_string(image, lang='chi_tra+eng') # Assuming Traditional Chinese and English
+        text = pytesseract.image_to_string(image, lang=OCR_LANG)
         return text.strip()
     except pytesseract.TesseractNotFoundError:
         print("Error: Tesseract OCR engine not found. Please install it.")
@@ -1,70 +1,162 @@
+import os
+import math
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Dict, Iterator
 
 import pdfplumber
-import base64
-import io
-from PIL import Image
 from . import Document, Page, DocumentLoader
-from .ocr_utils import ocr_image_to_text
-from .image_utils import image_to_base64_uri
+from .image_processor import ImageProcessor, ocr_with_cache, summarize_image_stats
+
+# Number of worker processes for page extraction (1 disables parallel mode).
+PDF_LOADER_WORKERS = int(os.getenv("PDF_LOADER_WORKERS", str(os.cpu_count() or 1)))
+# Below this page count, process start-up costs more than it saves.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "8"))
+
+
+def _extract_page(page, page_num: int, image_processor: ImageProcessor) -> Page:
+    """Extracts text lines and images (with OCR) from one pdfplumber page, ordered top to bottom."""
+    # 處理文字
+    text_elements = []
+    for block in page.extract_text_lines(keep_blank_chars=True):
+        text_elements.append({
+            "type": "text",
+            "content": block["text"],
+            "top": block["top"] # 儲存垂直位置
+        })
+
+    # 處理圖片
+    image_elements = []
+    for img in page.images:
+        image_data = img.get("stream").get_data()
+
+        if not image_data:
+            continue
+
+        # 轉 Base64 並以 OCR 提取圖片文字 (相同圖片只處理一次)
+        digest, base64_string, ocr_text_result = image_processor.process_with_hash(image_data)
+
+        image_element = {
+            "type": "image",
+            "base64": base64_string,
+            "ocr_text": ocr_text_result,
+            "top": img["top"] # 儲存垂直位置
+        }
+        if ocr_text_result is None:
+            # OCR deferred to the parent process, which fills ocr_text in by hash
+            image_element["image_hash"] = digest
+        image_elements.append(image_element)
+
+    # 依垂直位置 (top) 排序所有元素
+    all_elements = sorted(text_elements + image_elements, key=lambda x: x["top"])
+
+    # 移除 'top' 鍵，因為資料庫不需要它
+    structured_elements_for_this_page = []
+    for el in all_elements:
+        el.pop("top") # 刪除 'top'
+        structured_elements_for_this_page.append(el)
+
+    # 建立新的 Page 物件
+    return Page(
+        page_number=page_num + 1,
+        structured_elements=structured_elements_for_this_page
+    )
+
+
+def _extract_page_range(source: str, start: int, end: int) -> Tuple[List[Page], Dict[str, bytes], int]:
+    """
+    Worker entry point: opens the PDF itself and extracts pages [start, end).
+    OCR is left to the parent; returns the pages, the shard's distinct images
+    (hash -> bytes) and the number of images seen.
+    """
+    image_processor = ImageProcessor(defer_ocr=True)
+    with pdfplumber.open(source) as pdf:
+        pages = [_extract_page(pdf.pages[i], i, image_processor) for i in range(start, end)]
+    return pages, image_processor.pending_ocr, image_processor.stats()["images_seen"]
+
+
+def _ocr_image(digest: str, image_bytes: bytes) -> Tuple[str, bool]:
+    """Worker entry point: OCRs one distinct image of the document."""
+    return ocr_with_cache(digest, image_bytes)
+
+
+def _shard_page_ranges(num_pages: int, num_workers: int) -> List[Tuple[int, int]]:
+    """Splits [0, num_pages) into contiguous ranges, a few per worker so slow pages balance out."""
+    shard_size = max(1, math.ceil(num_pages / (num_workers * 4)))
+    return [(start, min(start + shard_size, num_pages)) for start in range(0, num_pages, shard_size)]
+
 
 class PdfLoader(DocumentLoader):
     """A loader for PDF files that extracts text and converts images to a web-safe format."""
 
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or PDF_LOADER_WORKERS
+
     def load(self, source: str) -> Document:
         """Reads text and extracts/converts images from a PDF on a page-by-page basis."""
+        doc_pages = list(self.iter_pages(source))
+        return Document(source=source, pages=doc_pages, image_stats=self.image_stats)
 
-        doc_pages = []
-
+    def iter_pages(self, source: str) -> Iterator[Page]:
+        """Yields pages in order as they are extracted, so ingestion can start on early pages."""
         try:
             with pdfplumber.open(source) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-
-                    # 處理文字
-                    text_elements = []                    
-                    for block in page.extract_text_lines(keep_blank_chars=True):
-                        text_elements.append({
-                            "type": "text",
-                            "content": block["text"],
-                            "top": block["top"] # 儲存垂直位置
-                        })
-                    
-                    # 處理圖片
-                    image_elements = []
-                    for img in page.images:
-                        image_data = img.get("stream").get_data() 
-                        
-                        if not image_data:
-                            continue
-
-                        base64_string = image_to_base64_uri(image_data) # 轉 Base64
-                        ocr_text_result = ocr_image_to_text(image_data) # OCR提取圖片文字
-
-                        image_elements.append({
-                            "type": "image",
-                            "base64": base64_string,
-                            "ocr_text": ocr_text_result,
-                            "top": img["top"] # 儲存垂直位置
-                        })
-
-                    # 依垂直位置 (top) 排序所有元素
-                    all_elements = sorted(text_elements + image_elements, key=lambda x: x["top"])
-
-                    # 移除 'top' 鍵，因為資料庫不需要它
-                    structured_elements_for_this_page = []
-                    for el in all_elements:
-                        el.pop("top") # 刪除 'top'
-                        structured_elements_for_this_page.append(el)
-
-                    # 建立新的 Page 物件
-                    new_page_object = Page(
-                        page_number=page_num + 1,
-                        structured_elements=structured_elements_for_this_page
-                    )
-                    doc_pages.append(new_page_object)
-                    
-                print(f"Successfully read {len(doc_pages)} pages from {source}")
-                return Document(source=source, pages=doc_pages)
+                num_pages = len(pdf.pages)
+                if self.max_workers <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+                    image_processor = ImageProcessor()
+                    for page_num, page in enumerate(pdf.pages):
+                        yield _extract_page(page, page_num, image_processor)
+                    self.image_stats = image_processor.stats()
+                    print(f"Successfully read {num_pages} pages from {source}")
+                    return
+
+            yield from self._iter_parallel(source, num_pages)
+            print(f"Successfully read {num_pages} pages from {source} using {self.max_workers} worker processes")
 
         except Exception as e:
             print(f"Error reading PDF with pdfplumber: {str(e)}")
             raise e
+
+    def _iter_parallel(self, source: str, num_pages: int) -> Iterator[Page]:
+        """
+        Shards page ranges across a process pool and yields pages in page order.
+        At most two shards per worker are in flight, so finished pages wait for
+        the consumer instead of piling up in memory.
+
+        Shards only extract. Each distinct image of the document is OCR'd once,
+        as its own task in the same pool, the first time a shard returns it;
+        later shards with the same image (a logo on every slide) reuse that
+        result instead of OCR'ing it again or racing on the persistent cache.
+        """
+        ranges = deque(_shard_page_ranges(num_pages, self.max_workers))
+        workers = min(self.max_workers, len(ranges))
+        ocr_futures = {} # image hash -> Future of (ocr_text, from_persistent_cache)
+        images_seen = 0
+        # 'spawn' avoids forking the threads of the API server process.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            in_flight = deque()
+            while ranges or in_flight:
+                while ranges and len(in_flight) < workers * 2:
+                    start, end = ranges.popleft()
+                    in_flight.append(executor.submit(_extract_page_range, source, start, end))
+                shard_pages, shard_images, shard_images_seen = in_flight.popleft().result()
+                images_seen += shard_images_seen
+                for digest, image_bytes in shard_images.items():
+                    if digest not in ocr_futures:
+                        ocr_futures[digest] = executor.submit(_ocr_image, digest, image_bytes)
+                for page in shard_pages:
+                    for element in page.structured_elements:
+                        digest = element.pop("image_hash", None)
+                        if digest is not None:
+                            element["ocr_text"] = ocr_futures[digest].result()[0]
+                yield from shard_pages
+
+        ocr_results = [future.result() for future in ocr_futures.values()]
+        persistent_hits = sum(1 for _, from_cache in ocr_results if from_cache)
+        self.image_stats = summarize_image_stats({
+            "images_seen": images_seen,
+            "unique_images": len(ocr_futures),
+            "ocr_runs": len(ocr_results) - persistent_hits,
+            "ocr_persistent_hits": persistent_hits,
+        })
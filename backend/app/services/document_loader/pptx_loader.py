@@ -1,8 +1,7 @@
 from . import Document, Page, ExtractedImage, DocumentLoader
 from pptx import Presentation
-from .image_utils import image_to_base64_uri
 from pptx.enum.shapes import MSO_SHAPE_TYPE
-from .ocr_utils import ocr_image_to_text
+from .image_processor import ImageProcessor
 
 class PptxLoader(DocumentLoader):
     """A loader for Microsoft PowerPoint (.pptx) files."""
@@ -12,6 +11,7 @@ class PptxLoader(DocumentLoader):
         try:
             prs = Presentation(source)
             doc_pages = []
+            image_processor = ImageProcessor()
 
             for i, slide in enumerate(prs.slides):
                 native_text_parts = []
@@ -25,8 +25,8 @@ class PptxLoader(DocumentLoader):
                         try:
                             image_bytes = shape.image.blob
                             
-                            ocr_text = ocr_image_to_text(image_bytes) or ""
-                            base64_image_uri = image_to_base64_uri(image_bytes)
+                            base64_image_uri, ocr_text = image_processor.process(image_bytes)
+                            ocr_text = ocr_text or ""
 
                             if base64_image_uri:
                                 page_images.append(ExtractedImage(image_uri=base64_image_uri, ocr_text=ocr_text))
@@ -41,7 +41,7 @@ class PptxLoader(DocumentLoader):
                 ))
             
             print(f"Successfully read {len(doc_pages)} slides from {source}")
-            return Document(source=source, pages=doc_pages)
+            return Document(source=source, pages=doc_pages, image_stats=image_processor.stats())
         except Exception as e:
             print(f"Error reading PPTX file: {str(e)}")
             raise e
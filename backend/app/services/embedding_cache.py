@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for text embeddings.
+
+Entries are keyed by (embedding model, SHA-256 of the normalized text), so the
+same chunk re-uploaded in another course, re-ingested with force_reprocess, or
+searched with the same prompt is only ever embedded once.
+
+Two tiers are consulted in order:
+1. An in-process LRU (EMBEDDING_CACHE_LRU_SIZE entries).
+2. The `embedding_cache` table in Postgres, shared by every API worker.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import List, Optional, Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_LRU_SIZE = int(os.getenv("EMBEDDING_CACHE_LRU_SIZE", "10000"))
+# 'postgres' persists entries in the embedding_cache table; 'none' keeps only the LRU tier.
+EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "postgres").lower()
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes text so trivially different copies (full-width forms, spacing) share a key."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest of the normalized text."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    A two-tier (LRU + Postgres) embedding cache with hit/miss counters.
+    """
+
+    def __init__(self, lru_size: int = EMBEDDING_CACHE_LRU_SIZE, backend: str = EMBEDDING_CACHE_BACKEND):
+        self._lru_size = lru_size
+        self._lru: "OrderedDict[tuple, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._backend = backend
+        self._engine = None
+        self._table = None
+        self._stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+    # --- Persistent Tier ---
+
+    def _get_table(self):
+        """Lazily binds the Postgres tier; returns None when it is disabled or unavailable."""
+        if self._backend != "postgres":
+            return None
+        if self._table is not None:
+            return self._table
+        database_url = os.getenv("DATABASE_URL")
+        if not database_url:
+            print("Warning: DATABASE_URL not set, embedding cache falls back to in-process LRU only.")
+            self._backend = "none"
+            return None
+
+        from sqlalchemy import MetaData, Table, Column, String, DateTime
+        from pgvector.sqlalchemy import Vector
+        from backend.app.utils.db_engine import get_engine
+
+        self._engine = get_engine()
+        self._table = Table(
+            'embedding_cache', MetaData(),
+            Column('model_name', String(100), primary_key=True),
+            Column('text_hash', String(64), primary_key=True),
+            Column('embedding', Vector()),
+            Column('created_at', DateTime(timezone=True)),
+        )
+        return self._table
+
+    def _db_get(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        table = self._get_table()
+        if table is None or not hashes:
+            return {}
+        from sqlalchemy import select
+        try:
+            with self._engine.connect() as conn:
+                rows = conn.execute(
+                    select(table.c.text_hash, table.c.embedding)
+                    .where(table.c.model_name == model)
+                    .where(table.c.text_hash.in_(hashes))
+                ).fetchall()
+            return {row.text_hash: [float(x) for x in row.embedding] for row in rows}
+        except Exception as e:
+            print(f"Warning: Embedding cache lookup failed, treating as miss: {e}")
+            return {}
+
+    def _db_put(self, model: str, entries: Dict[str, List[float]]):
+        table = self._get_table()
+        if table is None or not entries:
+            return
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        now = datetime.now(TAIPEI_TZ)
+        rows = [{"model_name": model, "text_hash": h, "embedding": v, "created_at": now} for h, v in entries.items()]
+        try:
+            with self._engine.begin() as conn:
+                conn.execute(pg_insert(table).on_conflict_do_nothing(index_elements=['model_name', 'text_hash']), rows)
+        except Exception as e:
+            print(f"Warning: Failed to persist {len(rows)} embeddings to cache: {e}")
+
+    # --- LRU Tier ---
+
+    def _count(self, **increments: int):
+        # get_many/put_many run concurrently from the embedding worker threads.
+        with self._lock:
+            for name, value in increments.items():
+                self._stats[name] += value
+
+    def _lru_get(self, key: tuple) -> Optional[List[float]]:
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+            return value
+
+    def _lru_put(self, key: tuple, value: List[float]):
+        if self._lru_size <= 0:
+            return
+        with self._lock:
+            self._lru[key] = value
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    # --- Public API ---
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Looks up embeddings for `texts`, returning a list aligned with the input
+        where cache misses are None.
+        """
+        hashes = [text_hash(t) for t in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing_hashes = set()
+        lru_hits = db_hits = misses = 0
+        for i, h in enumerate(hashes):
+            cached = self._lru_get((model, h))
+            if cached is not None:
+                results[i] = cached
+                lru_hits += 1
+            else:
+                missing_hashes.add(h)
+
+        found = self._db_get(model, sorted(missing_hashes))
+        for h, vector in found.items():
+            self._lru_put((model, h), vector)
+
+        for i, h in enumerate(hashes):
+            if results[i] is not None:
+                continue
+            if h in found:
+                results[i] = found[h]
+                db_hits += 1
+            else:
+                misses += 1
+        self._count(lru_hits=lru_hits, db_hits=db_hits, misses=misses)
+        return results
+
+    def put_many(self, model: str, texts: List[str], embeddings: List[List[float]]):
+        """Stores freshly generated embeddings in both tiers."""
+        entries = {}
+        for t, vector in zip(texts, embeddings):
+            h = text_hash(t)
+            self._lru_put((model, h), vector)
+            entries[h] = vector
+        self._count(writes=len(entries))
+        self._db_put(model, entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns cumulative hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._stats)
+            lru_size = len(self._lru)
+        hits = counters["lru_hits"] + counters["db_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hits": hits,
+            "lru_size": lru_size,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Empties the in-process tier and resets counters (the Postgres tier is left intact)."""
+        with self._lock:
+            self._lru.clear()
+            self._stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "writes": 0}
+
+
+# Singleton instance for easy access
+embedding_cache = EmbeddingCache()
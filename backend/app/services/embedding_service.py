@@ -1,12 +1,66 @@
-
 from typing import List, Tuple, Dict
 import os
-from openai import OpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import tiktoken
+from openai import OpenAI, APIConnectionError, APIStatusError, RateLimitError
 from dotenv import load_dotenv
 
+from .embedding_cache import embedding_cache, text_hash, EMBEDDING_CACHE_ENABLED
+
 # Load environment variables
 load_dotenv()
 
+# --- Batching Configuration ---
+# Upper bounds for a single embeddings.create request. The provider rejects requests
+# above ~300k tokens or 2048 inputs, so the defaults stay well below both.
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "512"))
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    True for failures that may succeed on a later attempt: rate limits,
+    timeouts, connection errors and 5xx responses. Authentication, bad-request
+    and context-length errors fail the same way every time.
+    """
+    # APITimeoutError is a subclass of APIConnectionError.
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def pack_batches(token_counts: List[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """
+    Greedily packs inputs (in their original order) into batches that respect
+    both a token budget and an item budget.
+
+    Args:
+        token_counts: The token count of each input, in input order.
+        max_tokens: The maximum total tokens allowed in a single batch.
+        max_items: The maximum number of inputs allowed in a single batch.
+
+    Returns:
+        A list of batches, each a list of indices into the original input.
+        An input larger than max_tokens is placed in a batch of its own.
+    """
+    batches = []
+    current_batch = []
+    current_tokens = 0
+    for index, count in enumerate(token_counts):
+        if current_batch and (current_tokens + count > max_tokens or len(current_batch) >= max_items):
+            batches.append(current_batch)
+            current_batch = []
+            current_tokens = 0
+        current_batch.append(index)
+        current_tokens += count
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+
 class EmbeddingService:
     """
     A service for generating text embeddings using OpenAI's API.
@@ -14,27 +68,71 @@ class EmbeddingService:
     _instance = None
     _client = None
     _model_name = None
+    _encoding = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(EmbeddingService, cls).__new__(cls)
-            
+
             # Initialize OpenAI client only once
             api_key = os.getenv("OPENAI_API_KEY")
             base_url = os.getenv("OPENAI_BASE_URL") # Optional, for custom endpoints
-            
+
             if not api_key:
                 raise ValueError("OPENAI_API_KEY environment variable not set for EmbeddingService.")
-            
+
             cls._client = OpenAI(api_key=api_key, base_url=base_url)
             cls._model_name = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-            
+
             print(f"OpenAI EmbeddingService initialized with model: {cls._model_name}")
         return cls._instance
 
+    def count_tokens(self, text: str) -> int:
+        """Returns the number of tokens the embedding model will see for a text."""
+        if self._encoding is None:
+            # Loaded lazily: tiktoken fetches its BPE files on first use.
+            try:
+                EmbeddingService._encoding = tiktoken.encoding_for_model(self._model_name)
+            except KeyError:
+                # Custom endpoints may serve models tiktoken does not know about
+                EmbeddingService._encoding = tiktoken.get_encoding("cl100k_base")
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def _embed_with_cache(self, texts: List[str], fetch) -> Tuple[List[List[float]], Dict[str, int]]:
+        """
+        Serves `texts` from the embedding cache and calls `fetch` only for the
+        distinct texts that miss. Fresh results are written back to the cache.
+        """
+        if not EMBEDDING_CACHE_ENABLED:
+            embeddings, usage = fetch(texts)
+            return embeddings, {**usage, "cache_hits": 0, "cache_misses": len(texts)}
+
+        embeddings = embedding_cache.get_many(self._model_name, texts)
+
+        # Identical chunks inside one request are only sent once.
+        miss_positions: Dict[str, List[int]] = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                miss_positions.setdefault(text_hash(texts[i]), []).append(i)
+
+        num_hits = len(texts) - sum(len(positions) for positions in miss_positions.values())
+        usage = {"total_tokens": 0, "prompt_tokens": 0, "num_batches": 0}
+        if miss_positions:
+            miss_texts = [texts[positions[0]] for positions in miss_positions.values()]
+            fresh_embeddings, usage = fetch(miss_texts)
+            for positions, embedding in zip(miss_positions.values(), fresh_embeddings):
+                for i in positions:
+                    embeddings[i] = embedding
+            embedding_cache.put_many(self._model_name, miss_texts, fresh_embeddings)
+        else:
+            print(f"All {len(texts)} embeddings served from cache.")
+
+        return embeddings, {**usage, "cache_hits": num_hits, "cache_misses": len(texts) - num_hits}
+
     def create_embeddings(self, texts: List[str]) -> Tuple[List[List[float]], Dict[str, int]]:
         """
         Generates embeddings for a list of texts using OpenAI's API.
+        Texts already present in the embedding cache are not sent to the provider.
 
         Args:
             texts: A list of strings to be embedded.
@@ -42,13 +140,16 @@ class EmbeddingService:
         Returns:
             A tuple containing:
             - A list of embedding vectors (each as a list of floats).
-            - A dictionary with token usage details.
+            - A dictionary with token usage details and cache hit/miss counts.
         """
         if not texts:
             return [], {"total_tokens": 0, "prompt_tokens": 0}
-        
+        return self._embed_with_cache(texts, self._request_embeddings)
+
+    def _request_embeddings(self, texts: List[str]) -> Tuple[List[List[float]], Dict[str, int]]:
+        """Sends all texts to the provider in a single request."""
         print(f"Generating embeddings for {len(texts)} text chunks using OpenAI model: {self._model_name}...")
-        
+
         try:
             response = self._client.embeddings.create(
                 input=texts,
@@ -65,6 +166,104 @@ class EmbeddingService:
             print(f"Error generating embeddings with OpenAI: {e}")
             raise
 
+    def _embed_batch_with_retry(self, batch_texts: List[str], max_retries: int) -> Tuple[List[List[float]], Dict[str, int]]:
+        """Sends one batch, retrying only this batch with exponential backoff on transient failures."""
+        attempt = 0
+        while True:
+            try:
+                response = self._client.embeddings.create(input=batch_texts, model=self._model_name)
+                # The API returns items with an explicit index; sort to be safe.
+                embeddings = [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
+                usage = {
+                    "total_tokens": response.usage.total_tokens,
+                    "prompt_tokens": response.usage.prompt_tokens,
+                }
+                return embeddings, usage
+            except Exception as e:
+                attempt += 1
+                if attempt > max_retries or not is_retryable_error(e):
+                    raise
+                backoff_seconds = 2 ** (attempt - 1)
+                print(f"Warning: Embedding batch of {len(batch_texts)} failed (attempt {attempt}/{max_retries}): {e}. Retrying in {backoff_seconds}s...")
+                time.sleep(backoff_seconds)
+
+    def create_embeddings_batched(
+        self,
+        texts: List[str],
+        max_tokens_per_batch: int = None,
+        max_items_per_batch: int = None,
+        max_workers: int = None,
+        max_retries: int = None
+    ) -> Tuple[List[List[float]], Dict[str, int]]:
+        """
+        Generates embeddings for a large list of texts by packing them into
+        token-bounded requests and sending those requests concurrently.
+
+        Args:
+            texts: A list of strings to be embedded.
+            max_tokens_per_batch: Token budget per request. Defaults to EMBEDDING_BATCH_MAX_TOKENS.
+            max_items_per_batch: Input count budget per request. Defaults to EMBEDDING_BATCH_MAX_ITEMS.
+            max_workers: Maximum number of requests in flight. Defaults to EMBEDDING_MAX_WORKERS.
+            max_retries: Retries per failed batch. Defaults to EMBEDDING_MAX_RETRIES.
+
+        Returns:
+            A tuple containing:
+            - A list of embedding vectors, in the same order as `texts`.
+            - A dictionary with token usage summed across all batches, the batch count
+              and cache hit/miss counts.
+        """
+        if not texts:
+            return [], {"total_tokens": 0, "prompt_tokens": 0, "num_batches": 0}
+
+        return self._embed_with_cache(
+            texts,
+            lambda miss_texts: self._request_embeddings_batched(miss_texts, max_tokens_per_batch, max_items_per_batch, max_workers, max_retries)
+        )
+
+    def _request_embeddings_batched(
+        self,
+        texts: List[str],
+        max_tokens_per_batch: int = None,
+        max_items_per_batch: int = None,
+        max_workers: int = None,
+        max_retries: int = None
+    ) -> Tuple[List[List[float]], Dict[str, int]]:
+        """Packs texts into token-bounded batches and sends them through a bounded thread pool."""
+        max_tokens_per_batch = max_tokens_per_batch or EMBEDDING_BATCH_MAX_TOKENS
+        max_items_per_batch = max_items_per_batch or EMBEDDING_BATCH_MAX_ITEMS
+        max_workers = max_workers or EMBEDDING_MAX_WORKERS
+        max_retries = EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+
+        token_counts = [self.count_tokens(text) for text in texts]
+        batches = pack_batches(token_counts, max_tokens_per_batch, max_items_per_batch)
+
+        print(f"Generating embeddings for {len(texts)} text chunks ({sum(token_counts)} tokens) in {len(batches)} batches "
+              f"with up to {max_workers} workers using OpenAI model: {self._model_name}...")
+
+        embeddings: List[List[float]] = [None] * len(texts)
+        usage = {"total_tokens": 0, "prompt_tokens": 0, "num_batches": len(batches)}
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            futures = {
+                executor.submit(self._embed_batch_with_retry, [texts[i] for i in batch], max_retries): batch
+                for batch in batches
+            }
+            try:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    batch_embeddings, batch_usage = future.result()
+                    for index, embedding in zip(batch, batch_embeddings):
+                        embeddings[index] = embedding
+                    usage["total_tokens"] += batch_usage["total_tokens"]
+                    usage["prompt_tokens"] += batch_usage["prompt_tokens"]
+            except Exception as e:
+                for pending in futures:
+                    pending.cancel()
+                print(f"Error generating batched embeddings with OpenAI: {e}")
+                raise
+
+        print(f"Batched embeddings generated successfully. Token usage: {usage}")
+        return embeddings, usage
+
 # Singleton instance for easy access
 embedding_service = EmbeddingService()
-
@@ -0,0 +1,35 @@
+"""
+SHA-256 digests of uploaded files, computed in fixed-size chunks.
+
+unique_contents.content_hash identifies a document by its bytes. Hashing in
+HASH_CHUNK_BYTES pieces keeps memory flat for any file size, and
+copy_and_hash computes the digest while the upload is being written to disk,
+so the duplicate check needs no second pass over the file.
+"""
+import hashlib
+import os
+from typing import BinaryIO, Tuple
+
+HASH_CHUNK_BYTES = int(os.getenv("HASH_CHUNK_BYTES", str(1024 * 1024)))
+
+
+def sha256_file(path: str, chunk_size: int = HASH_CHUNK_BYTES) -> Tuple[str, int]:
+    """Returns (hex digest, size in bytes) of a file on disk."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+
+def copy_and_hash(source: BinaryIO, destination: BinaryIO, chunk_size: int = HASH_CHUNK_BYTES) -> Tuple[str, int]:
+    """Copies `source` to `destination` chunk by chunk and returns (hex digest, bytes copied)."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := source.read(chunk_size):
+        digest.update(chunk)
+        destination.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
@@ -0,0 +1,118 @@
+"""
+Content-addressed storage for images extracted during ingestion.
+
+The loaders emit every image as a base64 PNG data URI. Before a page is saved
+to `document_content`, `offload_images` moves the binary into the
+`image_blobs` table (keyed by the SHA-256 of the image bytes) and leaves only
+a small reference in `structured_content`:
+
+    {"type": "image", "image_ref": "<sha256>", "mime_type": "image/png", "ocr_text": "..."}
+
+Identical images (logos, slide templates, re-uploads) are stored once, and
+queries over `document_content` no longer drag multi-MB JSON rows around.
+Readers call `resolve_image_uris` only for the images they actually use.
+"""
+import base64
+import hashlib
+import re
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Iterable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TAIPEI_TZ = timezone(timedelta(hours=8))
+
+_DATA_URI_RE = re.compile(r"^data:(?P<mime>[\w.+-]+/[\w.+-]+);base64,(?P<data>.*)$", re.DOTALL)
+
+_table = None
+
+
+def _get_table():
+    """Lazily defines the image_blobs table."""
+    global _table
+    if _table is None:
+        from sqlalchemy import MetaData, Table, Column, String, Integer, LargeBinary, DateTime
+        _table = Table(
+            'image_blobs', MetaData(),
+            Column('content_hash', String(64), primary_key=True),
+            Column('mime_type', String(100)),
+            Column('byte_size', Integer),
+            Column('data', LargeBinary),
+            Column('created_at', DateTime(timezone=True)),
+        )
+    return _table
+
+
+def decode_data_uri(data_uri: str):
+    """Splits a base64 data URI into (mime_type, raw bytes); returns None if it is not one."""
+    match = _DATA_URI_RE.match(data_uri or "")
+    if not match:
+        return None
+    try:
+        return match.group("mime"), base64.b64decode(match.group("data"))
+    except (ValueError, TypeError):
+        return None
+
+
+def offload_images(conn, elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Replaces inline base64 images in a page's structured elements with
+    references, writing each distinct image to image_blobs on `conn`.
+
+    Args:
+        conn: An open SQLAlchemy connection (the caller's ingestion transaction).
+        elements: The page's structured elements as produced by a loader.
+
+    Returns:
+        A new element list; non-image elements are passed through unchanged.
+    """
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+    table = _get_table()
+    result, blobs = [], {}
+    for element in elements or []:
+        decoded = decode_data_uri(element.get("base64")) if element.get("type") == "image" else None
+        if decoded is None:
+            result.append(element)
+            continue
+        mime_type, image_bytes = decoded
+        content_hash = hashlib.sha256(image_bytes).hexdigest()
+        blobs[content_hash] = {
+            "content_hash": content_hash, "mime_type": mime_type, "byte_size": len(image_bytes),
+            "data": image_bytes, "created_at": datetime.now(TAIPEI_TZ)
+        }
+        reference = {k: v for k, v in element.items() if k != "base64"}
+        reference.update({"image_ref": content_hash, "mime_type": mime_type})
+        result.append(reference)
+
+    if blobs:
+        conn.execute(pg_insert(table).on_conflict_do_nothing(index_elements=['content_hash']), list(blobs.values()))
+    return result
+
+
+def resolve_image_uris(content_hashes: Iterable[str]) -> Dict[str, str]:
+    """
+    Loads the referenced images in a single query and returns
+    {content_hash: data URI}. Unknown hashes are omitted.
+    """
+    hashes = sorted(set(h for h in content_hashes if h))
+    if not hashes:
+        return {}
+    from sqlalchemy import select
+    from backend.app.utils.db_engine import get_engine
+
+    table = _get_table()
+    try:
+        with get_engine().connect() as conn:
+            rows = conn.execute(
+                select(table.c.content_hash, table.c.mime_type, table.c.data).where(table.c.content_hash.in_(hashes))
+            ).fetchall()
+    except Exception as e:
+        print(f"Warning: Could not resolve {len(hashes)} image references: {e}")
+        return {}
+    return {
+        row.content_hash: f"data:{row.mime_type};base64,{base64.b64encode(row.data).decode('utf-8')}"
+        for row in rows
+    }
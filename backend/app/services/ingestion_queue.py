@@ -0,0 +1,318 @@
+"""
+Durable background queue for document ingestion.
+
+The API stages the upload under INGEST_UPLOAD_DIR, creates the ingestion job
+(orchestration_jobs) and an `ingestion_queue` row, and answers 202 at once.
+Worker processes claim rows with `SELECT ... FOR UPDATE SKIP LOCKED`, so any
+number of them can poll the same table without blocking each other, and run
+process_file under the job created at upload time. Its agent_tasks rows are
+what the status endpoint reports as per-stage progress.
+
+A claimed row carries a lease (INGEST_LEASE_SECONDS) that the worker renews
+every INGEST_HEARTBEAT_SECONDS while it processes the file, so long OCR jobs
+keep their lease. A row whose lease expires because its worker died is
+claimed again, up to INGEST_MAX_ATTEMPTS times. A worker that lost its lease
+does not record the outcome or delete the upload, since the row now belongs
+to another worker.
+
+Run the worker pool with:
+    python -m backend.app.services.ingestion_queue --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from backend.app.utils import db_logger
+from backend.app.utils.db_engine import get_engine
+
+load_dotenv()
+
+INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "cookai_ingest"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_POLL_INTERVAL_SECONDS = float(os.getenv("INGEST_POLL_INTERVAL_SECONDS", "1.0"))
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "3600"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_HEARTBEAT_SECONDS = float(os.getenv("INGEST_HEARTBEAT_SECONDS", str(max(1, INGEST_LEASE_SECONDS // 4))))
+
+engine = get_engine()
+
+_ENQUEUE_SQL = text("""
+    INSERT INTO ingestion_queue (job_id, file_path, file_name, uploader_id, course_id, course_unit_id, force_reprocess, chunking_strategy, content_hash, status, unique_content_id)
+    VALUES (:job_id, :file_path, :file_name, :uploader_id, :course_id, :course_unit_id, :force_reprocess, :chunking_strategy, :content_hash, :status, :unique_content_id)
+    RETURNING id
+""")
+
+# Oldest claimable row: queued, or running with an expired lease and attempts left.
+_CLAIM_SQL = text("""
+    UPDATE ingestion_queue
+    SET status = 'running', attempts = attempts + 1, locked_by = :worker_id, locked_at = now(), updated_at = now()
+    WHERE id = (
+        SELECT id FROM ingestion_queue
+        WHERE status = 'queued'
+           OR (status = 'running' AND locked_at < now() - make_interval(secs => :lease_seconds) AND attempts < :max_attempts)
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, job_id, file_path, file_name, uploader_id, course_id, course_unit_id, force_reprocess, chunking_strategy, content_hash, attempts, locked_by
+""")
+
+# Expired rows that have used up their attempts are failed instead of claimed again.
+_EXPIRE_SQL = text("""
+    UPDATE ingestion_queue
+    SET status = 'failed', error_message = 'Worker lease expired after the maximum number of attempts.', updated_at = now()
+    WHERE status = 'running' AND locked_at < now() - make_interval(secs => :lease_seconds) AND attempts >= :max_attempts
+    RETURNING job_id, file_path
+""")
+
+# Both only touch the row while this worker still holds its lease.
+_HEARTBEAT_SQL = text("""
+    UPDATE ingestion_queue
+    SET locked_at = now(), updated_at = now()
+    WHERE id = :id AND status = 'running' AND locked_by = :worker_id
+    RETURNING id
+""")
+
+_FINISH_SQL = text("""
+    UPDATE ingestion_queue
+    SET status = :status, unique_content_id = :unique_content_id, error_message = :error_message, updated_at = now()
+    WHERE id = :id AND status = 'running' AND locked_by = :worker_id
+    RETURNING id
+""")
+
+_QUEUE_ROW_SQL = text("""
+    SELECT q.status AS queue_status, q.file_name, q.attempts, q.unique_content_id, q.error_message,
+           q.created_at, q.updated_at, j.status AS job_status
+    FROM ingestion_queue q
+    JOIN orchestration_jobs j ON j.id = q.job_id
+    WHERE q.job_id = :job_id
+""")
+
+_JOB_TASKS_SQL = text("""
+    SELECT agent_name, status, duration_ms, error_message
+    FROM agent_tasks
+    WHERE job_id = :job_id
+    ORDER BY id
+""")
+
+
+def stage_upload_path(file_name: str) -> str:
+    """A fresh path for an upload; the file keeps its name so process_file sees it."""
+    directory = os.path.join(INGEST_UPLOAD_DIR, uuid.uuid4().hex)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, os.path.basename(file_name))
+
+
+def _discard_upload(file_path: str):
+    shutil.rmtree(os.path.dirname(file_path), ignore_errors=True)
+
+
+def _insert(conn, job_id: int, file_path: str, uploader_id: int, course_id: int, course_unit_id: int, force_reprocess: bool,
+            chunking_strategy: str, content_hash: str, status: str, unique_content_id: int = None) -> int:
+    return conn.execute(_ENQUEUE_SQL, {
+        "job_id": job_id, "file_path": file_path, "file_name": os.path.basename(file_path),
+        "uploader_id": uploader_id, "course_id": course_id, "course_unit_id": course_unit_id,
+        "force_reprocess": force_reprocess, "chunking_strategy": chunking_strategy,
+        "content_hash": content_hash, "status": status, "unique_content_id": unique_content_id,
+    }).scalar_one()
+
+
+def enqueue(job_id: int, file_path: str, uploader_id: int, course_id: int, course_unit_id: int = None,
+            force_reprocess: bool = False, chunking_strategy: str = None, content_hash: str = None) -> int:
+    """
+    Queues a staged upload for ingestion under an existing job and returns the
+    queue row id. content_hash is the digest computed while staging the upload.
+    """
+    with engine.begin() as conn:
+        queue_id = _insert(conn, job_id, file_path, uploader_id, course_id, course_unit_id, force_reprocess, chunking_strategy, content_hash, 'queued')
+    db_logger.update_job_status(job_id, 'queued')
+    return queue_id
+
+
+def record_duplicate(job_id: int, file_path: str, uploader_id: int, course_id: int, content_hash: str, unique_content_id: int,
+                     course_unit_id: int = None) -> int:
+    """Records an upload that was short-circuited as a duplicate, so polling its job works like any other."""
+    with engine.begin() as conn:
+        return _insert(conn, job_id, file_path, uploader_id, course_id, course_unit_id, False, None, content_hash, 'completed', unique_content_id)
+
+
+def claim_next(worker_id: str) -> Optional[Any]:
+    """Claims the oldest available row for this worker, or returns None when the queue is empty."""
+    params = {"worker_id": worker_id, "lease_seconds": INGEST_LEASE_SECONDS, "max_attempts": INGEST_MAX_ATTEMPTS}
+    with engine.begin() as conn:
+        expired = conn.execute(_EXPIRE_SQL, params).fetchall()
+        row = conn.execute(_CLAIM_SQL, params).fetchone()
+    for job in expired:
+        db_logger.update_job_status(job.job_id, 'failed', error_message="Ingestion worker stopped responding.")
+        _discard_upload(job.file_path)
+    return row
+
+
+def _finish(item: Any, status: str, unique_content_id: int = None, error_message: str = None) -> bool:
+    """Records the outcome; False when the lease was lost and another worker owns the row."""
+    with engine.begin() as conn:
+        row = conn.execute(_FINISH_SQL, {
+            "id": item.id, "worker_id": item.locked_by, "status": status,
+            "unique_content_id": unique_content_id, "error_message": error_message,
+        }).fetchone()
+    return row is not None
+
+
+class _LeaseHeartbeat:
+    """Renews a claimed row's lease from a background thread until stopped."""
+
+    def __init__(self, item: Any, interval: float = INGEST_HEARTBEAT_SECONDS):
+        self._item = item
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{item.id}", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            try:
+                with engine.begin() as conn:
+                    renewed = conn.execute(_HEARTBEAT_SQL, {"id": self._item.id, "worker_id": self._item.locked_by}).fetchone()
+            except Exception as e:
+                # A transient DB error only delays the renewal; the lease is still valid until it expires.
+                print(f"[Ingestion Worker] Could not renew the lease of job {self._item.job_id}: {e}")
+                continue
+            if renewed is None:
+                print(f"[Ingestion Worker] Lost the lease of job {self._item.job_id}; another worker has claimed it.")
+                return
+
+    def __enter__(self) -> "_LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._stopped.set()
+        self._thread.join()
+        return False
+
+
+def process_claimed(item: Any):
+    """Runs process_file for a claimed row, renewing its lease, and records the outcome on the queue row."""
+    from backend.app.agents.teacher_agent.ingestion import process_file
+
+    print(f"[Ingestion Worker] Processing job {item.job_id} ('{item.file_name}', attempt {item.attempts})")
+    db_logger.update_job_status(item.job_id, 'in_progress')
+    error_message = None
+    try:
+        with _LeaseHeartbeat(item):
+            unique_content_id = process_file(
+                file_path=item.file_path,
+                uploader_id=item.uploader_id,
+                course_id=item.course_id,
+                course_unit_id=item.course_unit_id,
+                force_reprocess=item.force_reprocess,
+                chunking_strategy=item.chunking_strategy,
+                job_id=item.job_id,
+                content_hash=item.content_hash,
+            )
+    except Exception as e:
+        unique_content_id = None
+        error_message = str(e)
+        db_logger.update_job_status(item.job_id, 'failed', error_message=error_message)
+
+    if unique_content_id is None:
+        # process_file has already marked the job failed with the reason.
+        owned = _finish(item, 'failed', error_message=error_message or "Ingestion failed; see the job's agent_tasks.")
+    else:
+        owned = _finish(item, 'completed', unique_content_id=unique_content_id)
+    if owned:
+        _discard_upload(item.file_path)
+    else:
+        print(f"[Ingestion Worker] Job {item.job_id} was claimed by another worker; leaving its outcome and upload to that worker.")
+
+
+def run_worker(worker_index: int = 0):
+    """Polls the queue forever, processing one file at a time."""
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    print(f"[Ingestion Worker] {worker_id} started.")
+    while True:
+        try:
+            item = claim_next(worker_id)
+        except Exception as e:
+            print(f"[Ingestion Worker] {worker_id} could not poll the queue: {e}")
+            item = None
+        if item is None:
+            time.sleep(INGEST_POLL_INTERVAL_SECONDS)
+            continue
+        process_claimed(item)
+
+
+def get_ingestion_status(job_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Returns the queue state of an ingestion job and its per-stage progress,
+    or None when the job was not queued through this module.
+    """
+    from backend.app.agents.teacher_agent.ingestion import INGESTION_STAGES
+
+    db_logger.flush_task_logs()
+    with engine.connect() as conn:
+        row = conn.execute(_QUEUE_ROW_SQL, {"job_id": job_id}).fetchone()
+        if row is None:
+            return None
+        tasks = conn.execute(_JOB_TASKS_SQL, {"job_id": job_id}).fetchall()
+
+    stages = [
+        {"stage": task.agent_name, "status": task.status, "duration_ms": task.duration_ms, "error_message": task.error_message}
+        for task in tasks
+    ]
+    completed = {stage["stage"] for stage in stages if stage["status"] == 'completed'}
+    if row.queue_status == 'completed':
+        # Duplicate uploads finish after the first two stages.
+        progress = 1.0
+    else:
+        progress = round(sum(stage in completed for stage in INGESTION_STAGES) / len(INGESTION_STAGES), 2)
+
+    return {
+        "job_id": job_id,
+        "status": row.queue_status,
+        "job_status": row.job_status,
+        "file_name": row.file_name,
+        "attempts": row.attempts,
+        "unique_content_id": row.unique_content_id,
+        "error_message": row.error_message,
+        "progress": progress,
+        "stages": stages,
+        "created_at": row.created_at,
+        "updated_at": row.updated_at,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the ingestion worker pool.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        run_worker()
+        return
+
+    # Spawned workers build their own engine and connection pool.
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_worker, args=(i,)) for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    print(f"[Ingestion Worker] Started {len(processes)} worker processes.")
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
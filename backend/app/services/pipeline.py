@@ -0,0 +1,114 @@
+"""
+A minimal thread pipeline: stages connected by bounded channels.
+
+Each stage runs in its own thread, reading from upstream channels and writing
+to its output channel; a full channel blocks the producer, so the number of
+items in flight (and the memory they hold) is bounded by the channel sizes.
+A failing stage cancels the whole pipeline: blocked producers and consumers
+wake up, every thread exits, and `Pipeline.__exit__` re-raises the first error.
+
+    with Pipeline() as pipeline:
+        pages = pipeline.channel(8)
+        pipeline.stage("load", load_pages, output=pages)
+        for page in pages:
+            ...
+"""
+import queue
+import threading
+from typing import Any, Callable, Iterator, List, Optional
+
+_CLOSED = object()
+_POLL_SECONDS = 0.1
+
+
+class PipelineCancelled(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+class Channel:
+    """A bounded FIFO between two stages. Iterating it yields items until it is closed."""
+
+    def __init__(self, maxsize: int, cancelled: threading.Event):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._cancelled = cancelled
+
+    def put(self, item: Any):
+        """Blocks while the channel is full; raises PipelineCancelled if the pipeline is cancelled."""
+        while True:
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                self._queue.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def close(self):
+        """Signals the consumer that no more items will come."""
+        try:
+            self.put(_CLOSED)
+        except PipelineCancelled:
+            pass
+
+    def __iter__(self) -> Iterator[Any]:
+        while True:
+            if self._cancelled.is_set():
+                raise PipelineCancelled()
+            try:
+                item = self._queue.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _CLOSED:
+                return
+            yield item
+
+
+class Pipeline:
+    """Owns the threads and channels of one pipeline run."""
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._errors: List[BaseException] = []
+        self._lock = threading.Lock()
+
+    def channel(self, maxsize: int) -> Channel:
+        return Channel(maxsize, self.cancelled)
+
+    def stage(self, name: str, func: Callable[..., Any], *args: Any, output: Optional[Channel] = None):
+        """Starts `func(*args)` in a thread; `output` is closed when it returns or fails."""
+        def run():
+            try:
+                func(*args)
+            except PipelineCancelled:
+                pass
+            except BaseException as e:
+                self._fail(e)
+            finally:
+                if output is not None:
+                    output.close()
+
+        thread = threading.Thread(target=run, name=f"pipeline-{name}", daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _fail(self, error: BaseException):
+        with self._lock:
+            self._errors.append(error)
+        self.cancelled.set()
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc is not None and not isinstance(exc, PipelineCancelled):
+            # The consumer failed: stop the producers.
+            self._fail(exc)
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            first = self._errors[0]
+            if first is exc:
+                return False
+            raise first
+        return False
@@ -0,0 +1,66 @@
+"""
+Extraction of exact-match terms from a retrieval query.
+
+Cosine search is weak on literal tokens such as course codes ("CS101"),
+English acronyms inside Chinese prompts ("PCA", "SVM"), formula or function
+names ("softmax", "F1-score") and explicitly quoted phrases. These are the
+terms the lexical leg of hybrid retrieval matches against chunk_text.
+Chinese prose itself is left to the vector leg: without word segmentation,
+substring matches on it are mostly noise ("幫我", "題目").
+"""
+import re
+from typing import List
+
+from .embedding_cache import normalize_text
+
+# ASCII tokens, allowing inner '-', '_', '.', '+', '#' (F1-score, p_value, C++, C#)
+_ASCII_TERM_RE = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_.+#-]*[A-Za-z0-9+#])?")
+# 「...」, 『...』, "..." and '...' quoted phrases, in any script
+_QUOTED_RE = re.compile(r"「([^」]+)」|『([^』]+)』|\"([^\"]+)\"|“([^”]+)”|'([^']+)'")
+
+# Words that appear in prompts but say nothing about the content.
+STOPWORDS = {
+    # Function words
+    "a", "about", "all", "also", "an", "and", "any", "are", "as", "at", "be", "based", "but", "by", "each",
+    "few", "for", "from", "how", "i", "in", "into", "is", "it", "its", "me", "more", "my", "of", "on",
+    "one", "only", "or", "our", "per", "some", "that", "the", "these", "this", "those", "to", "two", "three",
+    "us", "we", "what", "which", "with", "you", "your",
+    # Instructions
+    "can", "could", "create", "explain", "generate", "give", "help", "include", "list", "make", "need",
+    "please", "produce", "provide", "should", "summarize", "summary", "want", "would", "write",
+    # Exam and question types
+    "answer", "answers", "blank", "blanks", "choice", "choices", "difficulty", "easy", "essay", "exam",
+    "false", "fill", "hard", "item", "items", "level", "mcq", "medium", "multiple", "multiple_choice",
+    "option", "options", "question", "questions", "quiz", "short", "short_answer", "single", "test",
+    "true", "true_false", "type", "types",
+    # The material itself
+    "chapter", "content", "course", "document", "file", "lecture", "material", "materials", "notes",
+    "page", "pages", "section", "slide", "slides",
+}
+MIN_TERM_LENGTH = 2
+MAX_TERMS = 10
+
+
+def extract_lexical_terms(query: str) -> List[str]:
+    """
+    Returns the distinct exact-match terms of a query (quoted phrases first),
+    case-folded, capped at MAX_TERMS. Pure numbers are dropped ("出 5 題").
+    """
+    text = normalize_text(query)
+    terms: List[str] = []
+
+    def add(term: str):
+        term = term.strip().lower()
+        if len(term) >= MIN_TERM_LENGTH and term not in STOPWORDS and not term.isdigit() and term not in terms:
+            terms.append(term)
+
+    for match in _QUOTED_RE.finditer(text):
+        add(next(group for group in match.groups() if group))
+    for match in _ASCII_TERM_RE.finditer(_QUOTED_RE.sub(" ", text)):
+        add(match.group(0))
+    return terms[:MAX_TERMS]
+
+
+def to_ilike_patterns(terms: List[str]) -> List[str]:
+    """Wraps terms as '%term%' ILIKE patterns with LIKE wildcards escaped."""
+    return ["%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for term in terms]
@@ -0,0 +1,181 @@
+"""
+Semantic response cache for LLM calls whose answer depends only on the query.
+
+Entries are grouped by namespace (e.g. 'general_chat', 'router') and keyed by
+the embedding of the normalized query: a lookup is a hit when a live entry's
+cosine similarity reaches SEMANTIC_CACHE_THRESHOLD. An identical normalized
+query is matched without embedding at all; other queries are embedded through
+EmbeddingService, whose own cache makes repeated prompts free.
+
+Entries expire after SEMANTIC_CACHE_TTL_SECONDS and each namespace is capped
+at SEMANTIC_CACHE_MAX_ENTRIES, evicting the least recently used entry.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .embedding_cache import normalize_text
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+@dataclass
+class _Entry:
+    vector: Optional[np.ndarray]
+    value: Any
+    prompt_tokens: int
+    completion_tokens: int
+    expires_at: float
+
+
+@dataclass
+class CacheHit:
+    """A cached value and the LLM usage it saved."""
+    value: Any
+    similarity: float
+    saved_prompt_tokens: int
+    saved_completion_tokens: int
+
+    def as_log(self) -> dict:
+        """The 'semantic_cache' record stored in agent_tasks.output (read by get_job_cumulative_metrics)."""
+        return {
+            "hit": True,
+            "similarity": round(self.similarity, 4),
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+        }
+
+
+# The 'semantic_cache' record for a lookup that missed.
+CACHE_MISS_LOG = {"hit": False, "saved_prompt_tokens": 0, "saved_completion_tokens": 0}
+
+
+class SemanticCache:
+    """
+    An in-process, namespaced, TTL + LRU cache keyed by query embeddings.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, enabled: bool = SEMANTIC_CACHE_ENABLED,
+                 embed: Callable[[List[str]], List[List[float]]] = None, clock: Callable[[], float] = time.monotonic):
+        self._threshold = threshold
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._enabled = enabled
+        self._embed = embed
+        self._clock = clock
+        self._namespaces: Dict[str, "OrderedDict[str, _Entry]"] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _embed_query(self, text: str) -> np.ndarray:
+        if self._embed is None:
+            # Imported lazily: the service needs OPENAI_API_KEY at construction time.
+            from .embedding_service import embedding_service
+            self._embed = lambda batch: embedding_service.create_embeddings(batch)[0]
+        vector = np.asarray(self._embed([text])[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _live_entries(self, namespace: str) -> "OrderedDict[str, _Entry]":
+        """Returns the namespace's entries after dropping expired ones (caller holds the lock)."""
+        entries = self._namespaces.setdefault(namespace, OrderedDict())
+        now = self._clock()
+        for key in [key for key, entry in entries.items() if entry.expires_at <= now]:
+            del entries[key]
+        return entries
+
+    def _count(self, name: str):
+        # Router and chat lookups run concurrently from the graph's thread pool.
+        with self._lock:
+            self._stats[name] += 1
+
+    def _find(self, namespace: str, key: str, vector: Optional[np.ndarray]) -> Optional[CacheHit]:
+        with self._lock:
+            entries = self._live_entries(namespace)
+            best_key, best_similarity = None, -1.0
+            if key in entries:
+                best_key, best_similarity = key, 1.0
+            elif vector is not None:
+                candidates = [(k, e.vector) for k, e in entries.items() if e.vector is not None]
+                if candidates:
+                    similarities = np.stack([v for _, v in candidates]) @ vector
+                    best = int(np.argmax(similarities))
+                    best_key, best_similarity = candidates[best][0], float(similarities[best])
+            if best_key is None or best_similarity < self._threshold:
+                return None
+            entries.move_to_end(best_key)
+            entry = entries[best_key]
+            return CacheHit(entry.value, best_similarity, entry.prompt_tokens, entry.completion_tokens)
+
+    # --- Public API ---
+
+    def get(self, namespace: str, query: str) -> Optional[CacheHit]:
+        """
+        Returns the cached value for the closest live entry above the
+        similarity threshold, or None on a miss (or any embedding failure).
+        """
+        if not self._enabled or not query.strip():
+            return None
+        key = normalize_text(query)
+        hit = self._find(namespace, key, None)
+        if hit is None and self._namespaces.get(namespace):
+            try:
+                hit = self._find(namespace, key, self._embed_query(key))
+            except Exception as e:
+                print(f"Warning: Semantic cache lookup failed, treating as miss: {e}")
+        self._count("hits" if hit else "misses")
+        return hit
+
+    def put(self, namespace: str, query: str, value: Any, prompt_tokens: int = 0, completion_tokens: int = 0):
+        """Stores a value with the LLM usage a future hit will save."""
+        if not self._enabled or not query.strip():
+            return
+        key = normalize_text(query)
+        try:
+            vector = self._embed_query(key)
+        except Exception as e:
+            # Still usable for exact repeats of the same query.
+            print(f"Warning: Could not embed query for the semantic cache: {e}")
+            vector = None
+        with self._lock:
+            entries = self._live_entries(namespace)
+            entries[key] = _Entry(vector, value, prompt_tokens or 0, completion_tokens or 0, self._clock() + self._ttl)
+            entries.move_to_end(key)
+            self._stats["writes"] += 1
+            while len(entries) > self._max_entries:
+                entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Returns cumulative hit/miss counters for this process."""
+        with self._lock:
+            counters = dict(self._stats)
+            entries = sum(len(namespace_entries) for namespace_entries in self._namespaces.values())
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            **counters,
+            "entries": entries,
+            "hit_rate": round(counters["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        """Drops every entry and resets counters."""
+        with self._lock:
+            self._namespaces.clear()
+            self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+
+# Singleton instance for easy access
+semantic_cache = SemanticCache()
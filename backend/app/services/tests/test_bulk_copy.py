@@ -0,0 +1,62 @@
+import json
+import struct
+
+from backend.app.services.bulk_copy import (
+    COPY_HEADER, COPY_TRAILER, encode_copy_binary, encode_int4, encode_json, encode_text, encode_vector
+)
+
+
+def _read_field(data: bytes, offset: int):
+    (length,) = struct.unpack_from(">i", data, offset)
+    offset += 4
+    if length == -1:
+        return None, offset
+    return data[offset:offset + length], offset + length
+
+
+def test_vector_uses_pgvector_binary_layout():
+    print("=== Testing vector encoding ===")
+    values = [0.5, -1.25, 3.0]
+    field, end = _read_field(encode_vector(values), 0)
+    dim, unused = struct.unpack_from(">hh", field, 0)
+    assert (dim, unused) == (3, 0)
+    assert list(struct.unpack_from(">3f", field, 4)) == values
+    assert end == 4 + 4 + 3 * 4
+    print("✅ int16 dim, int16 unused, big-endian float4 values")
+
+
+def test_copy_stream_round_trips_rows_and_nulls():
+    print("=== Testing binary COPY stream ===")
+    rows = [
+        [7, "第一段 chunk", {"page_numbers": [1, 2]}, [0.25, 0.5]],
+        [7, "second", {"page_numbers": [2]}, None],
+    ]
+    encoders = [encode_int4, encode_text, encode_json, encode_vector]
+    data = encode_copy_binary(rows, encoders)
+
+    assert data.startswith(COPY_HEADER) and data.endswith(COPY_TRAILER)
+    offset = len(COPY_HEADER)
+    decoded = []
+    for _ in rows:
+        (field_count,) = struct.unpack_from(">h", data, offset)
+        assert field_count == 4
+        offset += 2
+        fields = []
+        for _ in range(field_count):
+            field, offset = _read_field(data, offset)
+            fields.append(field)
+        decoded.append(fields)
+    assert offset == len(data) - len(COPY_TRAILER)
+
+    first, second = decoded
+    assert struct.unpack(">i", first[0])[0] == 7
+    assert first[1].decode("utf-8") == "第一段 chunk"
+    assert json.loads(first[2]) == {"page_numbers": [1, 2]}
+    assert list(struct.unpack_from(">2f", first[3], 4)) == [0.25, 0.5]
+    assert second[3] is None
+    print("✅ 2 rows decoded, NULL embedding preserved")
+
+
+if __name__ == "__main__":
+    test_vector_uses_pgvector_binary_layout()
+    test_copy_stream_round_trips_rows_and_nulls()
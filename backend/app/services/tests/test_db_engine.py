@@ -0,0 +1,30 @@
+import threading
+
+from sqlalchemy import text
+
+from backend.app.utils.db_engine import get_engine, get_pool_metrics
+
+
+def test_engine_is_shared_and_pool_metrics_are_recorded(monkeypatch, tmp_path):
+    print("=== Testing shared engine factory ===")
+    monkeypatch.setenv("TEST_POOL_DATABASE_URL", f"sqlite:///{tmp_path / 'pool.db'}")
+    engine = get_engine("TEST_POOL_DATABASE_URL")
+    assert get_engine("TEST_POOL_DATABASE_URL") is engine
+
+    def worker():
+        for _ in range(10):
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    metrics = get_pool_metrics()[engine.url.render_as_string(hide_password=True)]
+    assert metrics["checkouts"] == metrics["checkins"] == 40
+    assert 1 <= metrics["connects"] <= 4
+    assert metrics["checked_out"] == 0 and metrics["timeouts"] == 0
+    engine.dispose()
+    print(f"✅ {metrics}")
@@ -0,0 +1,113 @@
+import os
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend.app.services import embedding_service as embedding_module
+from backend.app.services.embedding_service import pack_batches, embedding_service
+from backend.app.services.embedding_cache import embedding_cache
+
+
+class _FakeEncoding:
+    """One token per whitespace-separated word."""
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def _status_error(error_class, status_code):
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    return error_class("error", response=httpx.Response(status_code, request=request), body=None)
+
+
+class _FakeEmbeddings:
+    def __init__(self, first_call_error=None):
+        self.calls = []
+        self.first_call_error = first_call_error
+
+    def create(self, input, model):
+        self.calls.append(list(input))
+        if self.first_call_error is not None and len(self.calls) == 1:
+            raise self.first_call_error
+        # Return items out of order to make sure the service re-sorts by index.
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+        tokens = sum(len(text.split()) for text in input)
+        return SimpleNamespace(data=list(reversed(data)), usage=SimpleNamespace(total_tokens=tokens, prompt_tokens=tokens))
+
+
+def _install_fake_client(fake_embeddings):
+    embedding_module.EmbeddingService._client = SimpleNamespace(embeddings=fake_embeddings)
+    embedding_module.EmbeddingService._encoding = _FakeEncoding()
+    embedding_cache.clear()
+
+
+def test_pack_batches_respects_token_and_item_budgets():
+    print("=== Testing pack_batches ===")
+    assert pack_batches([], max_tokens=10, max_items=2) == []
+    assert pack_batches([4, 4, 4], max_tokens=10, max_items=10) == [[0, 1], [2]]
+    assert pack_batches([1, 1, 1, 1, 1], max_tokens=100, max_items=2) == [[0, 1], [2, 3], [4]]
+    # An oversized input gets a batch of its own instead of being dropped.
+    assert pack_batches([3, 50, 3], max_tokens=10, max_items=10) == [[0], [1], [2]]
+    print("✅ pack_batches OK")
+
+
+def test_batched_embeddings_preserve_input_order_and_merge_usage():
+    print("=== Testing create_embeddings_batched ordering ===")
+    fake = _FakeEmbeddings()
+    _install_fake_client(fake)
+
+    texts = ["a", "b b", "c c c", "d d d d", "e e e e e"]
+    embeddings, usage = embedding_service.create_embeddings_batched(texts, max_tokens_per_batch=5, max_items_per_batch=10, max_workers=3)
+
+    assert embeddings == [[float(len(t))] for t in texts]
+    assert usage["prompt_tokens"] == 15
+    assert usage["num_batches"] == len(fake.calls) == 4
+    print(f"✅ {usage['num_batches']} batches reassembled in input order")
+
+
+def test_batched_embeddings_retry_failed_batch_only():
+    print("=== Testing create_embeddings_batched retry ===")
+    fake = _FakeEmbeddings(first_call_error=_status_error(openai.RateLimitError, 429))
+    _install_fake_client(fake)
+
+    embeddings, usage = embedding_service.create_embeddings_batched(["x", "y"], max_items_per_batch=1, max_workers=1, max_retries=1)
+
+    assert embeddings == [[1.0], [1.0]]
+    assert len(fake.calls) == 3  # one failure + one retry + the other batch
+    print("✅ failed batch retried independently")
+
+
+def test_batched_embeddings_do_not_retry_permanent_errors():
+    print("=== Testing create_embeddings_batched permanent errors ===")
+    for error in (_status_error(openai.AuthenticationError, 401), _status_error(openai.BadRequestError, 400)):
+        fake = _FakeEmbeddings(first_call_error=error)
+        _install_fake_client(fake)
+        try:
+            embedding_service.create_embeddings_batched(["x"], max_retries=3)
+            assert False, "expected the error to propagate"
+        except type(error):
+            pass
+        assert len(fake.calls) == 1
+    print("✅ auth and bad-request errors raised without retrying")
+
+
+def test_retryable_errors():
+    print("=== Testing is_retryable_error ===")
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+    assert embedding_module.is_retryable_error(_status_error(openai.RateLimitError, 429))
+    assert embedding_module.is_retryable_error(_status_error(openai.InternalServerError, 503))
+    assert embedding_module.is_retryable_error(openai.APITimeoutError(request=request))
+    assert embedding_module.is_retryable_error(openai.APIConnectionError(request=request))
+    assert not embedding_module.is_retryable_error(_status_error(openai.BadRequestError, 400))
+    assert not embedding_module.is_retryable_error(ValueError("bad input"))
+    print("✅ only transient errors are retryable")
+
+
+if __name__ == "__main__":
+    test_pack_batches_respects_token_and_item_budgets()
+    test_batched_embeddings_preserve_input_order_and_merge_usage()
+    test_batched_embeddings_retry_failed_batch_only()
+    test_batched_embeddings_do_not_retry_permanent_errors()
+    test_retryable_errors()
@@ -0,0 +1,69 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from backend.app.services.embedding_cache import EmbeddingCache, text_hash, embedding_cache
+from backend.app.services.embedding_service import embedding_service
+from backend.app.services.tests.test_embedding_batching import _FakeEmbeddings, _install_fake_client
+
+
+def test_text_hash_normalizes_whitespace_and_width():
+    print("=== Testing text_hash normalization ===")
+    assert text_hash("機器學習  概論\n") == text_hash("機器學習 概論")
+    assert text_hash("ＡＢＣ") == text_hash("ABC")  # full-width forms fold under NFKC
+    assert text_hash("ABC") != text_hash("abc")
+    print("✅ normalization OK")
+
+
+def test_lru_tier_evicts_least_recently_used():
+    print("=== Testing LRU tier ===")
+    cache = EmbeddingCache(lru_size=2, backend="none")
+    cache.put_many("m", ["a", "b"], [[1.0], [2.0]])
+    cache.get_many("m", ["a"])  # touch 'a' so 'b' becomes the eviction candidate
+    cache.put_many("m", ["c"], [[3.0]])
+
+    assert cache.get_many("m", ["a", "b", "c"]) == [[1.0], None, [3.0]]
+    assert cache.get_many("other-model", ["a"]) == [None]
+    stats = cache.stats()
+    assert stats["hits"] == 3 and stats["misses"] == 2
+    print(f"✅ LRU OK, stats={stats}")
+
+
+def test_stats_are_exact_under_concurrent_lookups():
+    print("=== Testing counters under concurrency ===")
+    cache = EmbeddingCache(lru_size=10, backend="none")
+    cache.put_many("m", ["hit"], [[1.0]])
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # force frequent thread switches
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: cache.get_many("m", ["hit", "miss"]), range(2000)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    stats = cache.stats()
+    assert stats["lru_hits"] == 2000 and stats["misses"] == 2000
+    print(f"✅ no lost updates, stats={stats}")
+
+
+def test_create_embeddings_only_sends_cache_misses():
+    print("=== Testing create_embeddings with cache ===")
+    fake = _FakeEmbeddings()
+    _install_fake_client(fake)
+
+    embedding_service.create_embeddings(["第一段", "第二段"])
+    embeddings, usage = embedding_service.create_embeddings(["第一段", "第三段", "第三段"])
+
+    assert fake.calls == [["第一段", "第二段"], ["第三段"]]
+    assert embeddings == [[3.0], [3.0], [3.0]]
+    assert usage["cache_hits"] == 1 and usage["cache_misses"] == 2
+    assert embedding_cache.stats()["hits"] == 1
+    print(f"✅ only misses sent to provider, usage={usage}")
+
+
+if __name__ == "__main__":
+    test_text_hash_normalizes_whitespace_and_width()
+    test_lru_tier_evicts_least_recently_used()
+    test_stats_are_exact_under_concurrent_lookups()
+    test_create_embeddings_only_sends_cache_misses()
@@ -0,0 +1,41 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from backend.app.services.file_hash import copy_and_hash, sha256_file
+
+
+def test_copy_and_hash_matches_hashlib_across_chunk_boundaries():
+    print("=== Testing streaming copy and hash ===")
+    data = os.urandom(10_000)
+    destination = io.BytesIO()
+    digest, size = copy_and_hash(io.BytesIO(data), destination, chunk_size=4096)
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert size == len(data)
+    assert destination.getvalue() == data
+    print(f"✅ {size} bytes copied in 4 KiB chunks, digest matches")
+
+
+def test_sha256_file_matches_copy_and_hash():
+    print("=== Testing file hash ===")
+    data = b"Cook.ai" * 1000
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "upload.pdf")
+        with open(path, "wb") as f:
+            streamed = copy_and_hash(io.BytesIO(data), f, chunk_size=1000)
+        assert sha256_file(path, chunk_size=333) == streamed
+    print("✅ on-disk hash matches the streamed hash")
+
+
+def test_empty_file():
+    print("=== Testing empty upload ===")
+    digest, size = copy_and_hash(io.BytesIO(b""), io.BytesIO())
+    assert (digest, size) == (hashlib.sha256(b"").hexdigest(), 0)
+    print("✅ empty upload hashed")
+
+
+if __name__ == "__main__":
+    test_copy_and_hash_matches_hashlib_across_chunk_boundaries()
+    test_sha256_file_matches_copy_and_hash()
+    test_empty_file()
@@ -0,0 +1,64 @@
+import tempfile
+
+from backend.app.services.document_loader import image_processor
+from backend.app.services.document_loader.image_processor import ImageProcessor
+
+
+def _install_fake_ocr(monkeypatch, cache_dir=None, fail=False):
+    """Replaces Tesseract with a counting fake and points the persistent cache at cache_dir (None disables it)."""
+    calls = []
+
+    def fake_ocr(image_bytes):
+        calls.append(image_bytes)
+        return "[OCR Error: boom]" if fail else f"text-{len(image_bytes)}"
+
+    monkeypatch.setattr(image_processor, "ocr_image_to_text", fake_ocr)
+    monkeypatch.setattr(image_processor, "image_to_base64_uri", lambda b: f"data:image/png;base64,{b.hex()}")
+    monkeypatch.setattr(image_processor, "_ocr_cache", None)
+    monkeypatch.setattr(image_processor, "OCR_CACHE_ENABLED", cache_dir is not None)
+    if cache_dir is not None:
+        monkeypatch.setattr(image_processor, "OCR_CACHE_DIR", cache_dir)
+    return calls
+
+
+def test_repeated_images_are_processed_once(monkeypatch):
+    print("=== Testing ImageProcessor per-document dedup ===")
+    calls = _install_fake_ocr(monkeypatch)
+    processor = ImageProcessor()
+    logo, chart = b"logo-bytes", b"chart-bytes-1"
+    results = [processor.process(img) for img in [logo, chart, logo, logo]]
+
+    assert len(calls) == 2
+    assert results[0] == results[2] == results[3]
+    stats = processor.stats()
+    assert stats["images_seen"] == 4 and stats["unique_images"] == 2
+    assert stats["dedup_hit_rate"] == 0.5
+    print(f"✅ {stats}")
+
+
+def test_persistent_cache_is_shared_across_documents(monkeypatch):
+    print("=== Testing persistent OCR cache ===")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        calls = _install_fake_ocr(monkeypatch, cache_dir)
+        first = ImageProcessor()
+        first.process(b"logo-bytes")
+        second = ImageProcessor()
+        _, ocr_text = second.process(b"logo-bytes")
+
+        assert len(calls) == 1
+        assert ocr_text == "text-10"
+        assert second.stats()["ocr_cache_hit_rate"] == 1.0
+        assert first.stats()["ocr_runs"] == 1 and second.stats()["ocr_persistent_hits"] == 1
+        image_processor.get_ocr_cache().close()
+    print("✅ OCR result reused by a second document")
+
+
+def test_ocr_errors_are_not_cached(monkeypatch):
+    print("=== Testing OCR error handling ===")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        calls = _install_fake_ocr(monkeypatch, cache_dir, fail=True)
+        ImageProcessor().process(b"broken")
+        ImageProcessor().process(b"broken")
+        assert len(calls) == 2
+        image_processor.get_ocr_cache().close()
+    print("✅ errors retried on the next document")
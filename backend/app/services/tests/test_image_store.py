@@ -0,0 +1,42 @@
+import base64
+
+from backend.app.services.image_store import decode_data_uri, offload_images
+
+
+class _RecordingConnection:
+    """Captures the rows written by offload_images instead of talking to Postgres."""
+
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, stmt, rows):
+        self.rows.extend(rows)
+
+
+def _data_uri(payload: bytes) -> str:
+    return "data:image/png;base64," + base64.b64encode(payload).decode("utf-8")
+
+
+def test_offload_images_replaces_base64_with_refs():
+    print("=== Testing offload_images ===")
+    conn = _RecordingConnection()
+    elements = [
+        {"type": "text", "content": "hello"},
+        {"type": "image", "base64": _data_uri(b"logo"), "ocr_text": "Logo"},
+        {"type": "image", "base64": _data_uri(b"logo"), "ocr_text": "Logo"},
+        {"type": "image", "base64": "", "ocr_text": ""},
+    ]
+    result = offload_images(conn, elements)
+
+    assert result[0] == elements[0]
+    assert "base64" not in result[1] and result[1]["image_ref"] == result[2]["image_ref"]
+    assert result[1]["ocr_text"] == "Logo" and result[1]["mime_type"] == "image/png"
+    assert result[3] == elements[3]
+    assert len(conn.rows) == 1 and conn.rows[0]["data"] == b"logo"
+    assert decode_data_uri(_data_uri(b"logo")) == ("image/png", b"logo")
+    print("✅ one blob written, page keeps references only")
+
+
+
+if __name__ == "__main__":
+    test_offload_images_replaces_base64_with_refs()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+
+import pytest
+from PIL import Image
+
+from backend.app.services.document_loader import pdf_loader
+from backend.app.services.document_loader.pdf_loader import PdfLoader, _shard_page_ranges
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "..", "..", "test_files", "sample2.pdf")
+
+
+def test_shard_page_ranges_cover_all_pages_in_order():
+    print("=== Testing _shard_page_ranges ===")
+    for num_pages, workers in [(1, 4), (40, 4), (201, 8), (7, 1)]:
+        ranges = _shard_page_ranges(num_pages, workers)
+        flattened = [i for start, end in ranges for i in range(start, end)]
+        assert flattened == list(range(num_pages))
+    print("✅ shards OK")
+
+
+def test_parallel_load_matches_serial_load():
+    print("=== Testing PdfLoader parallel mode ===")
+    serial = PdfLoader(max_workers=1).load(SAMPLE_PDF)
+
+    original_min_pages = pdf_loader.PDF_PARALLEL_MIN_PAGES
+    pdf_loader.PDF_PARALLEL_MIN_PAGES = 1
+    try:
+        parallel = PdfLoader(max_workers=2).load(SAMPLE_PDF)
+    finally:
+        pdf_loader.PDF_PARALLEL_MIN_PAGES = original_min_pages
+
+    assert [p.page_number for p in parallel.pages] == list(range(1, len(serial.pages) + 1))
+    assert parallel.pages == serial.pages
+    print(f"✅ {len(parallel.pages)} pages identical in serial and parallel mode")
+
+
+def _write_slides_pdf(path: str, num_pages: int):
+    """Writes a PDF whose pages all show the same logo image."""
+    logo = Image.new("RGB", (64, 32), (200, 30, 30))
+    pages = [logo.copy() for _ in range(num_pages)]
+    pages[0].save(path, save_all=True, append_images=pages[1:])
+
+
+def test_parallel_load_ocrs_a_repeated_image_once(monkeypatch):
+    print("=== Testing PdfLoader parallel image dedup ===")
+    # Read by the spawned workers at import, so their OCR cannot be served from disk
+    monkeypatch.setenv("OCR_CACHE_ENABLED", "false")
+    monkeypatch.setattr(pdf_loader, "PDF_PARALLEL_MIN_PAGES", 1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "slides.pdf")
+        _write_slides_pdf(path, num_pages=12)
+        loader = PdfLoader(max_workers=3)
+        document = loader.load(path)
+
+    ocr_texts = [el["ocr_text"] for page in document.pages for el in page.structured_elements if el["type"] == "image"]
+    assert len(ocr_texts) == 12 and len(set(ocr_texts)) == 1 and ocr_texts[0] is not None
+    assert all("image_hash" not in el for page in document.pages for el in page.structured_elements)
+    stats = document.image_stats
+    assert stats["images_seen"] == 12 and stats["unique_images"] == 1
+    assert stats["ocr_runs"] == 1 and stats["ocr_persistent_hits"] == 0
+    print(f"✅ 12 copies across {len(_shard_page_ranges(12, 3))} shards, OCR'd once: {stats}")
+
+
+if __name__ == "__main__":
+    test_shard_page_ranges_cover_all_pages_in_order()
+    test_parallel_load_matches_serial_load()
+    test_parallel_load_ocrs_a_repeated_image_once(pytest.MonkeyPatch())
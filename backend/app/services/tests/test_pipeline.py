@@ -0,0 +1,97 @@
+import threading
+import time
+
+from backend.app.services.pipeline import Pipeline
+
+
+def test_stages_preserve_order_and_bound_items_in_flight():
+    print("=== Testing pipeline ordering and backpressure ===")
+    produced = []
+    in_flight = []
+    lock = threading.Lock()
+    consumed_count = [0]
+
+    def produce(out):
+        for i in range(50):
+            out.put(i)
+            with lock:
+                produced.append(i)
+                in_flight.append(len(produced) - consumed_count[0])
+
+    def double(inp, out):
+        for item in inp:
+            out.put(item * 2)
+
+    results = []
+    with Pipeline() as pipeline:
+        numbers = pipeline.channel(2)
+        doubled = pipeline.channel(2)
+        pipeline.stage("produce", produce, numbers, output=numbers)
+        pipeline.stage("double", double, numbers, doubled, output=doubled)
+        for item in doubled:
+            time.sleep(0.001)
+            results.append(item)
+            with lock:
+                consumed_count[0] += 1
+
+    assert results == [i * 2 for i in range(50)]
+    # Two channels of 2, plus one item held by each stage.
+    assert max(in_flight) <= 2 + 2 + 2 + 1
+    print(f"✅ ordered, max in flight = {max(in_flight)}")
+
+
+def test_failing_stage_cancels_pipeline_and_reraises():
+    print("=== Testing pipeline failure ===")
+
+    def produce(out):
+        for i in range(1000):
+            out.put(i)
+
+    def explode(inp, out):
+        for item in inp:
+            if item == 3:
+                raise RuntimeError("embedding failed")
+            out.put(item)
+
+    seen = []
+    try:
+        with Pipeline() as pipeline:
+            numbers = pipeline.channel(1)
+            survivors = pipeline.channel(1)
+            pipeline.stage("produce", produce, numbers, output=numbers)
+            pipeline.stage("explode", explode, numbers, survivors, output=survivors)
+            for item in survivors:
+                seen.append(item)
+        assert False, "expected RuntimeError"
+    except RuntimeError as e:
+        assert str(e) == "embedding failed"
+    # Items already queued may or may not be delivered before the cancellation.
+    assert seen == [0, 1, 2][:len(seen)]
+    print("✅ failure propagated, producer stopped")
+
+
+def test_failing_consumer_stops_producers():
+    print("=== Testing consumer failure ===")
+    started = time.perf_counter()
+
+    def produce(out):
+        while True:
+            out.put("page")
+
+    try:
+        with Pipeline() as pipeline:
+            pages = pipeline.channel(1)
+            pipeline.stage("produce", produce, pages, output=pages)
+            for _ in pages:
+                raise ValueError("insert failed")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert time.perf_counter() - started < 5
+    print("✅ producer thread exited")
+
+
+if __name__ == "__main__":
+    test_stages_preserve_order_and_bound_items_in_flight()
+    test_failing_stage_cancels_pipeline_and_reraises()
+    test_failing_consumer_stops_producers()
@@ -0,0 +1,39 @@
+from backend.app.services.query_terms import extract_lexical_terms, to_ilike_patterns
+
+
+def test_extracts_acronyms_codes_and_quoted_phrases():
+    print("=== Testing extract_lexical_terms ===")
+    assert extract_lexical_terms("幫我出5題關於PCA與SVM的選擇題") == ["pca", "svm"]
+    assert extract_lexical_terms("請總結 CS101 第三章的 F1-score 和 C++ 部分") == ["cs101", "f1-score", "c++"]
+    assert extract_lexical_terms("關於「主成分分析」的是非題") == ["主成分分析"]
+    print("✅ terms OK")
+
+
+def test_skips_numbers_stopwords_and_plain_chinese():
+    print("=== Testing term filtering ===")
+    assert extract_lexical_terms("出 3 題") == []
+    assert extract_lexical_terms("Generate a quiz about this") == []
+    assert extract_lexical_terms("幫我總結這份教材") == []
+    print("✅ filtering OK")
+
+
+def test_exam_prompts_keep_only_content_terms():
+    print("=== Testing real exam prompts ===")
+    assert extract_lexical_terms("generate 3 true false and 2 short answer questions") == []
+    assert extract_lexical_terms("Create 5 multiple choice questions about sorting") == ["sorting"]
+    assert extract_lexical_terms("Please write 2 easy short_answer questions on the TCP handshake from chapter 3") == ["tcp", "handshake"]
+    assert extract_lexical_terms("幫我出 3 題 true/false 和 2 題 multiple choice，範圍是 Dijkstra") == ["dijkstra"]
+    print("✅ question types and instructions dropped")
+
+
+def test_ilike_patterns_escape_wildcards():
+    print("=== Testing to_ilike_patterns ===")
+    assert to_ilike_patterns(["p_value", "50%"]) == ["%p\\_value%", "%50\\%%"]
+    print("✅ patterns OK")
+
+
+if __name__ == "__main__":
+    test_extracts_acronyms_codes_and_quoted_phrases()
+    test_skips_numbers_stopwords_and_plain_chinese()
+    test_exam_prompts_keep_only_content_terms()
+    test_ilike_patterns_escape_wildcards()
@@ -0,0 +1,87 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.app.services.semantic_cache import SemanticCache
+
+# Queries containing the same marker word embed to the same direction.
+_AXES = ["你好", "你是誰", "總結"]
+
+
+def _fake_embed(texts):
+    return [[1.0 if axis in text else 0.0 for axis in _AXES] + [0.1] for text in texts]
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_similar_query_hits_and_reports_saved_tokens():
+    print("=== Testing semantic hit ===")
+    cache = SemanticCache(threshold=0.9, embed=_fake_embed)
+    cache.put("chat", "你好", {"title": "問候", "content": "您好！"}, prompt_tokens=120, completion_tokens=40)
+
+    hit = cache.get("chat", "你好啊!")
+    assert hit is not None and hit.value["content"] == "您好！"
+    assert hit.as_log() == {"hit": True, "similarity": round(hit.similarity, 4), "saved_prompt_tokens": 120, "saved_completion_tokens": 40}
+    assert cache.get("chat", "幫我總結") is None
+    assert cache.get("router", "你好") is None  # namespaces are separate
+    print(f"✅ hit OK, stats={cache.stats()}")
+
+
+def test_exact_repeat_skips_embedding():
+    print("=== Testing exact-match fast path ===")
+    calls = []
+
+    def embed(texts):
+        calls.append(texts)
+        return _fake_embed(texts)
+
+    cache = SemanticCache(embed=embed)
+    cache.put("chat", "你是誰?", "value")
+    assert cache.get("chat", "  你是誰? ") is not None
+    assert len(calls) == 1  # only the put embedded
+    print("✅ exact repeat served without embedding")
+
+
+def test_ttl_and_lru_eviction():
+    print("=== Testing TTL and LRU ===")
+    clock = _Clock()
+    cache = SemanticCache(ttl_seconds=60, max_entries=2, embed=_fake_embed, clock=clock)
+    cache.put("chat", "你好", "a")
+    cache.put("chat", "你是誰", "b")
+    cache.get("chat", "你好")  # touch so '你是誰' is the LRU entry
+    cache.put("chat", "總結", "c")
+    assert cache.get("chat", "你是誰") is None
+    assert cache.get("chat", "你好").value == "a"
+
+    clock.now = 61
+    assert cache.get("chat", "你好") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["evictions"] == 1
+    print("✅ TTL and LRU OK")
+
+
+def test_stats_are_exact_under_concurrent_lookups():
+    print("=== Testing counters under concurrency ===")
+    cache = SemanticCache(embed=_fake_embed)
+    cache.put("chat", "你好", "a")
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # force frequent thread switches
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: cache.get("chat", "你好" if i % 2 else "總結"), range(2000)))
+    finally:
+        sys.setswitchinterval(switch_interval)
+    stats = cache.stats()
+    assert stats["hits"] == 1000 and stats["misses"] == 1000
+    print(f"✅ no lost updates, stats={stats}")
+
+
+if __name__ == "__main__":
+    test_similar_query_hits_and_reports_saved_tokens()
+    test_exact_repeat_skips_embedding()
+    test_ttl_and_lru_eviction()
+    test_stats_are_exact_under_concurrent_lookups()
@@ -0,0 +1,111 @@
+from backend.app.services.document_loader import Page
+from backend.app.services.text_splitter import chunk_document, iter_chunks, PageIndex, _split_recursive
+from backend.benchmarks.bench_text_splitter import legacy_chunk_document, make_synthetic_pages
+
+
+def _page(page_number, text):
+    page = Page(page_number=page_number, structured_elements=[])
+    page.text_for_chunking = text
+    return page
+
+
+def test_page_index_binary_search():
+    print("=== Testing PageIndex ===")
+    index = PageIndex()
+    index.append(1, 5)
+    index.append(3, 2)  # page 2 had no text and was skipped
+    index.append(4, 10)
+    assert [index.page_at(i) for i in (0, 4, 5, 6, 7, 16)] == [1, 1, 3, 3, 4, 4]
+    assert index.length == 17
+    print("✅ PageIndex OK")
+
+
+def test_chunk_document_matches_legacy_page_numbers():
+    print("=== Testing chunk_document against the legacy splitter ===")
+    cases = [
+        ([], 100, 10),
+        ([_page(1, "短文")], 100, 10),
+        ([_page(1, "a" * 95), _page(2, ""), _page(3, "b" * 40), _page(4, "c" * 300)], 100, 20),
+        (make_synthetic_pages(60, 400, empty_every=7, seed=1), 1000, 150),
+        (make_synthetic_pages(25, 50, seed=2), 120, 0),
+    ]
+    for pages, chunk_size, chunk_overlap in cases:
+        expected = legacy_chunk_document(pages, chunk_size, chunk_overlap)
+        actual = chunk_document(pages, chunk_size, chunk_overlap, file_name="sample.pdf", uploader_id=1)
+        assert actual == expected
+    print("✅ identical chunks and page_numbers")
+
+
+def test_iter_chunks_is_lazy_and_rejects_non_advancing_overlap():
+    print("=== Testing iter_chunks ===")
+    chunks = iter_chunks([_page(1, "x" * 50)], chunk_size=10, chunk_overlap=2)
+    assert next(chunks) == ("x" * 10, {"page_numbers": [1]})
+    try:
+        list(iter_chunks([_page(1, "x")], chunk_size=10, chunk_overlap=10))
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✅ iter_chunks OK")
+
+
+def test_iter_chunks_streams_pages_from_a_generator():
+    print("=== Testing iter_chunks on streamed pages ===")
+    pages = make_synthetic_pages(40, 300, empty_every=5, seed=3)
+    consumed = []
+
+    def stream():
+        for page in pages:
+            consumed.append(page.page_number)
+            yield page
+
+    chunks = iter_chunks(stream(), chunk_size=200, chunk_overlap=30)
+    first = next(chunks)
+    pages_read = len(consumed)
+    # The first chunk is ready long before the last page is read.
+    assert pages_read < len(pages)
+    assert [first] + list(chunks) == legacy_chunk_document(pages, 200, 30)
+    print(f"✅ first chunk after {pages_read} of {len(pages)} pages")
+
+
+def test_split_recursive_prefers_cjk_sentence_boundaries():
+    print("=== Testing _split_recursive ===")
+    text = "機器學習是一門學科。它研究演算法！為什麼重要？因為資料很多。"
+    pieces = _split_recursive(text, max_tokens=12, length_function=len)
+    assert "".join(pieces) == text
+    assert pieces == ["機器學習是一門學科。", "它研究演算法！", "為什麼重要？", "因為資料很多。"]
+    # A run with no boundary at all is still cut to size.
+    assert all(len(p) <= 5 for p in _split_recursive("a" * 23, max_tokens=5, length_function=len))
+    print("✅ sentence boundaries respected")
+
+
+def test_recursive_strategy_uses_structured_elements_and_tracks_pages():
+    print("=== Testing recursive chunk_document ===")
+    page1 = Page(page_number=1, structured_elements=[
+        {"type": "text", "content": "第一章 緒論。"},
+        {"type": "text", "content": "本章介紹監督式學習。"},
+    ])
+    page2 = Page(page_number=2, structured_elements=[
+        {"type": "image", "base64": "data:image/png;base64,xx", "ocr_text": "流程圖"},
+        {"type": "text", "content": "第二章 模型評估。"},
+    ])
+    chunks = chunk_document([page1, page2], chunk_size=20, chunk_overlap=0, file_name="a.pdf", uploader_id=1,
+                            strategy="recursive", length_function=len)
+
+    texts = [text for text, _ in chunks]
+    assert texts == ["第一章 緒論。 本章介紹監督式學習。", "[圖片: 流程圖] 第二章 模型評估。"]
+    assert [meta["page_numbers"] for _, meta in chunks] == [[1], [2]]
+
+    overlapped = chunk_document([page1, page2], chunk_size=20, chunk_overlap=10, file_name="a.pdf", uploader_id=1,
+                                strategy="recursive", length_function=len)
+    assert overlapped[1][0].startswith("本章介紹監督式學習。")
+    assert overlapped[1][1]["page_numbers"] == [1, 2]
+    print("✅ recursive chunks OK")
+
+
+if __name__ == "__main__":
+    test_page_index_binary_search()
+    test_chunk_document_matches_legacy_page_numbers()
+    test_iter_chunks_is_lazy_and_rejects_non_advancing_overlap()
+    test_iter_chunks_streams_pages_from_a_generator()
+    test_split_recursive_prefers_cjk_sentence_boundaries()
+    test_recursive_strategy_uses_structured_elements_and_tracks_pages()
@@ -0,0 +1,81 @@
+from backend.app.services.vector_index_cache import DocumentIndex, VectorIndexCache
+
+
+def _index(n=4, dim=3):
+    # Chunk i points along axis i % dim, scaled so normalization matters.
+    embeddings = [[(i + 1.0) if d == i % dim else 0.0 for d in range(dim)] for i in range(n)]
+    texts = [f"chunk {i} about PCA" if i == n - 1 else f"chunk {i}" for i in range(n)]
+    return DocumentIndex(ids=[100 + i for i in range(n)], texts=texts, metadatas=[{"page_numbers": [i + 1]} for i in range(n)], embeddings=embeddings)
+
+
+def test_vector_ranking_returns_nearest_rows_in_order():
+    print("=== Testing in-memory vector ranking ===")
+    index = _index()
+    rows, distances = index.vector_ranking([1.0, 0.1, 0.0], 2)
+    # Rows 0 and 3 both point along axis 0; row 1 is next.
+    assert sorted(rows.tolist()) == [0, 3]
+    assert distances[0] <= distances[1]
+    assert index.search([0.0, 1.0, 0.0], 1) == [(1, index.search([0.0, 1.0, 0.0], 1)[0][1])]
+    assert abs(index.search([0.0, 1.0, 0.0], 1)[0][1]) < 1e-6
+    print("✅ vector ranking OK")
+
+
+def test_hybrid_search_promotes_lexical_matches():
+    print("=== Testing in-memory hybrid fusion ===")
+    index = _index(n=6)
+    vector_only = [row for row, _ in index.search([0.0, 1.0, 0.0], 2)]
+    hybrid = [row for row, _ in index.search([0.0, 1.0, 0.0], 2, lexical_terms=["pca"], candidate_multiplier=1)]
+    assert 5 not in vector_only and 5 in hybrid
+    print(f"✅ hybrid OK: {vector_only} -> {hybrid}")
+
+
+def test_cache_loads_once_evicts_by_memory_and_invalidates():
+    print("=== Testing VectorIndexCache ===")
+    one_doc = _index().nbytes
+    cache = VectorIndexCache(max_bytes=one_doc * 2)
+    loads = []
+
+    def loader(doc_id):
+        def load():
+            loads.append(doc_id)
+            return _index()
+        return load
+
+    cache.get_or_load(1, loader(1))
+    cache.get_or_load(1, loader(1))
+    cache.get_or_load(2, loader(2))
+    cache.get_or_load(1, loader(1))   # touch 1 so 2 is evicted next
+    cache.get_or_load(3, loader(3))
+    assert loads == [1, 2, 3]
+    assert cache.stats()["documents"] == 2 and cache.stats()["evictions"] == 1
+
+    cache.invalidate(1)
+    cache.get_or_load(1, loader(1))
+    assert loads == [1, 2, 3, 1]
+    print(f"✅ cache OK, stats={cache.stats()}")
+
+
+def test_invalidate_during_load_is_not_cached():
+    print("=== Testing invalidate() during an in-flight load ===")
+    cache = VectorIndexCache()
+    loads = []
+
+    def stale_load():
+        loads.append("stale")
+        cache.invalidate(1)  # chunks rewritten while the old ones were being read
+        return _index()
+
+    assert cache.get_or_load(1, stale_load) is not None
+    assert cache.stats()["documents"] == 0 and cache.stats()["skipped_stale"] == 1
+    cache.get_or_load(1, lambda: loads.append("fresh") or _index())
+    cache.get_or_load(1, lambda: loads.append("unexpected") or _index())
+    assert loads == ["stale", "fresh"]
+    assert cache._loads == {}  # no per-document load state is kept once loads finish
+    print(f"✅ stale load dropped, stats={cache.stats()}")
+
+
+if __name__ == "__main__":
+    test_vector_ranking_returns_nearest_rows_in_order()
+    test_hybrid_search_promotes_lexical_matches()
+    test_cache_loads_once_evicts_by_memory_and_invalidates()
+    test_invalidate_during_load_is_not_cached()
@@ -1,15 +1,263 @@
 '''
 RAG chunking的參數在這裡調
 '''
-from typing import List, Dict, Any, Tuple
+import os
+import re
+from array import array
+from bisect import bisect_right
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Callable, Optional
 from ..services.document_loader import Page
 
+PAGE_SEPARATOR = "\n\n"
+
+# 'fixed': fixed character windows (CHUNK_SIZE / CHUNK_OVERLAP, in characters).
+# 'recursive': structure-aware chunks measured in tokens (CHUNK_SIZE_TOKENS / CHUNK_OVERLAP_TOKENS).
+CHUNKING_STRATEGIES = ("fixed", "recursive")
+DEFAULT_CHUNKING_STRATEGY = os.getenv("CHUNKING_STRATEGY", "fixed")
+
+# Boundaries tried in order when a block is too large, from coarse to fine.
+# Delimiters stay attached to the preceding piece so pieces re-join losslessly.
+RECURSIVE_SEPARATORS = [
+    re.compile(r"(?<=\n\n)"),                       # paragraphs
+    re.compile(r"(?<=\n)"),                          # lines
+    re.compile(r"(?<=[。！？!?；;])|(?<=[.]\s)"),      # sentences (CJK and Latin)
+    re.compile(r"(?<=[，、,：:])|(?<=\s)"),            # clauses and words
+]
+
+
+def element_to_text(element: Dict[str, Any]) -> Optional[str]:
+    """Renders one structured element as the text used for chunking; None for unknown types."""
+    element_type = element.get("type")
+    if element_type == "text":
+        return element.get("content", "")
+    if element_type == "image":
+        ocr_text = element.get("ocr_text")
+        return f"[圖片: {ocr_text}]" if ocr_text else "[圖片]"
+    return None
+
+
+class PageIndex:
+    """
+    Maps character offsets of the concatenated document text back to page numbers.
+
+    Instead of storing one page number per character, only the start offset of
+    each page is recorded (in a compact int array) and lookups use binary search.
+    """
+
+    def __init__(self):
+        self._starts = array('q')
+        self._page_numbers = array('q')
+        self.length = 0
+
+    def append(self, page_number: int, length: int):
+        """Registers a page whose text occupies the next `length` characters."""
+        self._starts.append(self.length)
+        self._page_numbers.append(page_number)
+        self.length += length
+
+    def page_at(self, offset: int) -> int:
+        """Returns the page number of the character at `offset`."""
+        return self._page_numbers[bisect_right(self._starts, offset) - 1]
+
+
+def iter_chunks(
+    pages: Iterable[Page],
+    chunk_size: int,
+    chunk_overlap: int
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Lazily yields fixed-size, overlapping character chunks together with the
+    pages each chunk spans.
+
+    Pages are consumed incrementally: a chunk is emitted as soon as the text
+    after it is known, and text before the next chunk's start is dropped, so
+    memory stays bounded by a few pages even for a streamed page iterator.
+
+    Args:
+        pages: Page objects from a Document, or any iterable yielding them in order.
+        chunk_size: The desired maximum size of each chunk (in characters).
+        chunk_overlap: The number of characters to overlap between chunks.
+
+    Yields:
+        (chunk_text, {"page_numbers": [...]}) tuples in document order.
+    """
+    if chunk_size - chunk_overlap <= 0:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size}).")
+
+    step = chunk_size - chunk_overlap
+    page_index = PageIndex()
+    buffer = ""          # the document text from buffer_offset onwards
+    buffer_offset = 0
+    start_index = 0
+
+    def chunk_at(start: int, text_length: int) -> Tuple[str, Dict[str, Any]]:
+        end_index = start + chunk_size
+        chunk_text = buffer[start - buffer_offset:end_index - buffer_offset]
+        # The end page is taken at end_index (clamped), i.e. the character right
+        # after the chunk, which matches how page spans have always been recorded.
+        start_page = page_index.page_at(start)
+        end_page = page_index.page_at(min(end_index, text_length - 1))
+        return chunk_text, {"page_numbers": list(range(start_page, end_page + 1))}
+
+    for page in pages:
+        page_text = page.text_for_chunking
+        if not page_text:
+            continue
+        buffer += page_text + PAGE_SEPARATOR  # Add separators for clarity
+        page_index.append(page.page_number, len(page_text) + len(PAGE_SEPARATOR))
+
+        # A chunk is final once the character after it has arrived.
+        while start_index + chunk_size < page_index.length:
+            yield chunk_at(start_index, page_index.length)
+            start_index += step
+        buffer = buffer[start_index - buffer_offset:]
+        buffer_offset = start_index
+
+    while start_index < page_index.length:
+        yield chunk_at(start_index, page_index.length)
+        start_index += step
+
+
+_token_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Counts tokens with the cl100k_base encoding used by OpenAI's embedding models."""
+    global _token_encoding
+    if _token_encoding is None:
+        import tiktoken
+        _token_encoding = tiktoken.get_encoding("cl100k_base")
+    return len(_token_encoding.encode(text, disallowed_special=()))
+
+
+def _split_recursive(text: str, max_tokens: int, length_function: Callable[[str], int], level: int = 0) -> List[str]:
+    """
+    Splits `text` into pieces of at most `max_tokens`, preferring the coarsest
+    boundary in RECURSIVE_SEPARATORS and falling back to hard character cuts.
+    """
+    if length_function(text) <= max_tokens:
+        return [text]
+
+    if level >= len(RECURSIVE_SEPARATORS):
+        # No natural boundary left: cut into character windows sized by the token ratio.
+        window = max(1, len(text) * max_tokens // max(length_function(text), 1))
+        return [text[i:i + window] for i in range(0, len(text), window)]
+
+    pieces = [p for p in RECURSIVE_SEPARATORS[level].split(text) if p]
+    if len(pieces) <= 1:
+        return _split_recursive(text, max_tokens, length_function, level + 1)
+
+    result = []
+    for piece in pieces:
+        result.extend(_split_recursive(piece, max_tokens, length_function, level + 1))
+    return result
+
+
+def _iter_segments(pages: Iterable[Page], max_tokens: int, length_function: Callable[[str], int]) -> Iterator[Tuple[str, str, int, int]]:
+    """
+    Yields (joiner, text, token_count, page_number) segments no larger than
+    max_tokens. Structured elements are the primary blocks; pages without them
+    fall back to their text_for_chunking.
+    """
+    first = True
+    for page in pages:
+        elements = getattr(page, "structured_elements", None) or []
+        blocks = [t for t in (element_to_text(e) for e in elements) if t and t.strip()]
+        if not blocks:
+            page_text = getattr(page, "text_for_chunking", None)
+            blocks = [page_text] if page_text and page_text.strip() else []
+
+        for block_index, block in enumerate(blocks):
+            for piece_index, piece in enumerate(_split_recursive(block, max_tokens, length_function)):
+                if first:
+                    joiner = ""
+                elif piece_index > 0:
+                    joiner = ""  # continuation of the same block
+                elif block_index == 0:
+                    joiner = PAGE_SEPARATOR
+                else:
+                    joiner = " "
+                first = False
+                yield joiner, piece, length_function(piece), page.page_number
+
+
+def iter_recursive_chunks(
+    pages: Iterable[Page],
+    chunk_size: int,
+    chunk_overlap: int,
+    length_function: Callable[[str], int] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Lazily yields structure-aware chunks that end on paragraph, sentence
+    (including 。！？) or structured-element boundaries whenever possible.
+
+    Args:
+        pages: Page objects from a Document, or any iterable yielding them in order.
+        chunk_size: The maximum size of each chunk (in tokens).
+        chunk_overlap: The number of trailing tokens (whole segments) repeated at the start of the next chunk.
+        length_function: Measures text size; defaults to a tiktoken token count.
+
+    Yields:
+        (chunk_text, {"page_numbers": [...]}) tuples in document order.
+    """
+    if chunk_size - chunk_overlap <= 0:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size}).")
+    length_function = length_function or count_tokens
+
+    def emit(segments):
+        text = segments[0][1] + "".join(joiner + piece for joiner, piece, _, _ in segments[1:])
+        first_page, last_page = segments[0][3], segments[-1][3]
+        return text, {"page_numbers": list(range(first_page, last_page + 1))}
+
+    window = []
+    window_tokens = 0
+    for segment in _iter_segments(pages, chunk_size, length_function):
+        tokens = segment[2]
+        if window and window_tokens + tokens > chunk_size:
+            yield emit(window)
+            # Carry whole trailing segments that fit in the overlap budget.
+            carried, carried_tokens = [], 0
+            for previous in reversed(window):
+                if carried_tokens + previous[2] > chunk_overlap or carried_tokens + previous[2] + tokens > chunk_size:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous[2]
+            window, window_tokens = carried, carried_tokens
+        window.append(segment)
+        window_tokens += tokens
+
+    if window:
+        yield emit(window)
+
+
+def iter_document_chunks(
+    pages: Iterable[Page],
+    chunk_size: int,
+    chunk_overlap: int,
+    strategy: Optional[str] = None,
+    length_function: Callable[[str], int] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Lazily yields the chunks of `strategy` ('fixed' or 'recursive', defaulting
+    to the CHUNKING_STRATEGY environment variable). Both strategies consume
+    `pages` incrementally, so it may be a generator of pages still being loaded.
+    """
+    strategy = (strategy or DEFAULT_CHUNKING_STRATEGY).lower()
+    if strategy == "fixed":
+        return iter_chunks(pages, chunk_size, chunk_overlap)
+    if strategy == "recursive":
+        return iter_recursive_chunks(pages, chunk_size, chunk_overlap, length_function)
+    raise ValueError(f"Unsupported chunking strategy: {strategy}. Expected one of {CHUNKING_STRATEGIES}.")
+
+
 def chunk_document(
     pages: List[Page],
     chunk_size: int,
     chunk_overlap: int,
     file_name: str,
-    uploader_id: int
+    uploader_id: int,
+    strategy: Optional[str] = None,
+    length_function: Callable[[str], int] = None
 ) -> List[Tuple[str, Dict[str, Any]]]:
     """
     Chunks a document by treating it as a single text stream, but intelligently
@@ -17,61 +265,17 @@ def chunk_document(
 
     Args:
         pages: A list of Page objects from a Document.
-        chunk_size: The desired maximum size of each chunk (in characters).
-        chunk_overlap: The number of characters to overlap between chunks.
+        chunk_size: The desired maximum size of each chunk (characters for 'fixed', tokens for 'recursive').
+        chunk_overlap: The amount to overlap between chunks (same unit as chunk_size).
         file_name: The original name of the document file.
         uploader_id: The ID of the user who uploaded the file.
+        strategy: 'fixed' or 'recursive'. Defaults to the CHUNKING_STRATEGY environment variable.
+        length_function: Token counter for the 'recursive' strategy (defaults to tiktoken).
 
     Returns:
         A list of tuples, where each tuple contains:
         - The text content of the chunk.
-        - A rich metadata dictionary (e.g., 
+        - A rich metadata dictionary (e.g.,
           {'page_numbers': [1, 2], 'file_name': 'sample.pdf', 'uploader_id': 1}).
     """
-    
-    # 1. Concatenate all page texts and create a map of character index to page number.
-    full_text = ""
-    char_to_page_map = []
-    for page in pages:
-        page_text = page.text_for_chunking
-        if not page_text:
-            continue
-        
-        start_index = len(full_text)
-        full_text += page_text + "\n\n"  # Add separators for clarity
-        end_index = len(full_text)
-        
-        # For each character from this page, map it back to the page number
-        for i in range(start_index, end_index):
-            char_to_page_map.append(page.page_number)
-
-    # 2. Split the full text into chunks.
-    chunks_with_metadata = []
-    start_index = 0
-    while start_index < len(full_text):
-        end_index = start_index + chunk_size
-        chunk_text = full_text[start_index:end_index]
-        
-        # 3. For each chunk, determine the pages it spans.
-        # Find the page number at the start and end of the chunk
-        start_page = char_to_page_map[start_index] if start_index < len(char_to_page_map) else None
-        end_page = char_to_page_map[min(end_index, len(char_to_page_map) - 1)] if start_index < len(char_to_page_map) else None
-
-        page_numbers = []
-        if start_page is not None and end_page is not None:
-            # Create a unique, sorted list of all pages this chunk touches
-            page_numbers = sorted(list(set(range(start_page, end_page + 1))))
-        
-        # 4. Construct rich metadata.
-        metadata = {
-            "page_numbers": page_numbers
-        }
-        
-        chunks_with_metadata.append((chunk_text, metadata))
-        
-        # Move to the next chunk with overlap
-        start_index += chunk_size - chunk_overlap
-        if start_index >= len(full_text):
-            break
-            
-    return chunks_with_metadata
+    return list(iter_document_chunks(pages, chunk_size, chunk_overlap, strategy, length_function))
@@ -0,0 +1,206 @@
+"""
+In-process retrieval tier for hot documents.
+
+During a class session many requests search the same unique_content_id. The
+first search loads that document's chunk embeddings into one contiguous
+float32 matrix with unit-normalized rows; later searches rank it with a single
+matrix-vector product and `argpartition`, without touching Postgres.
+
+Documents are evicted least-recently-used once the cache exceeds
+RAG_VECTOR_CACHE_MAX_MB and dropped after RAG_VECTOR_CACHE_TTL_SECONDS.
+invalidate() only reaches the calling process: process_file runs in the
+ingestion workers, so API processes rely on RAGAgent loading only content
+whose processing_status is 'completed', and on the TTL.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RAG_VECTOR_CACHE_ENABLED = os.getenv("RAG_VECTOR_CACHE_ENABLED", "false").lower() == "true"
+RAG_VECTOR_CACHE_MAX_MB = int(os.getenv("RAG_VECTOR_CACHE_MAX_MB", "256"))
+# Upper bound on how long an API process can serve a document's chunks after
+# they were rewritten by an ingestion worker (invalidate() is per process).
+RAG_VECTOR_CACHE_TTL_SECONDS = int(os.getenv("RAG_VECTOR_CACHE_TTL_SECONDS", "600"))
+
+
+class DocumentIndex:
+    """
+    The chunks of one document, in chunk_order, with their embeddings as a
+    unit-normalized float32 matrix.
+    """
+
+    def __init__(self, ids: Sequence[int], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], embeddings: Sequence[Sequence[float]]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.matrix = matrix / np.where(norms == 0, 1.0, norms)
+        self._lowered_texts: Optional[List[str]] = None
+        self.nbytes = self.matrix.nbytes + self.ids.nbytes + sum(len(t or "") * 4 for t in self.texts)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector_ranking(self, query_vector: Sequence[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the row indices of the k nearest chunks (best first) and their cosine distances."""
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        similarities = self.matrix @ (query / norm if norm else query)
+        if k < len(similarities):
+            candidates = np.argpartition(-similarities, k - 1)[:k]
+        else:
+            candidates = np.arange(len(similarities))
+        order = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return order, 1.0 - similarities[order]
+
+    def lexical_ranking(self, terms: List[str], k: int) -> List[int]:
+        """Row indices of chunks containing the most terms (case-insensitive), ties in chunk order."""
+        if self._lowered_texts is None:
+            self._lowered_texts = [(t or "").lower() for t in self.texts]
+        hits = [(sum(term in text for term in terms), row) for row, text in enumerate(self._lowered_texts)]
+        ranked = sorted((h for h in hits if h[0] > 0), key=lambda h: (-h[0], h[1]))
+        return [row for _, row in ranked[:k]]
+
+    def search(self, query_vector: Sequence[float], top_k: int, lexical_terms: List[str] = None,
+               candidate_multiplier: int = 4, rrf_k: int = 60) -> List[Tuple[int, float]]:
+        """
+        Returns [(row index, rank key)] for the top_k chunks, lowest rank key first.
+        With lexical_terms, vector and lexical candidates are fused with
+        reciprocal rank fusion, the same way RAGAgent's hybrid SQL does.
+        """
+        if not lexical_terms:
+            rows, distances = self.vector_ranking(query_vector, top_k)
+            return [(int(row), float(distance)) for row, distance in zip(rows, distances)]
+
+        candidate_k = top_k * candidate_multiplier
+        vector_rows, _ = self.vector_ranking(query_vector, candidate_k)
+        scores: Dict[int, float] = {}
+        for ranking in (vector_rows.tolist(), self.lexical_ranking(lexical_terms, candidate_k)):
+            for rank, row in enumerate(ranking, start=1):
+                scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank)
+        fused = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [(row, -score) for row, score in fused]
+
+    def chunk(self, row: int) -> Dict[str, Any]:
+        return {"id": int(self.ids[row]), "chunk_text": self.texts[row], "metadata": self.metadatas[row]}
+
+
+class _Load:
+    """The in-flight load of one document: its lock, how many callers hold or wait on it, and invalidations since it started."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.callers = 0
+        self.generation = 0
+
+
+class VectorIndexCache:
+    """
+    An LRU of DocumentIndex objects bounded by total memory.
+    """
+
+    def __init__(self, max_bytes: int = RAG_VECTOR_CACHE_MAX_MB * 1024 * 1024, ttl_seconds: int = RAG_VECTOR_CACHE_TTL_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[int, Tuple[DocumentIndex, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loads: Dict[int, _Load] = {}
+        self._stats = {"hits": 0, "loads": 0, "evictions": 0, "invalidations": 0, "skipped_too_large": 0, "skipped_stale": 0}
+
+    def _get_live(self, unique_content_id: int) -> Optional[DocumentIndex]:
+        with self._lock:
+            cached = self._entries.get(unique_content_id)
+            if cached is None:
+                return None
+            index, expires_at = cached
+            if expires_at <= self._clock():
+                self._remove(unique_content_id)
+                return None
+            self._entries.move_to_end(unique_content_id)
+            return index
+
+    def _remove(self, unique_content_id: int):
+        index, _ = self._entries.pop(unique_content_id)
+        self._bytes -= index.nbytes
+
+    def get_or_load(self, unique_content_id: int, loader: Callable[[], Optional[DocumentIndex]]) -> Optional[DocumentIndex]:
+        """
+        Returns the cached index, calling `loader` on a miss (once per document
+        even under concurrent requests). Returns None when the loader does, or
+        when the document alone would exceed the memory budget.
+        """
+        index = self._get_live(unique_content_id)
+        if index is not None:
+            self._stats["hits"] += 1
+            return index
+
+        with self._lock:
+            load = self._loads.setdefault(unique_content_id, _Load())
+            load.callers += 1
+        try:
+            with load.lock:
+                index = self._get_live(unique_content_id)
+                if index is not None:
+                    self._stats["hits"] += 1
+                    return index
+                with self._lock:
+                    generation = load.generation
+                index = loader()
+                if index is None:
+                    return None
+                self._stats["loads"] += 1
+                if index.nbytes > self._max_bytes:
+                    self._stats["skipped_too_large"] += 1
+                    return index
+                with self._lock:
+                    if load.generation != generation:
+                        # invalidate() ran while loading; the rows read may predate the rewrite
+                        self._stats["skipped_stale"] += 1
+                        return index
+                    self._entries[unique_content_id] = (index, self._clock() + self._ttl)
+                    self._bytes += index.nbytes
+                    while self._bytes > self._max_bytes:
+                        oldest = next(iter(self._entries))
+                        self._remove(oldest)
+                        self._stats["evictions"] += 1
+                return index
+        finally:
+            with self._lock:
+                load.callers -= 1
+                if load.callers == 0:
+                    del self._loads[unique_content_id]
+
+    def invalidate(self, unique_content_id: int):
+        """Drops a document (call after its chunks are rewritten); a load in flight is not cached."""
+        with self._lock:
+            load = self._loads.get(unique_content_id)
+            if load is not None:
+                load.generation += 1
+            if unique_content_id in self._entries:
+                self._remove(unique_content_id)
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._stats, "documents": len(self._entries), "bytes": self._bytes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Singleton instance for easy access
+vector_index_cache = VectorIndexCache()
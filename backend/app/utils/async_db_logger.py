@@ -0,0 +1,197 @@
+"""
+Async counterparts of the db_logger write functions, backed by an asyncpg AsyncEngine.
+
+Async LangGraph nodes (and the async branch of `log_task`) await these so that
+logging round trips do not block the event loop while other requests and
+critic evaluations are running. Row construction is shared with db_logger,
+so both variants write identical records.
+
+If asyncpg is unavailable, each call falls back to the synchronous db_logger
+function in a worker thread, which still keeps the event loop free.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import insert, update
+
+from backend.app.utils import db_logger
+from backend.app.utils.db_logger import (
+    orchestration_jobs,
+    agent_tasks,
+    generated_contents,
+    agent_task_sources,
+    TAIPEI_TZ,
+    _task_insert_values,
+    _task_update_values,
+    _task_source_records,
+    _generated_content_values,
+)
+from backend.app.utils.db_engine import get_async_engine
+
+logger = logging.getLogger(__name__)
+
+_async_engine = None
+_async_engine_unavailable = False
+
+
+def _get_engine():
+    """Returns the shared AsyncEngine, or None when asyncpg cannot be used."""
+    global _async_engine, _async_engine_unavailable
+    if _async_engine is None and not _async_engine_unavailable:
+        try:
+            _async_engine = get_async_engine()
+        except ImportError as e:
+            logger.warning(f"asyncpg not available, async db_logger falls back to worker threads. Reason: {e}")
+            _async_engine_unavailable = True
+    return _async_engine
+
+
+async def _flush_task_logs():
+    """Async form of db_logger.flush_task_logs (only does work in write-behind mode)."""
+    if db_logger.task_log_writer is not None:
+        await asyncio.to_thread(db_logger.flush_task_logs)
+
+# --- Job-level Logging ---
+
+async def create_job(user_id: int, input_prompt: str, workflow_type: str, experiment_config: Optional[Dict] = None) -> Optional[int]:
+    """Creates a new record in the orchestration_jobs table."""
+    engine = _get_engine()
+    if engine is None:
+        return await asyncio.to_thread(db_logger.create_job, user_id, input_prompt, workflow_type, experiment_config)
+    try:
+        async with engine.begin() as conn:
+            stmt = insert(orchestration_jobs).values(
+                user_id=user_id,
+                input_prompt=input_prompt,
+                status='planning',
+                workflow_type=workflow_type,
+                experiment_config=experiment_config,
+                created_at=datetime.now(TAIPEI_TZ),
+                updated_at=datetime.now(TAIPEI_TZ)
+            ).returning(orchestration_jobs.c.id)
+            job_id = (await conn.execute(stmt)).scalar_one()
+        logger.info(f"Created job {job_id} for workflow '{workflow_type}'.")
+        return job_id
+    except Exception as e:
+        logger.error(f"Failed to create job. Reason: {e}")
+        return None
+
+async def update_job_status(job_id: int, status: str, error_message: Optional[str] = None):
+    """Updates the status and error message of a job."""
+    engine = _get_engine()
+    if engine is None:
+        return await asyncio.to_thread(db_logger.update_job_status, job_id, status, error_message)
+    if status in ('completed', 'failed'):
+        await _flush_task_logs()
+    try:
+        async with engine.begin() as conn:
+            stmt = update(orchestration_jobs).where(orchestration_jobs.c.id == job_id).values(
+                status=status,
+                error_message=error_message,
+                updated_at=datetime.now(TAIPEI_TZ)
+            )
+            await conn.execute(stmt)
+        logger.info(f"Updated job {job_id} status to '{status}'.")
+    except Exception as e:
+        logger.error(f"Failed to update job {job_id}. Reason: {e}")
+
+# --- Task-level Logging ---
+
+async def create_task(
+    job_id: int,
+    agent_name: str,
+    task_description: str,
+    task_input: Optional[Dict] = None,
+    model_name: Optional[str] = None,
+    parent_task_id: Optional[int] = None,
+    model_parameters: Optional[Dict] = None,
+    iteration_number: int = 1
+) -> Optional[int]:
+    """Creates a new record in the agent_tasks table and returns its ID."""
+    engine = _get_engine()
+    if engine is None or db_logger.task_log_writer is not None:
+        # Write-behind mode only touches the database once per id block; keep that off the loop too.
+        return await asyncio.to_thread(
+            db_logger.create_task, job_id, agent_name, task_description, task_input,
+            model_name, parent_task_id, model_parameters, iteration_number
+        )
+    values = _task_insert_values(job_id, agent_name, task_description, task_input, model_name, parent_task_id, model_parameters, iteration_number)
+    try:
+        async with engine.begin() as conn:
+            stmt = insert(agent_tasks).values(**values).returning(agent_tasks.c.id)
+            task_id = (await conn.execute(stmt)).scalar_one()
+        logger.info(f"Created task {task_id} for agent '{agent_name}' (iteration {iteration_number}, parent={parent_task_id}).")
+        return task_id
+    except Exception as e:
+        logger.error(f"Failed to create task for agent '{agent_name}'. Reason: {e}")
+        return None
+
+async def update_task(
+    task_id: int,
+    status: str,
+    output: Optional[Any] = None,
+    error_message: Optional[str] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    duration_ms: Optional[int] = None,
+    estimated_cost_usd: Optional[float] = None
+):
+    """Updates an agent_task record upon completion or failure."""
+    if db_logger.task_log_writer is not None:
+        # In write-behind mode this only enqueues, so it is safe to run inline.
+        return db_logger.update_task(task_id, status, output, error_message, prompt_tokens, completion_tokens, duration_ms, estimated_cost_usd)
+    engine = _get_engine()
+    if engine is None:
+        return await asyncio.to_thread(
+            db_logger.update_task, task_id, status, output, error_message,
+            prompt_tokens, completion_tokens, duration_ms, estimated_cost_usd
+        )
+    try:
+        values = _task_update_values(status, output, error_message, prompt_tokens, completion_tokens, duration_ms, estimated_cost_usd)
+        async with engine.begin() as conn:
+            await conn.execute(update(agent_tasks).where(agent_tasks.c.id == task_id).values(**values))
+        logger.info(f"Updated task {task_id} to status '{status}'.")
+    except Exception as e:
+        logger.error(f"Failed to update task {task_id}. Reason: {e}")
+
+# --- Content and Source Logging ---
+
+async def log_task_sources(task_id: int, source_chunks: Optional[List[Dict]] = None):
+    """Logs the retrieved source chunks for a specific task."""
+    if not source_chunks:
+        return
+    engine = _get_engine()
+    if engine is None:
+        return await asyncio.to_thread(db_logger.log_task_sources, task_id, source_chunks)
+
+    await _flush_task_logs() # agent_task_sources references agent_tasks
+    records_to_insert = _task_source_records(task_id, source_chunks)
+    if not records_to_insert:
+        return
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(insert(agent_task_sources), records_to_insert)
+        logger.info(f"Logged {len(records_to_insert)} sources for task {task_id}.")
+    except Exception as e:
+        logger.error(f"Failed to log sources for task {task_id}. Reason: {e}")
+
+async def save_generated_content(task_id: int, content_type: str, title: str, content: str) -> Optional[int]:
+    """Saves generated content to the GENERATED_CONTENTS table."""
+    engine = _get_engine()
+    if engine is None:
+        return await asyncio.to_thread(db_logger.save_generated_content, task_id, content_type, title, content)
+
+    await _flush_task_logs() # generated_contents references agent_tasks
+    try:
+        async with engine.begin() as conn:
+            stmt = insert(generated_contents).values(
+                **_generated_content_values(task_id, content_type, title, content)
+            ).returning(generated_contents.c.id)
+            content_id = (await conn.execute(stmt)).scalar_one()
+        logger.info(f"Saved generated content for task {task_id}. New content ID: {content_id}.")
+        return content_id
+    except Exception as e:
+        logger.error(f"Failed to save generated content for task {task_id}. Reason: {e}")
+        return None
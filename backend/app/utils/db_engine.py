@@ -0,0 +1,194 @@
+"""
+Shared SQLAlchemy engine factory.
+
+Every backend module obtains its engine through `get_engine()` so the process
+holds one connection pool per database URL instead of one per module. Pool
+settings are read from the environment:
+
+    DB_POOL_SIZE        persistent connections kept in the pool (default 10)
+    DB_MAX_OVERFLOW     extra connections allowed under burst load (default 20)
+    DB_POOL_TIMEOUT     seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE     seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING    test connections on checkout, 'true'/'false' (default true)
+
+`get_async_engine()` returns the asyncpg-backed AsyncEngine for the same
+database, with the same pool settings, for code running on the event loop.
+
+`get_pool_metrics()` reports checkout counts, time spent waiting for a
+connection and the live pool status for each engine.
+"""
+import os
+import threading
+import time
+from typing import Dict, Any
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+load_dotenv()
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+_engines: Dict[str, Engine] = {}
+_async_engines: Dict[str, Any] = {}
+_engines_lock = threading.Lock()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """A QueuePool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics_lock = threading.Lock()
+        self.metrics = {
+            "checkouts": 0, "checkins": 0, "connects": 0, "invalidations": 0,
+            "timeouts": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0,
+        }
+
+    def recreate(self):
+        # Pool.recreate() builds a new pool on dispose(); carry the counters over.
+        new_pool = super().recreate()
+        new_pool.metrics, new_pool.metrics_lock = self.metrics, self.metrics_lock
+        return new_pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self.metrics_lock:
+                self.metrics["timeouts"] += 1
+            raise
+        finally:
+            wait_ms = (time.perf_counter() - start) * 1000
+            with self.metrics_lock:
+                self.metrics["total_wait_ms"] += wait_ms
+                self.metrics["max_wait_ms"] = max(self.metrics["max_wait_ms"], wait_ms)
+
+    def _count(self, key: str):
+        with self.metrics_lock:
+            self.metrics[key] += 1
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """The instrumented pool for AsyncEngine (asyncio-aware waiting queue)."""
+
+
+def _install_pool_listeners(engine: Engine):
+    """Counts checkouts, checkins, new physical connections and invalidations."""
+    # Listeners look up engine.pool on each event because dispose() swaps in a new pool.
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        engine.pool._count("checkouts")
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        engine.pool._count("checkins")
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        engine.pool._count("connects")
+
+    @event.listens_for(engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        engine.pool._count("invalidations")
+
+
+def get_engine(url_env: str = "DATABASE_URL") -> Engine:
+    """
+    Returns the process-wide engine for the database URL stored in the
+    environment variable `url_env`, creating it on first use.
+
+    Args:
+        url_env: Name of the environment variable holding the database URL
+                 (e.g. 'DATABASE_URL' or 'OJ_DATABASE_URL').
+
+    Returns:
+        A pooled SQLAlchemy Engine shared by every caller in this process.
+    """
+    database_url = os.getenv(url_env)
+    if not database_url:
+        raise ValueError(f"{url_env} environment variable not set.")
+
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = create_engine(
+                database_url,
+                poolclass=InstrumentedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+            _install_pool_listeners(engine)
+            _engines[database_url] = engine
+        return engine
+
+
+def get_async_engine(url_env: str = "DATABASE_URL"):
+    """
+    Returns the process-wide AsyncEngine (asyncpg driver) for the database URL
+    stored in `url_env`, creating it on first use.
+
+    Raises:
+        ImportError: If asyncpg is not installed.
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import asyncpg  # noqa: F401  (fail early with a clear error when the driver is missing)
+
+    database_url = os.getenv(url_env)
+    if not database_url:
+        raise ValueError(f"{url_env} environment variable not set.")
+    async_url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    key = async_url.render_as_string(hide_password=False)
+
+    with _engines_lock:
+        engine = _async_engines.get(key)
+        if engine is None:
+            engine = create_async_engine(
+                async_url,
+                poolclass=InstrumentedAsyncAdaptedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+            _install_pool_listeners(engine.sync_engine)
+            _async_engines[key] = engine
+        return engine
+
+
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Returns pool counters and live status for every engine created so far,
+    keyed by the database URL with the password masked.
+    """
+    report = {}
+    engines = list(_engines.values()) + [engine.sync_engine for engine in _async_engines.values()]
+    for engine in engines:
+        pool = engine.pool
+        with pool.metrics_lock:
+            metrics = dict(pool.metrics)
+        checkouts = metrics["checkouts"]
+        metrics.update({
+            "avg_wait_ms": round(metrics["total_wait_ms"] / checkouts, 3) if checkouts else 0.0,
+            "total_wait_ms": round(metrics["total_wait_ms"], 3),
+            "max_wait_ms": round(metrics["max_wait_ms"], 3),
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+        report[engine.url.render_as_string(hide_password=True)] = metrics
+    return report
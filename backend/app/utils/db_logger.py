@@ -4,21 +4,23 @@ Utility functions for logging orchestration and agent task data to the database.
 import time
 from datetime import datetime, timezone, timedelta
 from typing import Dict, Any, List, Optional
-from sqlalchemy import create_engine, MetaData, Table, insert, update, select, func, text, Column, Integer, String
+from sqlalchemy import MetaData, Table, insert, update, select, func, text, bindparam, Column, Integer, String
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
 import json
 import logging
+import threading
+import atexit
+import itertools
+from collections import OrderedDict
+
+from backend.app.utils.db_engine import get_engine
 
 # --- Timezone and Database Setup ---
 TAIPEI_TZ = timezone(timedelta(hours=8))
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set.")
-
-engine = create_engine(DATABASE_URL)
+engine = get_engine()
 metadata = MetaData()
 
 logger = logging.getLogger(__name__)
@@ -72,6 +74,164 @@ except Exception as e:
         Column('source_id', Integer, primary_key=True),
     )
 
+# --- Write-Behind Task Logging ---
+# 'sync' writes every create_task/update_task immediately (one round trip each).
+# 'write_behind' returns pre-allocated task ids at once and lets a background
+# thread flush queued inserts/updates in batches.
+DB_LOGGER_MODE = os.getenv("DB_LOGGER_MODE", "sync").lower()
+DB_LOGGER_FLUSH_INTERVAL_MS = int(os.getenv("DB_LOGGER_FLUSH_INTERVAL_MS", "200"))
+DB_LOGGER_BATCH_SIZE = int(os.getenv("DB_LOGGER_BATCH_SIZE", "100"))
+DB_LOGGER_ID_BLOCK_SIZE = int(os.getenv("DB_LOGGER_ID_BLOCK_SIZE", "20"))
+
+
+class TaskLogWriter:
+    """
+    Queues agent_tasks inserts and updates in memory and writes them in batches.
+
+    Task ids are reserved from the agent_tasks id sequence in blocks, so
+    create_task can hand out an id without waiting for its INSERT. An update
+    to a task whose INSERT is still queued is merged into that INSERT.
+    Callers that read agent_tasks, or write rows referencing a task id, call
+    flush() first so a job always sees its own writes.
+    """
+
+    def __init__(self, flush_interval_ms: int = DB_LOGGER_FLUSH_INTERVAL_MS, batch_size: int = DB_LOGGER_BATCH_SIZE, id_block_size: int = DB_LOGGER_ID_BLOCK_SIZE):
+        self._flush_interval = flush_interval_ms / 1000
+        self._batch_size = batch_size
+        self._id_block_size = id_block_size
+        self._free_ids: List[int] = []
+        self._pending_inserts: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._pending_updates: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()        # guards the queues and the id block
+        self._flush_lock = threading.Lock()  # serializes flushes so batches land in order
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self.stats = {"flushes": 0, "rows_inserted": 0, "rows_updated": 0, "ids_reserved": 0}
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="db-logger-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self._flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _reserve_ids(self) -> List[int]:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text("SELECT nextval(pg_get_serial_sequence('agent_tasks', 'id')) FROM generate_series(1, :n)"),
+                {"n": self._id_block_size}
+            ).fetchall()
+        self.stats["ids_reserved"] += len(rows)
+        return [row[0] for row in rows]
+
+    def allocate_id(self) -> int:
+        """Returns a task id reserved from the sequence (one round trip per id block)."""
+        with self._lock:
+            if not self._free_ids:
+                self._free_ids = self._reserve_ids()
+            return self._free_ids.pop(0)
+
+    def enqueue_insert(self, task_id: int, values: Dict[str, Any]):
+        with self._lock:
+            self._pending_inserts[task_id] = {"id": task_id, **values}
+        self._after_enqueue()
+
+    def enqueue_update(self, task_id: int, values: Dict[str, Any]):
+        with self._lock:
+            if task_id in self._pending_inserts:
+                self._pending_inserts[task_id].update(values)
+            else:
+                self._pending_updates.setdefault(task_id, {}).update(values)
+        self._after_enqueue()
+
+    def _after_enqueue(self):
+        if self._stopped:
+            # Late writes after shutdown (e.g. from atexit ordering) are written through.
+            self.flush()
+            return
+        self._ensure_worker()
+        if len(self._pending_inserts) + len(self._pending_updates) >= self._batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Writes everything queued so far; returns once it is committed (or has failed and been logged)."""
+        with self._flush_lock:
+            with self._lock:
+                inserts, self._pending_inserts = list(self._pending_inserts.values()), OrderedDict()
+                updates, self._pending_updates = list(self._pending_updates.items()), OrderedDict()
+            if not inserts and not updates:
+                return
+            try:
+                with engine.begin() as conn:
+                    self._write(conn, inserts, updates)
+            except Exception as e:
+                logger.error(f"Batched task log flush failed, retrying row by row. Reason: {e}")
+                self._write_individually(inserts, updates)
+            self.stats["flushes"] += 1
+
+    def _write(self, conn, inserts: List[Dict[str, Any]], updates: List[tuple]):
+        # executemany needs the same keys on every row; padding with None would write
+        # JSON 'null' instead of SQL NULL, so consecutive rows sharing a key set are
+        # sent together. Creation order is kept, so parents land before their children.
+        for _, run in itertools.groupby(inserts, key=frozenset):
+            rows = list(run)
+            conn.execute(insert(agent_tasks), rows)
+            self.stats["rows_inserted"] += len(rows)
+        # Group updates by the set of columns they touch so each group is one executemany.
+        groups: Dict[frozenset, List[Dict[str, Any]]] = {}
+        for task_id, values in updates:
+            groups.setdefault(frozenset(values), []).append({"_task_id": task_id, **values})
+        for columns, params in groups.items():
+            stmt = update(agent_tasks).where(agent_tasks.c.id == bindparam("_task_id")).values(
+                {column: bindparam(column) for column in columns}
+            )
+            conn.execute(stmt, params)
+            self.stats["rows_updated"] += len(params)
+
+    def _write_individually(self, inserts: List[Dict[str, Any]], updates: List[tuple]):
+        for row in inserts:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(agent_tasks).values(**row))
+            except Exception as e:
+                logger.error(f"Failed to write task {row.get('id')} for agent '{row.get('agent_name')}'. Reason: {e}")
+        for task_id, values in updates:
+            try:
+                with engine.begin() as conn:
+                    conn.execute(update(agent_tasks).where(agent_tasks.c.id == task_id).values(**values))
+            except Exception as e:
+                logger.error(f"Failed to update task {task_id}. Reason: {e}")
+
+    def shutdown(self):
+        """Stops the background thread and flushes whatever is still queued."""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+task_log_writer = TaskLogWriter() if DB_LOGGER_MODE == "write_behind" else None
+if task_log_writer is not None:
+    atexit.register(task_log_writer.shutdown)
+
+
+def flush_task_logs():
+    """Makes queued task writes visible before reading agent_tasks (no-op in 'sync' mode)."""
+    if task_log_writer is not None:
+        task_log_writer.flush()
+
+
+def shutdown_task_logs():
+    """Flushes and stops the write-behind writer; called on application shutdown."""
+    if task_log_writer is not None:
+        task_log_writer.shutdown()
+
 import functools
 
 # --- Decorator for Task Logging ---
@@ -81,7 +241,8 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
     A decorator that wraps a LangGraph node function to automatically handle
     database logging for task creation, completion, and failure.
     
-    Supports both sync and async functions.
+    Supports both sync and async functions. Keyword arguments such as the
+    LangGraph `config` are passed through to the node unchanged.
     
     Args:
         agent_name (str): The name of the agent/node.
@@ -98,9 +259,11 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
         is_async = asyncio.iscoroutinefunction(func)
         
         if is_async:
-            # Async wrapper
+            # Async wrapper: logging is awaited on the asyncpg engine so it never blocks the event loop
+            from backend.app.utils import async_db_logger
+
             @functools.wraps(func)
-            async def async_wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            async def async_wrapper(state: Dict[str, Any], **kwargs) -> Dict[str, Any]:
                 # Determine task_input based on input_extractor or default
                 extracted_task_input = None
                 if input_extractor:
@@ -112,7 +275,7 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
                 else:
                     extracted_task_input = {"user_query": state.get("user_query")}
 
-                task_id = create_task(
+                task_id = await async_db_logger.create_task(
                     job_id=state['job_id'],
                     agent_name=agent_name,
                     task_description=task_description,
@@ -133,7 +296,7 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
                     state_for_node['current_task_id'] = task_id
                     
                     # Execute the async node function
-                    result = await func(state_for_node)
+                    result = await func(state_for_node, **kwargs)
                     
                     duration_ms = int((time.perf_counter() - start_time) * 1000)
                     
@@ -142,13 +305,13 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
                     estimated_cost_usd = result.pop("estimated_cost_usd", None)
 
                     if result.get("error"):
-                        update_task(
+                        await async_db_logger.update_task(
                             task_id, 'failed', 
                             error_message=result["error"], 
                             duration_ms=duration_ms
                         )
                     else:
-                        update_task(
+                        await async_db_logger.update_task(
                             task_id, 'completed', 
                             output=result, 
                             duration_ms=duration_ms,
@@ -169,7 +332,7 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
                 except Exception as e:
                     error_message = str(e)
                     duration_ms = int((time.perf_counter() - start_time) * 1000)
-                    update_task(task_id, 'failed', error_message=error_message, duration_ms=duration_ms)
+                    await async_db_logger.update_task(task_id, 'failed', error_message=error_message, duration_ms=duration_ms)
                     return {"error": error_message}
             
             return async_wrapper
@@ -177,7 +340,7 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
         else:
             # Sync wrapper (original implementation)
             @functools.wraps(func)
-            def sync_wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+            def sync_wrapper(state: Dict[str, Any], **kwargs) -> Dict[str, Any]:
                 extracted_task_input = None
                 if input_extractor:
                     try:
@@ -208,7 +371,7 @@ def log_task(agent_name: str, task_description: str, input_extractor: Optional[c
                     state_for_node = state.copy()
                     state_for_node['current_task_id'] = task_id
                     
-                    result = func(state_for_node)
+                    result = func(state_for_node, **kwargs)
                     
                     duration_ms = int((time.perf_counter() - start_time) * 1000)
                     
@@ -277,6 +440,9 @@ def create_job(user_id: int, input_prompt: str, workflow_type: str, experiment_c
 
 def update_job_status(job_id: int, status: str, error_message: Optional[str] = None):
     """Updates the status and error message of a job."""
+    if status in ('completed', 'failed'):
+        # A finished job must not be observed without all of its tasks.
+        flush_task_logs()
     try:
         with engine.connect() as conn:
             stmt = update(orchestration_jobs).where(orchestration_jobs.c.id == job_id).values(
@@ -317,6 +483,30 @@ def get_job_status(job_id: int) -> Optional[str]:
 
 # --- Task-level Logging ---
 
+def _task_insert_values(
+    job_id: int,
+    agent_name: str,
+    task_description: str,
+    task_input: Optional[Dict],
+    model_name: Optional[str],
+    parent_task_id: Optional[int],
+    model_parameters: Optional[Dict],
+    iteration_number: int
+) -> Dict[str, Any]:
+    """Builds a new in-progress agent_tasks row (shared with async_db_logger)."""
+    return {
+        "job_id": job_id,
+        "agent_name": agent_name,
+        "task_description": task_description,
+        "task_input": task_input,
+        "status": 'in_progress',
+        "model_name": model_name,
+        "parent_task_id": parent_task_id,
+        "model_parameters": model_parameters,
+        "iteration_number": iteration_number,
+        "created_at": datetime.now(TAIPEI_TZ)
+    }
+
 def create_task(
     job_id: int, 
     agent_name: str, 
@@ -328,20 +518,16 @@ def create_task(
     iteration_number: int = 1
 ) -> Optional[int]:
     """Creates a new record in the agent_tasks table and returns its ID and start time."""
+    values = _task_insert_values(job_id, agent_name, task_description, task_input, model_name, parent_task_id, model_parameters, iteration_number)
     try:
+        if task_log_writer is not None:
+            task_id = task_log_writer.allocate_id()
+            task_log_writer.enqueue_insert(task_id, values)
+            logger.info(f"Queued task {task_id} for agent '{agent_name}' (iteration {iteration_number}, parent={parent_task_id}).")
+            return task_id
+
         with engine.connect() as conn:
-            stmt = insert(agent_tasks).values(
-                job_id=job_id,
-                agent_name=agent_name,
-                task_description=task_description,
-                task_input=task_input,
-                status='in_progress',
-                model_name=model_name,
-                parent_task_id=parent_task_id,
-                model_parameters=model_parameters,
-                iteration_number=iteration_number,
-                created_at=datetime.now(TAIPEI_TZ)
-            ).returning(agent_tasks.c.id)
+            stmt = insert(agent_tasks).values(**values).returning(agent_tasks.c.id)
             result = conn.execute(stmt)
             task_id = result.scalar_one()
             conn.commit()
@@ -351,6 +537,42 @@ def create_task(
         logger.error(f"Failed to create task for agent '{agent_name}'. Reason: {e}")
         return None
 
+def _task_update_values(
+    status: str,
+    output: Optional[Any],
+    error_message: Optional[str],
+    prompt_tokens: Optional[int],
+    completion_tokens: Optional[int],
+    duration_ms: Optional[int],
+    estimated_cost_usd: Optional[float]
+) -> Dict[str, Any]:
+    """Builds the agent_tasks column values for update_task (shared with async_db_logger)."""
+    processed_output = None
+    if output is not None:
+        if isinstance(output, (dict, list)):
+            processed_output = output
+        elif isinstance(output, str):
+            try:
+                processed_output = json.loads(output)
+            except json.JSONDecodeError:
+                processed_output = {"text_output": output} # Wrap plain strings
+        else:
+            processed_output = {"value": str(output)} # Catch all other types
+
+    values = { # Renamed from values_to_update to values as per snippet
+        "status": status,
+        "output": processed_output, # Use the processed output
+        "error_message": error_message,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "duration_ms": duration_ms,
+        "completed_at": datetime.now(TAIPEI_TZ),
+        "estimated_cost_usd": estimated_cost_usd
+    }
+    # Filter out None values so they don't overwrite existing data in the DB
+    values = {k: v for k, v in values.items() if v is not None}
+    return values
+
 def update_task(
     task_id: int,
     status: str,
@@ -363,32 +585,14 @@ def update_task(
 ):
     """Updates an agent_task record upon completion or failure."""
     try:
-        with engine.connect() as conn:
-            processed_output = None
-            if output is not None:
-                if isinstance(output, (dict, list)):
-                    processed_output = output
-                elif isinstance(output, str):
-                    try:
-                        processed_output = json.loads(output)
-                    except json.JSONDecodeError:
-                        processed_output = {"text_output": output} # Wrap plain strings
-                else:
-                    processed_output = {"value": str(output)} # Catch all other types
-
-            values = { # Renamed from values_to_update to values as per snippet
-                "status": status,
-                "output": processed_output, # Use the processed output
-                "error_message": error_message,
-                "prompt_tokens": prompt_tokens,
-                "completion_tokens": completion_tokens,
-                "duration_ms": duration_ms,
-                "completed_at": datetime.now(TAIPEI_TZ),
-                "estimated_cost_usd": estimated_cost_usd
-            }
-            # Filter out None values so they don't overwrite existing data in the DB
-            values = {k: v for k, v in values.items() if v is not None}
+        values = _task_update_values(status, output, error_message, prompt_tokens, completion_tokens, duration_ms, estimated_cost_usd)
+
+        if task_log_writer is not None:
+            task_log_writer.enqueue_update(task_id, values)
+            logger.info(f"Queued update of task {task_id} to status '{status}'.")
+            return
 
+        with engine.connect() as conn:
             stmt = update(agent_tasks).where(agent_tasks.c.id == task_id).values(**values)
             conn.execute(stmt)
             conn.commit()
@@ -399,21 +603,26 @@ def update_task(
 
 # --- Content and Source Logging ---
 
+def _task_source_records(task_id: int, source_chunks: List[Dict]) -> List[Dict[str, Any]]:
+    """Builds agent_task_sources rows for the retrieved chunks that have an id."""
+    return [
+        {
+            "task_id": task_id,
+            "source_type": 'chunk',
+            "source_id": chunk.get("chunk_id")
+        }
+        for chunk in source_chunks if chunk.get("chunk_id") is not None
+    ]
+
 def log_task_sources(task_id: int, source_chunks: Optional[List[Dict]] = None):
     """Logs the retrieved source chunks for a specific task."""
     if not source_chunks:
         return
 
+    flush_task_logs() # agent_task_sources references agent_tasks
     try:
         with engine.connect() as conn:
-            records_to_insert = [
-                {
-                    "task_id": task_id,
-                    "source_type": 'chunk',
-                    "source_id": chunk.get("chunk_id")
-                }
-                for chunk in source_chunks if chunk.get("chunk_id") is not None
-            ]
+            records_to_insert = _task_source_records(task_id, source_chunks)
             
             if not records_to_insert:
                 return
@@ -428,31 +637,38 @@ def log_task_sources(task_id: int, source_chunks: Optional[List[Dict]] = None):
         logger.error(f"Failed to log sources for task {task_id}. Reason: {e}")
 
 
+def _generated_content_values(task_id: int, content_type: str, title: str, content: str) -> Dict[str, Any]:
+    """Builds the generated_contents row for save_generated_content (shared with async_db_logger)."""
+    # The 'content' column in the DB is JSON. Parse the incoming JSON string.
+    parsed_content = json.loads(content)
+
+    # Inject the content_type as a 'type' field into the parsed content
+    if isinstance(parsed_content, dict):
+        parsed_content["type"] = content_type
+    elif isinstance(parsed_content, list):
+        # If it's a list, we might need to decide how to handle it.
+        # For now, we'll wrap it in a dict with the type.
+        parsed_content = {"type": content_type, "data": parsed_content}
+    else:
+        # For other types (e.g., string, int), wrap it in a dict with the type.
+        parsed_content = {"type": content_type, "value": parsed_content}
+
+    return {
+        "source_agent_task_id": task_id,
+        "content_type": content_type,
+        "title": title,
+        "content": parsed_content, # Store the parsed JSON object directly
+        "created_at": datetime.now(TAIPEI_TZ),
+        "updated_at": datetime.now(TAIPEI_TZ)
+    }
+
 def save_generated_content(task_id: int, content_type: str, title: str, content: str) -> Optional[int]:
     """Saves generated content to the GENERATED_CONTENTS table."""
+    flush_task_logs() # generated_contents references agent_tasks
     try:
         with engine.connect() as conn:
-            # The 'content' column in the DB is JSON. Parse the incoming JSON string.
-            parsed_content = json.loads(content)
-            
-            # Inject the content_type as a 'type' field into the parsed content
-            if isinstance(parsed_content, dict):
-                parsed_content["type"] = content_type
-            elif isinstance(parsed_content, list):
-                # If it's a list, we might need to decide how to handle it.
-                # For now, we'll wrap it in a dict with the type.
-                parsed_content = {"type": content_type, "data": parsed_content}
-            else:
-                # For other types (e.g., string, int), wrap it in a dict with the type.
-                parsed_content = {"type": content_type, "value": parsed_content}
-            
             stmt = insert(generated_contents).values(
-                source_agent_task_id=task_id,
-                content_type=content_type,
-                title=title,
-                content=parsed_content, # Store the parsed JSON object directly
-                created_at=datetime.now(TAIPEI_TZ),
-                updated_at=datetime.now(TAIPEI_TZ)
+                **_generated_content_values(task_id, content_type, title, content)
             ).returning(generated_contents.c.id)
             
             result = conn.execute(stmt)
@@ -500,26 +716,42 @@ def get_job_cumulative_metrics(job_id: int) -> Optional[Dict[str, Any]]:
     - total_completion_tokens: Sum of all completion_tokens
     - total_latency_ms: Sum of all duration_ms
     - estimated_carbon_g: Estimated carbon emissions (placeholder)
+    - semantic_cache_lookups / semantic_cache_hits / semantic_cache_hit_rate:
+      Tasks that consulted the semantic response cache, and how many were served from it
+    - saved_prompt_tokens / saved_completion_tokens: Tokens the cache hits avoided
     """
+    flush_task_logs()
     try:
         with engine.connect() as conn:
-            # Query to aggregate metrics
+            # Nodes backed by the semantic cache record {"hit", "saved_*_tokens"} under output.semantic_cache
+            cache_log = agent_tasks.c.output['semantic_cache']
             stmt = select(
                 func.count(func.distinct(agent_tasks.c.iteration_number)).label('total_iterations'),
                 func.coalesce(func.sum(agent_tasks.c.prompt_tokens), 0).label('total_prompt_tokens'),
                 func.coalesce(func.sum(agent_tasks.c.completion_tokens), 0).label('total_completion_tokens'),
-                func.coalesce(func.sum(agent_tasks.c.duration_ms), 0).label('total_latency_ms')
+                func.coalesce(func.sum(agent_tasks.c.duration_ms), 0).label('total_latency_ms'),
+                func.count(cache_log).label('semantic_cache_lookups'),
+                func.count().filter(cache_log['hit'].as_boolean()).label('semantic_cache_hits'),
+                func.coalesce(func.sum(cache_log['saved_prompt_tokens'].as_integer()), 0).label('saved_prompt_tokens'),
+                func.coalesce(func.sum(cache_log['saved_completion_tokens'].as_integer()), 0).label('saved_completion_tokens')
             ).where(agent_tasks.c.job_id == job_id)
             
             result = conn.execute(stmt).fetchone()
             
             if result:
+                lookups = int(result.semantic_cache_lookups)
+                hits = int(result.semantic_cache_hits)
                 return {
                     "total_iterations": result.total_iterations or 0,
                     "total_prompt_tokens": int(result.total_prompt_tokens),
                     "total_completion_tokens": int(result.total_completion_tokens),
                     "total_latency_ms": int(result.total_latency_ms),
-                    "estimated_carbon_g": 0  # Placeholder for future carbon calculation
+                    "estimated_carbon_g": 0,  # Placeholder for future carbon calculation
+                    "semantic_cache_lookups": lookups,
+                    "semantic_cache_hits": hits,
+                    "semantic_cache_hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                    "saved_prompt_tokens": int(result.saved_prompt_tokens),
+                    "saved_completion_tokens": int(result.saved_completion_tokens)
                 }
             return None
     except Exception as e:
@@ -0,0 +1 @@
+# Offline benchmarks for ingestion and retrieval components
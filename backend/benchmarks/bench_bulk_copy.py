@@ -0,0 +1,125 @@
+"""
+Benchmark: writing document_chunks with executemany INSERT vs. binary COPY.
+
+Creates a scratch schema (copy_bench) with two copies of document_chunks and
+writes the same synthetic chunks (default 10,000 chunks with 1536-d
+embeddings) into each, in batches of --batch-size rows per transaction like
+the ingestion writer:
+
+- insert: SQLAlchemy insert(table) with a list of row dicts (the previous path)
+- copy:   bulk_copy.copy_rows, i.e. COPY ... FROM STDIN (FORMAT binary)
+
+and reports wall time and rows/sec for each, after checking that both tables
+hold identical rows. With --hnsw both tables carry the production HNSW index,
+so index maintenance is included in the numbers.
+
+Requires DATABASE_URL pointing at a Postgres with pgvector. The scratch schema
+is dropped at the end unless --keep is given.
+
+Usage:
+    python -m backend.benchmarks.bench_bulk_copy --chunks 10000 --batch-size 128
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import MetaData, Table, insert, text
+from pgvector.sqlalchemy import Vector  # registers the VECTOR type for reflection
+
+from backend.app.services.bulk_copy import copy_rows
+from backend.app.utils.db_engine import get_engine
+
+SCHEMA = "copy_bench"
+TABLES = ["chunks_insert", "chunks_copy"]
+
+
+def _create_tables(conn, dim: int, hnsw: bool):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    for name in TABLES:
+        conn.execute(text(f"""
+            CREATE TABLE {SCHEMA}.{name} (
+                id SERIAL PRIMARY KEY,
+                unique_content_id INTEGER NOT NULL,
+                chunk_text TEXT,
+                chunk_order INTEGER,
+                metadata JSON,
+                embedding VECTOR({dim})
+            )
+        """))
+        if hnsw:
+            conn.execute(text(f"CREATE INDEX ON {SCHEMA}.{name} USING HNSW (embedding vector_cosine_ops)"))
+
+
+def _make_rows(count: int, dim: int):
+    rng = random.Random(0)
+    words = ["lecture", "matrix", "gradient", "pointer", "recursion", "variance", "protocol", "kernel", "圖片", "範例"]
+    return [
+        {
+            "unique_content_id": 1,
+            "chunk_text": " ".join(rng.choice(words) for _ in range(150)),
+            "chunk_order": i,
+            "metadata": {"page_numbers": [i // 4 + 1, i // 4 + 2]},
+            "embedding": [rng.uniform(-0.1, 0.1) for _ in range(dim)],
+        }
+        for i in range(count)
+    ]
+
+
+def _write(engine, table: Table, rows, batch_size: int, use_copy: bool) -> float:
+    start = time.perf_counter()
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i:i + batch_size]
+        with engine.begin() as conn:
+            if use_copy:
+                copy_rows(conn, table, batch)
+            else:
+                conn.execute(insert(table), batch)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--batch-size", type=int, default=128, help="Rows per transaction (INGEST_EMBED_BATCH_SIZE)")
+    parser.add_argument("--hnsw", action="store_true", help="Include the HNSW index on both tables")
+    parser.add_argument("--keep", action="store_true", help="Keep the copy_bench schema afterwards")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    print(f"Generating {args.chunks:,} chunks with {args.dim}-d embeddings...")
+    rows = _make_rows(args.chunks, args.dim)
+
+    try:
+        with engine.begin() as conn:
+            _create_tables(conn, args.dim, args.hnsw)
+        metadata = MetaData(schema=SCHEMA)
+        insert_table = Table("chunks_insert", metadata, autoload_with=engine)
+        copy_table = Table("chunks_copy", metadata, autoload_with=engine)
+
+        insert_seconds = _write(engine, insert_table, rows, args.batch_size, use_copy=False)
+        copy_seconds = _write(engine, copy_table, rows, args.batch_size, use_copy=True)
+
+        with engine.connect() as conn:
+            matching = conn.execute(text(f"""
+                SELECT count(*) FROM {SCHEMA}.chunks_insert a
+                JOIN {SCHEMA}.chunks_copy b USING (chunk_order)
+                WHERE a.chunk_text = b.chunk_text AND a.metadata::text = b.metadata::text AND a.embedding = b.embedding
+            """)).scalar_one()
+        assert matching == len(rows), f"Only {matching} of {len(rows)} rows are identical in both tables"
+
+        index_note = "with HNSW index" if args.hnsw else "no vector index"
+        print(f"\n{args.chunks:,} chunks, batches of {args.batch_size}, {index_note}; rows identical in both tables")
+        print(f"{'writer':<10}{'seconds':>10}{'rows/sec':>12}")
+        print(f"{'insert':<10}{insert_seconds:>10.2f}{args.chunks / insert_seconds:>12,.0f}")
+        print(f"{'copy':<10}{copy_seconds:>10.2f}{args.chunks / copy_seconds:>12,.0f}")
+        print(f"Speedup: {insert_seconds / copy_seconds:.1f}x")
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: per-document RAG retrieval strategies on a growing document_chunks table.
+
+Seeds a scratch schema (rag_bench) with a copy of document_chunks holding one
+target document plus filler documents, builds the same btree and HNSW indexes
+as production, and for each table size reports, for the target document:
+
+- exact:        btree filter + exact distance sort (RAGAgent's 'exact' path)
+- hnsw:         global HNSW index with post-filtering (the previous behaviour)
+- hnsw+iter:    HNSW with hnsw.iterative_scan (RAGAgent's 'hnsw' path, pgvector >= 0.8)
+
+with median latency, rows returned (post-filtering can return fewer than
+top_k) and recall@k against the exact result.
+
+Requires DATABASE_URL pointing at a Postgres with pgvector. The scratch schema
+is dropped at the end unless --keep is given. Seeding 1M rows of 1536-d vectors
+takes a while and several GB; use --dim to shrink vectors for a quick run.
+
+Usage:
+    python -m backend.benchmarks.bench_rag_search --sizes 1000 100000 1000000 --doc-chunks 500
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+# rag_agent builds the embedding service at import time; this benchmark never calls it.
+os.environ.setdefault("OPENAI_API_KEY", "unused-by-benchmark")
+
+from sqlalchemy import text
+
+from backend.app.agents.rag_agent import _EXACT_TOP_CHUNKS_SQL, _HNSW_TOP_CHUNKS_SQL
+from backend.app.utils.db_engine import get_engine
+
+SCHEMA = "rag_bench"
+TARGET_DOC_ID = 1
+
+
+def _seed(conn, total_rows: int, doc_chunks: int, dim: int):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"""
+        CREATE TABLE {SCHEMA}.document_chunks (
+            id SERIAL PRIMARY KEY,
+            unique_content_id INTEGER NOT NULL,
+            chunk_text TEXT,
+            chunk_order INTEGER,
+            metadata JSON,
+            embedding VECTOR({dim})
+        )
+    """))
+    # Filler documents get ~doc_chunks chunks each; the target document is id 1.
+    conn.execute(text(f"""
+        INSERT INTO {SCHEMA}.document_chunks (unique_content_id, chunk_text, chunk_order, metadata, embedding)
+        SELECT CASE WHEN g <= :doc_chunks THEN {TARGET_DOC_ID} ELSE 2 + (g / :doc_chunks) END,
+               'chunk ' || g, g, '{{"page_numbers": [1]}}'::json,
+               (SELECT array_agg(random() - 0.5 + 0 * g) FROM generate_series(1, :dim))::vector
+        FROM generate_series(1, :total_rows) AS g
+    """), {"doc_chunks": doc_chunks, "dim": dim, "total_rows": total_rows})
+    conn.execute(text(f"CREATE INDEX ON {SCHEMA}.document_chunks (unique_content_id, chunk_order)"))
+    conn.execute(text(f"CREATE INDEX ON {SCHEMA}.document_chunks USING HNSW (embedding vector_cosine_ops)"))
+    conn.execute(text(f"ANALYZE {SCHEMA}.document_chunks"))
+
+
+def _run(engine, sql: str, query_vector, top_k: int, settings: list, repeats: int):
+    latencies, rows = [], []
+    for _ in range(repeats):
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL search_path = {SCHEMA}, public"))
+            for setting in settings:
+                conn.execute(text(setting))
+            start = time.perf_counter()
+            rows = conn.execute(text(sql), {"query_embedding": str(query_vector), "unique_content_id": TARGET_DOC_ID, "top_k": top_k, "candidate_k": top_k}).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+    return [row.id for row in rows], statistics.median(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--doc-chunks", type=int, default=500, help="Chunks in the searched document")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the rag_bench schema afterwards")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    rng = random.Random(0)
+    query_vectors = [[rng.uniform(-0.5, 0.5) for _ in range(args.dim)] for _ in range(args.queries)]
+    ef_search = f"SET LOCAL hnsw.ef_search = {max(100, args.top_k)}"
+    variants = {
+        "exact": (_EXACT_TOP_CHUNKS_SQL, []),
+        "hnsw": (_HNSW_TOP_CHUNKS_SQL, [ef_search, "SET LOCAL enable_seqscan = off"]),
+        "hnsw+iter": (_HNSW_TOP_CHUNKS_SQL, [ef_search, "SET LOCAL enable_seqscan = off", "SET LOCAL hnsw.iterative_scan = relaxed_order"]),
+    }
+
+    try:
+        for size in args.sizes:
+            print(f"\nSeeding {size:,} chunks ({args.doc_chunks} in the target document, dim {args.dim})...")
+            with engine.begin() as conn:
+                _seed(conn, size, min(args.doc_chunks, size), args.dim)
+
+            print(f"{'strategy':<12}{'p50 (ms)':>10}{'rows/top_k':>12}{'recall@k':>10}")
+            results = {name: {"ms": [], "rows": [], "recall": []} for name in variants}
+            for query_vector in query_vectors:
+                exact_ids, _ = _run(engine, _EXACT_TOP_CHUNKS_SQL, query_vector, args.top_k, [], 1)
+                for name, (sql, settings) in variants.items():
+                    try:
+                        ids, ms = _run(engine, sql, query_vector, args.top_k, settings, 3)
+                    except Exception as e:
+                        print(f"{name:<12} skipped: {e.__class__.__name__}: {e}")
+                        break
+                    results[name]["ms"].append(ms)
+                    results[name]["rows"].append(len(ids))
+                    results[name]["recall"].append(len(set(ids) & set(exact_ids)) / max(1, len(exact_ids)))
+            for name, r in results.items():
+                if r["ms"]:
+                    print(f"{name:<12}{statistics.median(r['ms']):>10.2f}{statistics.mean(r['rows']) / args.top_k:>12.2f}{statistics.mean(r['recall']):>10.2f}")
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark: tiered fast-path router vs. the LLM router on a labeled query set.
+
+For each query the keyword tier, the centroid tier and (optionally) the LLM
+router are run, and the benchmark reports per-tier accuracy, coverage (the
+share of queries a tier would answer at ROUTER_CONFIDENCE_THRESHOLD) and
+latency, plus the end-to-end accuracy/latency of the tiered router.
+
+--temperatures / --min-similarities re-score the centroid tier's similarities
+for each combination, which is how ROUTER_CENTROID_TEMPERATURE and
+ROUTER_CENTROID_MIN_SIMILARITY are calibrated. Pick the values where the
+centroid tier's acc@covered matches the LLM router's. Accept lower coverage
+rather than lower accuracy.
+
+The centroid and LLM tiers need OPENAI_API_KEY; without it only the keyword
+tier is measured.
+
+Usage:
+    python -m backend.benchmarks.bench_router
+    python -m backend.benchmarks.bench_router --llm --queries my_labeled_queries.json
+    python -m backend.benchmarks.bench_router --temperatures 0.02 0.05 0.1 --min-similarities 0 0.3 0.4
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import List, Tuple
+
+import numpy as np
+
+from backend.app.agents.teacher_agent.router_classifier import (
+    ROUTER_CENTROID_MIN_SIMILARITY,
+    ROUTER_CENTROID_TEMPERATURE,
+    ROUTER_CONFIDENCE_THRESHOLD,
+    CentroidClassifier,
+    centroid_confidence,
+    classify_by_keywords,
+)
+
+# (query, expected skill). Deliberately disjoint from LABELED_EXAMPLES.
+LABELED_QUERIES: List[Tuple[str, str]] = [
+    ("出十題選擇題", "exam_generation_skill"),
+    ("請根據第三章產生5題是非題", "exam_generation_skill"),
+    ("幫我準備期末考的考題", "exam_generation_skill"),
+    ("可以給學生做的小考嗎", "exam_generation_skill"),
+    ("我想要2題申論題跟3題填空題", "exam_generation_skill"),
+    ("quiz me on neural networks", "exam_generation_skill"),
+    ("write 4 short answer questions about PCA", "exam_generation_skill"),
+    ("幫我想幾個可以考學生的問題", "exam_generation_skill"),
+    ("這份講義的重點是什麼", "summarization_skill"),
+    ("幫我摘要第二章", "summarization_skill"),
+    ("請統整這份教材的內容", "summarization_skill"),
+    ("列出這份投影片的大綱", "summarization_skill"),
+    ("give me a tl;dr of the lecture", "summarization_skill"),
+    ("what is this document mainly about", "summarization_skill"),
+    ("用三句話說明這份文件在講什麼", "summarization_skill"),
+    ("summarise the slides for me", "summarization_skill"),
+    ("哈囉", "general_chat_skill"),
+    ("您好，請問你是誰", "general_chat_skill"),
+    ("謝謝！", "general_chat_skill"),
+    ("你能做什麼?", "general_chat_skill"),
+    ("hey there", "general_chat_skill"),
+    ("thank you so much", "general_chat_skill"),
+    ("推薦我一本機器學習的書", "general_chat_skill"),
+    ("what's your name?", "general_chat_skill"),
+]
+
+
+def _load_queries(path: str) -> List[Tuple[str, str]]:
+    if not path:
+        return LABELED_QUERIES
+    with open(path, encoding="utf-8") as f:
+        return [(item["query"], item["skill"]) for item in json.load(f)]
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _llm_route(query: str) -> str:
+    from backend.app.agents.teacher_agent.graph import _build_router_request, Route
+    _, router_llm, messages = _build_router_request({"user_query": query})
+    response = router_llm.invoke(messages)
+    return Route(**response.tool_calls[0]["args"]).next_skill
+
+
+def _report(name: str, rows: List[dict]):
+    if not rows:
+        return
+    covered = [r for r in rows if r["confident"]]
+    latencies = [r["ms"] for r in rows]
+    accuracy = sum(r["skill"] == r["expected"] for r in rows) / len(rows)
+    covered_accuracy = sum(r["skill"] == r["expected"] for r in covered) / len(covered) if covered else 0.0
+    p95 = sorted(latencies)[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<10}{accuracy:>10.1%}{len(covered) / len(rows):>11.1%}{covered_accuracy:>14.1%}"
+          f"{statistics.median(latencies):>12.2f}{p95:>11.2f}")
+
+
+def _sweep_centroid(scored: List[Tuple[dict, str]], temperatures: List[float], min_similarities: List[float]):
+    """Re-scores stored centroid similarities for every (temperature, min_similarity) pair."""
+    print(f"\ncentroid calibration (threshold {ROUTER_CONFIDENCE_THRESHOLD})")
+    print(f"{'temperature':>12}{'min_sim':>9}{'coverage':>11}{'acc@covered':>14}")
+    for temperature in temperatures:
+        for min_similarity in min_similarities:
+            covered = correct = 0
+            for similarities, expected in scored:
+                labels = list(similarities)
+                confidence = centroid_confidence(np.array([similarities[l] for l in labels]), temperature, min_similarity)
+                best = int(np.argmax(confidence))
+                if confidence[best] >= ROUTER_CONFIDENCE_THRESHOLD:
+                    covered += 1
+                    correct += labels[best] == expected
+            accuracy = correct / covered if covered else 0.0
+            print(f"{temperature:>12.3f}{min_similarity:>9.2f}{covered / len(scored):>11.1%}{accuracy:>14.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="JSON file of [{\"query\": ..., \"skill\": ...}] (defaults to the built-in set)")
+    parser.add_argument("--llm", action="store_true", help="Also measure the LLM router (costs tokens)")
+    parser.add_argument("--temperatures", type=float, nargs="+", default=[ROUTER_CENTROID_TEMPERATURE], help="Centroid temperatures to sweep")
+    parser.add_argument("--min-similarities", type=float, nargs="+", default=[ROUTER_CENTROID_MIN_SIMILARITY], help="Centroid similarity floors to sweep")
+    args = parser.parse_args()
+
+    queries = _load_queries(args.queries)
+    has_key = bool(os.getenv("OPENAI_API_KEY"))
+    classifier = CentroidClassifier() if has_key else None
+    if classifier:
+        classifier.fit()  # warm the centroids so only per-query cost is measured
+
+    rows = {"keyword": [], "centroid": [], "llm": [], "tiered": []}
+    centroid_scores = []
+    for query, expected in queries:
+        kw, kw_ms = _timed(classify_by_keywords, query)
+        rows["keyword"].append({"skill": kw.skill, "expected": expected, "confident": kw.is_confident, "ms": kw_ms})
+
+        cent, cent_ms = None, 0.0
+        if classifier:
+            cent, cent_ms = _timed(classifier.classify, query)
+            rows["centroid"].append({"skill": cent.skill, "expected": expected, "confident": cent.is_confident, "ms": cent_ms})
+            centroid_scores.append((cent.scores, expected))
+
+        llm_skill, llm_ms = None, 0.0
+        if args.llm and has_key:
+            llm_skill, llm_ms = _timed(_llm_route, query)
+            rows["llm"].append({"skill": llm_skill, "expected": expected, "confident": True, "ms": llm_ms})
+
+        # Tiered: the first confident tier answers; unresolved queries pay for every tier tried.
+        if kw.is_confident:
+            tiered = (kw.skill, kw_ms, True)
+        elif cent and cent.is_confident:
+            tiered = (cent.skill, kw_ms + cent_ms, True)
+        elif llm_skill:
+            tiered = (llm_skill, kw_ms + cent_ms + llm_ms, True)
+        else:
+            tiered = ((cent or kw).skill, kw_ms + cent_ms, False)
+        rows["tiered"].append({"skill": tiered[0], "expected": expected, "confident": tiered[2], "ms": tiered[1]})
+
+    print(f"{len(queries)} labeled queries, confidence threshold {ROUTER_CONFIDENCE_THRESHOLD}")
+    print(f"{'tier':<10}{'accuracy':>10}{'coverage':>11}{'acc@covered':>14}{'p50 (ms)':>12}{'p95 (ms)':>11}")
+    for name, tier_rows in rows.items():
+        _report(name, tier_rows)
+    if centroid_scores:
+        _sweep_centroid(centroid_scores, args.temperatures, args.min_similarities)
+    if not has_key:
+        print("OPENAI_API_KEY not set: centroid and LLM tiers skipped.")
+
+
+if __name__ == "__main__":
+    main()
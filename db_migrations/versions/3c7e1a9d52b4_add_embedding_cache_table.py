@@ -0,0 +1,41 @@
+"""add_embedding_cache_table
+
+Revision ID: 3c7e1a9d52b4
+Revises: d145b8eadb40
+Create Date: 2025-12-01 10:12:37.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c7e1a9d52b4'
+down_revision: Union[str, Sequence[str], None] = 'd145b8eadb40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Creating EMBEDDING_CACHE table ---")
+
+    # 以 (模型名稱, 正規化文字的 SHA-256) 為鍵的向量快取，跨教材、跨學期共用
+    # 向量維度不固定，以便切換 EMBEDDING_MODEL 時不需修改 schema
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS EMBEDDING_CACHE (
+        model_name VARCHAR(100) NOT NULL,
+        text_hash VARCHAR(64) NOT NULL,
+        embedding VECTOR NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+
+        PRIMARY KEY (model_name, text_hash)
+    );
+    """)
+
+    print("--- [Cook.ai] EMBEDDING_CACHE table created ---")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS EMBEDDING_CACHE;")
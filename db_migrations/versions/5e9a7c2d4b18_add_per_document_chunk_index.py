@@ -0,0 +1,40 @@
+"""add_per_document_chunk_index
+
+Revision ID: 5e9a7c2d4b18
+Revises: 8b2f4d6e1a37
+Create Date: 2025-12-05 16:42:51.208374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9a7c2d4b18'
+down_revision: Union[str, Sequence[str], None] = '8b2f4d6e1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Adding per-document index on DOCUMENT_CHUNKS ---")
+
+    # RAG 檢索一律以 unique_content_id 過濾，先前只有全域 HNSW 索引
+    # 小型文件改走此 btree 索引後做精確距離排序，不再掃描整張 HNSW 圖後再過濾
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS idx_document_chunks_unique_content_id
+    ON DOCUMENT_CHUNKS (unique_content_id, chunk_order);
+    """)
+
+    # 讓 planner 對各文件的 chunk 數有較精確的估計（RAGAgent 依此選擇檢索策略）
+    op.execute("ALTER TABLE DOCUMENT_CHUNKS ALTER COLUMN unique_content_id SET STATISTICS 1000;")
+    op.execute("ANALYZE DOCUMENT_CHUNKS;")
+
+    print("--- [Cook.ai] DOCUMENT_CHUNKS index created ---")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE DOCUMENT_CHUNKS ALTER COLUMN unique_content_id SET STATISTICS -1;")
+    op.execute("DROP INDEX IF EXISTS idx_document_chunks_unique_content_id;")
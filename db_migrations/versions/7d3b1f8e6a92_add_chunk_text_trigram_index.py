@@ -0,0 +1,37 @@
+"""add_chunk_text_trigram_index
+
+Revision ID: 7d3b1f8e6a92
+Revises: 5e9a7c2d4b18
+Create Date: 2025-12-08 11:03:27.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3b1f8e6a92'
+down_revision: Union[str, Sequence[str], None] = '5e9a7c2d4b18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Adding trigram index on DOCUMENT_CHUNKS.chunk_text ---")
+
+    # 混合檢索的字詞比對（課程代碼、英文縮寫、公式名稱）以 ILIKE 進行，由 trigram 索引加速
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS trgm_idx_document_chunks_chunk_text
+    ON DOCUMENT_CHUNKS
+    USING GIN (chunk_text gin_trgm_ops);
+    """)
+
+    print("--- [Cook.ai] Trigram index created ---")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS trgm_idx_document_chunks_chunk_text;")
+    # op.execute("DROP EXTENSION IF EXISTS pg_trgm;")
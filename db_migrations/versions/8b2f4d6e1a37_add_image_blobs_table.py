@@ -0,0 +1,41 @@
+"""add_image_blobs_table
+
+Revision ID: 8b2f4d6e1a37
+Revises: 3c7e1a9d52b4
+Create Date: 2025-12-03 14:25:09.631802
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2f4d6e1a37'
+down_revision: Union[str, Sequence[str], None] = '3c7e1a9d52b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Creating IMAGE_BLOBS table ---")
+
+    # 以圖片位元組的 SHA-256 為鍵的二進位圖片儲存，相同圖片只存一份
+    # DOCUMENT_CONTENT.structured_content 只保留 image_ref，不再內嵌 base64
+    # 既有資料列仍保留 base64，讀取端兩種格式皆支援
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS IMAGE_BLOBS (
+        content_hash VARCHAR(64) PRIMARY KEY,
+        mime_type VARCHAR(100) NOT NULL,
+        byte_size INTEGER NOT NULL,
+        data BYTEA NOT NULL,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    print("--- [Cook.ai] IMAGE_BLOBS table created ---")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS IMAGE_BLOBS;")
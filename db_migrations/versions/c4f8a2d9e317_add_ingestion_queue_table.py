@@ -0,0 +1,61 @@
+"""add_ingestion_queue_table
+
+Revision ID: c4f8a2d9e317
+Revises: 7d3b1f8e6a92
+Create Date: 2025-12-08 10:17:36.482915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f8a2d9e317'
+down_revision: Union[str, Sequence[str], None] = '7d3b1f8e6a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Creating INGESTION_QUEUE table ---")
+
+    # 上傳檔案的背景處理佇列：API 建立 ORCHESTRATION_JOBS 後立即回傳 202
+    # worker 以 SELECT ... FOR UPDATE SKIP LOCKED 領取工作，互不阻塞
+    # status: queued / running / completed / failed
+    # locked_at 超過租約時間的 running 工作視為 worker 已中斷，可被重新領取
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS INGESTION_QUEUE (
+        id SERIAL PRIMARY KEY,
+        job_id INTEGER NOT NULL UNIQUE REFERENCES ORCHESTRATION_JOBS(id) ON DELETE CASCADE,
+        file_path TEXT NOT NULL,
+        file_name VARCHAR(255) NOT NULL,
+        uploader_id INTEGER NOT NULL,
+        course_id INTEGER NOT NULL,
+        course_unit_id INTEGER,
+        force_reprocess BOOLEAN NOT NULL DEFAULT FALSE,
+        chunking_strategy VARCHAR(20),
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        unique_content_id INTEGER,
+        error_message TEXT,
+        locked_by VARCHAR(100),
+        locked_at TIMESTAMPTZ,
+        created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+
+    # worker 只掃描尚未結束的工作
+    op.execute("""
+    CREATE INDEX IF NOT EXISTS idx_ingestion_queue_pending
+    ON INGESTION_QUEUE (id)
+    WHERE status IN ('queued', 'running');
+    """)
+
+    print("--- [Cook.ai] INGESTION_QUEUE table created ---")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS INGESTION_QUEUE;")
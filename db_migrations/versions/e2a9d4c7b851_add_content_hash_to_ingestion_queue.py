@@ -0,0 +1,34 @@
+"""add_content_hash_to_ingestion_queue
+
+Revision ID: e2a9d4c7b851
+Revises: c4f8a2d9e317
+Create Date: 2025-12-09 09:41:12.507336
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9d4c7b851'
+down_revision: Union[str, Sequence[str], None] = 'c4f8a2d9e317'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Adding content_hash to INGESTION_QUEUE ---")
+
+    # 上傳時邊寫入磁碟邊計算的 SHA-256，worker 不必再讀一次整個檔案
+    op.execute("""
+    ALTER TABLE INGESTION_QUEUE
+    ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+    """)
+
+    print("--- [Cook.ai] content_hash added ---")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE INGESTION_QUEUE DROP COLUMN IF EXISTS content_hash;")
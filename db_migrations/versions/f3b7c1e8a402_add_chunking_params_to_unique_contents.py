@@ -0,0 +1,34 @@
+"""add_chunking_params_to_unique_contents
+
+Revision ID: f3b7c1e8a402
+Revises: e2a9d4c7b851
+Create Date: 2025-12-11 10:18:37.204915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b7c1e8a402'
+down_revision: Union[str, Sequence[str], None] = 'e2a9d4c7b851'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    print("--- [Cook.ai] Adding chunking_params to UNIQUE_CONTENTS ---")
+
+    # 記錄切塊所用的 strategy / chunk_size / chunk_overlap，續傳時參數不同就不能沿用已存的 chunks
+    op.execute("""
+    ALTER TABLE UNIQUE_CONTENTS
+    ADD COLUMN IF NOT EXISTS chunking_params JSON;
+    """)
+
+    print("--- [Cook.ai] chunking_params added ---")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE UNIQUE_CONTENTS DROP COLUMN IF EXISTS chunking_params;")